@@ -1,25 +1,70 @@
-import fitz  # PyMuPDF for PDF text extraction
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 from flask_cors import CORS
-from transformers import pipeline  # For a very basic, local language model demo
 import os
 import requests
 import json
 from datetime import datetime
+from qa_engine import build_qa_engine
+from qa_server import RemoteQAEngine
+from qa_scheduler import MicroBatchScheduler, QAQueueFull
+from retrieval import DEFAULT_EMBEDDING_MODEL, get_embedder, select_chunk_indices
+from document_store import (DocumentStore, owns_upload, release_upload, save_uploaded_pdf,
+                            uploaded_filename, uploaded_pdf_path)
+from ingestion_cache import IngestionCache
+from ingestion import IngestionJobs, IngestionPipeline
+from pdf_extraction import start_extraction_pool
+from chunking import chunk_document
+from response_cache import build_response_cache
+from semantic_cache import SemanticCache
+from metrics import instrument_app, span
+from keyword_matcher import question_features
+from model_registry import ModelRegistry
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for integration with Node.js backend
+instrument_app(app)  # /metrics, plus per-request timings with an X-Debug-Timing header
+# Fork the PDF extraction workers while the process is still single-threaded
+start_extraction_pool()
 
 # --- Configuration ---
 # For a real system, you'd use a cloud-based LLM like Google's Gemini API
 # and a robust embedding model.
 # This is just for demonstration purposes with a small, local model.
-try:
-    qa_pipeline = pipeline("question-answering", model="distilbert-base-cased-distilled-squad")
-    print("✅ QA model loaded successfully")
-except Exception as e:
-    print(f"⚠️ Warning: Could not load local QA model. This demo will have limited functionality. Error: {e}")
-    qa_pipeline = None
+# Batched inference over all chunks instead of one pipeline call per chunk
+QA_BATCH_SIZE = int(os.getenv('QA_BATCH_SIZE', '16'))
+# Inference backend: torch, or onnx (exported once to QA_ONNX_DIR, int8 unless QA_ONNX_QUANTIZE=false)
+QA_BACKEND = os.getenv('QA_BACKEND', 'torch')
+QA_ONNX_DIR = os.getenv('QA_ONNX_DIR')
+QA_ONNX_QUANTIZE = os.getenv('QA_ONNX_QUANTIZE', 'true').lower() in ('1', 'true', 'yes')
+
+# Models load on first use or on a warm-up thread (MODEL_WARMUP=lazy|background|eager)
+# so the service starts serving /health immediately; see model_registry.py.
+MODEL_WARMUP = os.getenv('MODEL_WARMUP', 'background')
+
+# With QA_SERVER_ADDRESS set, questions go to a shared qa_server.py process
+# instead of every worker loading its own copy of the model.
+QA_SERVER_ADDRESS = os.getenv('QA_SERVER_ADDRESS')
+
+# Concurrent requests' (question, chunk) pairs are batched into shared forward
+# passes; with QA_SCHEDULER_MAX_QUEUE requests waiting, new ones get a 503.
+QA_SCHEDULER_ENABLED = os.getenv('QA_SCHEDULER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+QA_SCHEDULER_MAX_BATCH = int(os.getenv('QA_SCHEDULER_MAX_BATCH', '64'))
+QA_SCHEDULER_MAX_WAIT_MS = float(os.getenv('QA_SCHEDULER_MAX_WAIT_MS', '10'))
+QA_SCHEDULER_MAX_QUEUE = int(os.getenv('QA_SCHEDULER_MAX_QUEUE', '128'))
+
+def load_qa_engine():
+    if QA_SERVER_ADDRESS:
+        return RemoteQAEngine(QA_SERVER_ADDRESS)
+    engine = build_qa_engine(QA_BACKEND, batch_size=QA_BATCH_SIZE, onnx_dir=QA_ONNX_DIR,
+                             quantize=QA_ONNX_QUANTIZE)
+    if not QA_SCHEDULER_ENABLED:
+        return engine
+    return MicroBatchScheduler(engine, max_batch_pairs=QA_SCHEDULER_MAX_BATCH,
+                               max_wait=QA_SCHEDULER_MAX_WAIT_MS / 1000,
+                               max_queue=QA_SCHEDULER_MAX_QUEUE)
+
+models = ModelRegistry()
+models.register('local_qa', load_qa_engine)
 
 UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -27,128 +72,71 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 # Backend API configuration
 BACKEND_API_URL = "http://localhost:5000/api"
 
-# In a real system, this would be a sophisticated vector database
-# storing embeddings of PDF content for fast retrieval.
-# For this demo, we'll just store the raw text for simplicity.
-uploaded_pdf_text = ""
-current_document_context = []  # Stores chunks of the PDF for the AI to refer to
-current_pdf_metadata = {}
-
-def extract_text_from_pdf(pdf_path):
-    """Extracts text from a PDF document."""
-    text = ""
-    metadata = {}
-    try:
-        document = fitz.open(pdf_path)
-        metadata['total_pages'] = len(document)
-        metadata['title'] = document.metadata.get('title', 'Unknown')
-        metadata['author'] = document.metadata.get('author', 'Unknown')
-        
-        for page_num in range(len(document)):
-            page = document.load_page(page_num)
-            text += f"\n--- Page {page_num + 1} ---\n"
-            text += page.get_text()
-        
-        metadata['word_count'] = len(text.split())
-        return text, metadata
-    except Exception as e:
-        print(f"Error extracting text from PDF: {e}")
-        return None, None
-
-def chunk_text(text, max_chunk_size=500):
-    """Splits text into smaller, manageable chunks."""
-    words = text.split()
-    chunks = []
-    current_chunk = []
-    for word in words:
-        current_chunk.append(word)
-        if len(" ".join(current_chunk)) > max_chunk_size:
-            chunks.append(" ".join(current_chunk[:-1]))
-            current_chunk = [word]
-    if current_chunk:
-        chunks.append(" ".join(current_chunk))
-    return chunks
-
-def analyze_caps_structure(text):
-    """Analyze CAPS curriculum structure and extract key concepts."""
-    import re
-    
-    # Define patterns for CAPS curriculum elements
-    patterns = {
-        'grade_levels': r'Grade\s+(\d+)',
-        'learning_outcomes': r'Learning\s+Outcome[s]?\s*:?\s*([^\n]+)',
-        'assessment_standards': r'Assessment\s+Standard[s]?\s*:?\s*([^\n]+)',
-        'content_areas': r'Content\s+Area[s]?\s*:?\s*([^\n]+)',
-        'topics': r'Topic[s]?\s*:?\s*([^\n]+)',
-        'skills': r'Skill[s]?\s*:?\s*([^\n]+)',
-        'concepts': r'Concept[s]?\s*:?\s*([^\n]+)',
-        'knowledge': r'Knowledge\s*:?\s*([^\n]+)',
-        'term_work': r'Term\s+(\d+)\s*:?\s*([^\n]+)',
-        'weekly_breakdown': r'Week\s+(\d+)\s*:?\s*([^\n]+)',
-        'objectives': r'(?:Learning\s+)?Objective[s]?\s*:?\s*([^\n]+)',
-        'activities': r'Activit(?:y|ies)\s*:?\s*([^\n]+)',
-        'resources': r'Resource[s]?\s*:?\s*([^\n]+)',
-        'time_allocation': r'Time\s*:?\s*(\d+)\s*(?:hours?|minutes?|periods?)',
-        'mathematical_concepts': r'(?:sin|cos|tan|algebra|geometry|calculus|trigonometry|logarithm|equation|formula|theorem)',
-        'subject_areas': r'(?:Mathematics|Science|English|History|Geography|Life Sciences|Physical Sciences|Technology)',
-    }
-    
-    curriculum_structure = {
-        'grades': set(),
-        'learning_outcomes': [],
-        'assessment_standards': [],
-        'content_areas': [],
-        'topics': [],
-        'skills': [],
-        'concepts': [],
-        'knowledge_areas': [],
-        'term_breakdown': {},
-        'weekly_breakdown': {},
-        'objectives': [],
-        'activities': [],
-        'resources': [],
-        'time_allocations': [],
-        'mathematical_concepts': set(),
-        'subject_areas': set(),
-        'sections': []
-    }
-    
-    # Extract structured information
-    for category, pattern in patterns.items():
-        if category == 'grade_levels':
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            curriculum_structure['grades'].update(matches)
-        elif category == 'term_work':
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            for term, content in matches:
-                curriculum_structure['term_breakdown'][f'Term {term}'] = content.strip()
-        elif category == 'weekly_breakdown':
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            for week, content in matches:
-                curriculum_structure['weekly_breakdown'][f'Week {week}'] = content.strip()
-        elif category == 'time_allocation':
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            curriculum_structure['time_allocations'].extend(matches)
-        elif category in ['mathematical_concepts', 'subject_areas']:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            curriculum_structure[category].update([m.lower() for m in matches])
-        else:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            key = category.replace('_', '_')
-            if key in curriculum_structure:
-                curriculum_structure[key].extend([m.strip() for m in matches if m.strip()])
-    
-    # Extract sections by looking for numbered sections or headings
-    section_pattern = r'(?:^|\n)\s*(?:\d+\.?\s*)?([A-Z][^.\n]*(?:Identity|Formula|Concept|Topic|Skill|Knowledge|Learning|Assessment)[^.\n]*)'
-    sections = re.findall(section_pattern, text, re.MULTILINE | re.IGNORECASE)
-    curriculum_structure['sections'] = [s.strip() for s in sections if len(s.strip()) > 5]
-    
-    # Convert sets to lists for JSON serialization
-    curriculum_structure['grades'] = list(curriculum_structure['grades'])
-    curriculum_structure['mathematical_concepts'] = list(curriculum_structure['mathematical_concepts'])
-    curriculum_structure['subject_areas'] = list(curriculum_structure['subject_areas'])
-    
-    return curriculum_structure
+# Retrieval settings: tfidf (default), bm25 or dense embeddings
+RETRIEVAL_BACKEND = os.getenv('RETRIEVAL_BACKEND', 'tfidf')
+RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', '5'))
+
+# Chunking: CHUNK_SIZE/CHUNK_OVERLAP are in characters, or in QA-model tokens with CHUNK_UNIT=tokens
+CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', '500'))
+CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', '0'))
+CHUNK_UNIT = os.getenv('CHUNK_UNIT', 'chars')
+
+# Processed documents are held per owner in a bounded LRU registry
+# (see document_store.py) instead of process-wide globals.
+DOCUMENT_STORE_MAX_DOCS = int(os.getenv('DOCUMENT_STORE_MAX_DOCS', '32'))
+DOCUMENT_STORE_MAX_MB = int(os.getenv('DOCUMENT_STORE_MAX_MB', '256'))
+
+# Ingestion results are cached on disk by PDF hash so re-uploads skip extraction.
+# Bump INGESTION_PIPELINE_VERSION whenever extraction/chunking/analysis output changes.
+INGESTION_PIPELINE_VERSION = '5'
+INGESTION_CACHE_DIR = os.getenv('INGESTION_CACHE_DIR', os.path.join('cache', 'ingestion'))
+INGESTION_CACHE_MAX_MB = int(os.getenv('INGESTION_CACHE_MAX_MB', '1024'))
+# Pages are chunked a batch at a time, so the batch size is part of the cache key too
+INGESTION_PAGE_BATCH = int(os.getenv('INGESTION_PAGE_BATCH', '16'))
+ingestion_cache = IngestionCache(
+    INGESTION_CACHE_DIR,
+    max_bytes=INGESTION_CACHE_MAX_MB * 1024 * 1024,
+    version=f"{INGESTION_PIPELINE_VERSION}-{RETRIEVAL_BACKEND}-{DEFAULT_EMBEDDING_MODEL}-{CHUNK_UNIT}-"
+            f"{CHUNK_SIZE}-{CHUNK_OVERLAP}-{INGESTION_PAGE_BATCH}"
+)
+
+# Background ingestion: pages are processed in batches and each partial
+# document is queryable while the rest of the PDF is still being ingested.
+INGESTION_WORKERS = int(os.getenv('INGESTION_WORKERS', '2'))
+ingestion_jobs = IngestionJobs(max_workers=INGESTION_WORKERS)
+
+# Answers are cached per (document, normalized question, provider, prompt version).
+# Bump PROMPT_TEMPLATE_VERSION whenever prompts or answer formatting change.
+PROMPT_TEMPLATE_VERSION = '1'
+RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '3600'))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1024'))
+RESPONSE_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH', os.path.join('cache', 'responses.sqlite3'))
+# Paraphrases of earlier questions are matched by embedding similarity. On by
+# default only with dense retrieval, which loads the embedding model anyway.
+SEMANTIC_CACHE_ENABLED = os.getenv(
+    'SEMANTIC_CACHE_ENABLED', str(RETRIEVAL_BACKEND == 'dense')).lower() in ('1', 'true', 'yes')
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.9'))
+models.register('embedder', lambda: get_embedder(DEFAULT_EMBEDDING_MODEL),
+                enabled=SEMANTIC_CACHE_ENABLED or RETRIEVAL_BACKEND == 'dense')
+response_cache = build_response_cache(
+    RESPONSE_CACHE_BACKEND,
+    ttl=RESPONSE_CACHE_TTL,
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+    path=RESPONSE_CACHE_PATH,
+    semantic_cache=SemanticCache(threshold=SEMANTIC_CACHE_THRESHOLD, ttl=RESPONSE_CACHE_TTL,
+                                 embedder=lambda: models.get('embedder'))
+    if SEMANTIC_CACHE_ENABLED else None
+)
+# Every model is registered now
+models.warm_up(MODEL_WARMUP)
+
+def chunk_pages(text, page_offsets):
+    """Chunk a run of pages with the configured size, overlap and unit."""
+    qa_engine = models.get('local_qa') if CHUNK_UNIT == 'tokens' else None
+    tokenizer = qa_engine.tokenizer if qa_engine else None
+    return chunk_document(text, page_offsets, max_chunk_size=CHUNK_SIZE,
+                          overlap=CHUNK_OVERLAP, tokenizer=tokenizer)
 
 def synthesize_learning_breakdown(curriculum_structure, user_question):
     """Create a structured learning breakdown based on curriculum analysis."""
@@ -222,6 +210,65 @@ def save_learning_session(user_id, question, answer, pdf_title):
         print(f"Error saving learning session: {e}")
         return False
 
+ingestion_pipeline = IngestionPipeline(
+    chunk_pages,
+    retrieval_backend=RETRIEVAL_BACKEND,
+    ingestion_cache=ingestion_cache,
+    page_batch_size=INGESTION_PAGE_BATCH
+)
+
+def owns_document(document_id, owner):
+    """Whether the owner uploaded this document and has not cleared it"""
+    return owns_upload(document_id, owner, UPLOAD_FOLDER)
+
+def load_saved_document(document_id, owner):
+    """Rebuild the owner's document from its saved upload, e.g. one received by another worker."""
+    filepath = uploaded_pdf_path(document_id, UPLOAD_FOLDER)
+    if not filepath:
+        return None
+    return ingestion_pipeline.process(filepath, document_id, owner,
+                                      uploaded_filename(document_id, owner, UPLOAD_FOLDER))
+
+document_store = DocumentStore(
+    max_documents=DOCUMENT_STORE_MAX_DOCS,
+    max_bytes=DOCUMENT_STORE_MAX_MB * 1024 * 1024,
+    loader=load_saved_document,
+    owns=owns_document
+)
+
+def ingest_in_background(report, filepath, document_id, owner, filename):
+    """Ingestion job body: publish every partial document as its pages are indexed."""
+    def on_progress(document, pages_processed):
+        # Cleared while still ingesting: finish the job but publish nothing
+        if owns_document(document_id, owner):
+            document_store.put(document)
+        report(pages_total=document['metadata'].get('total_pages'), pages_processed=pages_processed)
+    
+    return ingestion_pipeline.process(filepath, document_id, owner, filename, on_progress=on_progress)
+
+def request_param(name, default=None):
+    """Read a parameter from the JSON body, form data or query string."""
+    data = request.get_json(silent=True) or {}
+    return data.get(name) or request.form.get(name) or request.args.get(name) or default
+
+def resolve_document(document_id, owner):
+    """Find the requested document, or the owner's latest upload if no id is given."""
+    if document_id:
+        return document_store.get(document_id, owner)
+    return document_store.latest(owner)
+
+def qa_scheduler_stats():
+    """Micro-batching stats of the loaded QA engine, if it is scheduled locally"""
+    engine = models.models['local_qa']
+    if engine.state != 'ready' or not isinstance(engine.get(), MicroBatchScheduler):
+        return None
+    return engine.get().stats()
+
+@app.errorhandler(QAQueueFull)
+def qa_overloaded(error):
+    """Shed load when the QA scheduler's queue is full"""
+    return jsonify({"error": "The tutor is busy right now. Please try again in a moment."}), 503, {"Retry-After": "1"}
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -231,14 +278,17 @@ def health():
     """Health check endpoint"""
     return jsonify({
         "status": "healthy",
-        "ai_model_loaded": qa_pipeline is not None,
+        "ai_model_loaded": models.models['local_qa'].state == 'ready',
+        "models": models.status(),
+        "qa_scheduler": qa_scheduler_stats(),
+        "documents": document_store.stats(),
+        "ingestion_cache": ingestion_cache.stats(),
+        "response_cache": response_cache.stats() if response_cache else None,
         "timestamp": datetime.now().isoformat()
     })
 
 @app.route('/upload_pdf', methods=['POST'])
 def upload_pdf():
-    global uploaded_pdf_text, current_document_context, current_pdf_metadata
-    
     if 'pdf_file' not in request.files:
         return jsonify({"success": False, "message": "No PDF file part"})
     
@@ -247,27 +297,41 @@ def upload_pdf():
         return jsonify({"success": False, "message": "No selected file"})
     
     if file and file.filename.endswith('.pdf'):
-        filepath = os.path.join(UPLOAD_FOLDER, file.filename)
-        file.save(filepath)
+        owner = request_param('user_id', 'anonymous')
+        filename = file.filename
+        document_id, filepath = save_uploaded_pdf(file, UPLOAD_FOLDER, owner)
         
-        extracted_text, metadata = extract_text_from_pdf(filepath)
-        if extracted_text:
-            uploaded_pdf_text = extracted_text
-            current_document_context = chunk_text(uploaded_pdf_text)
-            current_pdf_metadata = metadata
-            
-            # Analyze CAPS curriculum structure
-            curriculum_analysis = analyze_caps_structure(uploaded_pdf_text)
-            current_pdf_metadata['curriculum_structure'] = curriculum_analysis
+        if str(request_param('async', '')).lower() in ('1', 'true', 'yes'):
+            # Respond straight away; progress is at /ingestion_status/<job_id>
+            job = ingestion_jobs.submit(
+                lambda report: ingest_in_background(report, filepath, document_id, owner, filename),
+                document_id=document_id,
+                filename=filename
+            )
+            return jsonify({
+                "success": True,
+                "message": "PDF uploaded, processing in the background.",
+                "document_id": document_id,
+                "job_id": job['job_id'],
+                "status_url": f"/ingestion_status/{job['job_id']}",
+                "events_url": f"/ingestion_events/{job['job_id']}"
+            }), 202
+        
+        document = ingestion_pipeline.process(filepath, document_id, owner, filename)
+        if document:
+            document_store.put(document)
+            metadata = document['metadata']
+            curriculum_analysis = metadata['curriculum_structure']
             
             return jsonify({
                 "success": True, 
                 "message": "PDF uploaded and processed successfully!",
+                "document_id": document_id,
                 "metadata": {
                     "filename": file.filename,
                     "pages": metadata.get('total_pages', 0),
                     "word_count": metadata.get('word_count', 0),
-                    "chunks": len(current_document_context)
+                    "chunks": len(document['chunks'])
                 },
                 "curriculum_analysis": {
                     "grades_covered": curriculum_analysis.get('grades', []),
@@ -282,10 +346,36 @@ def upload_pdf():
     
     return jsonify({"success": False, "message": "Invalid file type. Please upload a PDF."})
 
+@app.route('/ingestion_status/<job_id>')
+def ingestion_status(job_id):
+    """Progress of a background PDF ingestion job"""
+    job = ingestion_jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Unknown ingestion job"}), 404
+    return jsonify(job)
+
+@app.route('/ingestion_events/<job_id>')
+def ingestion_events(job_id):
+    """Server-sent events stream of a background ingestion job's progress"""
+    def generate():
+        seen_version = -1
+        while True:
+            job = ingestion_jobs.wait_for_update(job_id, seen_version)
+            if not job:
+                yield f"event: error\ndata: {json.dumps({'error': 'Unknown ingestion job'})}\n\n"
+                return
+            if job['version'] == seen_version:
+                yield ": keep-alive\n\n"
+                continue
+            seen_version = job['version']
+            yield f"data: {json.dumps(job)}\n\n"
+            if job['status'] in IngestionJobs.TERMINAL_STATES:
+                return
+    
+    return Response(generate(), mimetype='text/event-stream', headers={"Cache-Control": "no-cache"})
+
 @app.route('/ask_ai', methods=['POST'])
 def ask_ai():
-    global qa_pipeline, current_document_context, current_pdf_metadata
-    
     data = request.json
     user_question = data.get('question')
     user_id = data.get('user_id', 'anonymous')
@@ -293,25 +383,40 @@ def ask_ai():
     if not user_question:
         return jsonify({"answer": "Please ask a question."})
 
-    if not uploaded_pdf_text:
+    document = resolve_document(data.get('document_id'), user_id)
+    if not document:
         return jsonify({
             "answer": "Please upload a CAPS curriculum PDF first to enable AI teaching.",
             "requires_pdf": True
         })
+    
+    document_chunks = document['chunks']
+    pdf_metadata = document['metadata']
 
     ai_response = "I'm sorry, I couldn't find an answer in the provided document."
     confidence_score = 0
+    best_chunk_index = -1
+    # Only real answers are cached, not fallbacks after a QA error or a miss
+    answered = False
+
+    qa_engine = models.get('local_qa')
 
-    if qa_pipeline:
+    # Repeated (or paraphrased) questions about the same document skip the QA scan
+    cached = response_cache.lookup(document['document_id'], user_question, "local",
+                                   PROMPT_TEMPLATE_VERSION) if response_cache and qa_engine else None
+
+    if cached:
+        ai_response = cached['answer']
+        confidence_score = cached['confidence']
+        best_chunk_index = cached['source_chunk']
+    elif qa_engine:
         # Enhanced RAG with curriculum structure analysis
         best_answer = None
         max_score = -1
-        best_chunk_index = -1
         
         # First, try to get structured breakdown if question is about learning/concepts
-        learning_keywords = ['learn', 'study', 'concept', 'breakdown', 'explain', 'what is', 'how to', 'teach', 'understand']
-        if any(keyword in user_question.lower() for keyword in learning_keywords):
-            curriculum_structure = current_pdf_metadata.get('curriculum_structure', {})
+        if question_features(user_question)["learning"]:
+            curriculum_structure = pdf_metadata.get('curriculum_structure', {})
             if curriculum_structure:
                 learning_breakdown = synthesize_learning_breakdown(curriculum_structure, user_question)
                 
@@ -339,26 +444,29 @@ def ask_ai():
                 if structured_response.strip():
                     ai_response = structured_response
                     confidence_score = 0.85  # High confidence for structured analysis
+                    answered = True
         
         # If no structured response, fall back to traditional QA
         if ai_response == "I'm sorry, I couldn't find an answer in the provided document.":
-            for i, chunk in enumerate(current_document_context):
-                try:
-                    # Limit the context size for the local model
-                    truncated_chunk = chunk[:1000]  # Reasonable limit for context
-                    result = qa_pipeline(question=user_question, context=truncated_chunk)
-                    
-                    if result and result['score'] > max_score and result['score'] > 0.3:  # Lower threshold
-                        best_answer = result['answer']
-                        max_score = result['score']
-                        best_chunk_index = i
-                except Exception as e:
-                    print(f"Error during QA: {e}")
-                    continue
+            try:
+                # Only the top-k retrieved chunks are scored, in one batched pass
+                chunk_indices = select_chunk_indices(document['retriever'], user_question,
+                                                     len(document_chunks), RETRIEVAL_TOP_K)
+                candidate_chunks = [document_chunks[i] for i in chunk_indices]
+                with span("local_qa"):
+                    result = qa_engine.answer(user_question, candidate_chunks, min_score=0.3)
+                if result:
+                    best_answer = result['answer']
+                    max_score = result['score']
+                    best_chunk_index = chunk_indices[result['chunk_index']]
+            except QAQueueFull:
+                raise
+            except Exception as e:
+                print(f"Error during QA: {e}")
 
             if best_answer:
                 # Enhance the answer with context
-                curriculum_structure = current_pdf_metadata.get('curriculum_structure', {})
+                curriculum_structure = pdf_metadata.get('curriculum_structure', {})
                 context_info = ""
                 
                 if curriculum_structure.get('grades'):
@@ -376,12 +484,13 @@ def ask_ai():
                 
                 ai_response = f"**Answer:** {best_answer}\n{context_info}"
                 confidence_score = max_score
+                answered = True
             else:
                 # Enhanced fallback with curriculum context
-                curriculum_structure = current_pdf_metadata.get('curriculum_structure', {})
-                if current_document_context and curriculum_structure:
+                curriculum_structure = pdf_metadata.get('curriculum_structure', {})
+                if document_chunks and curriculum_structure:
                     # Use the first chunk as general context
-                    context_preview = current_document_context[0][:300] + "..."
+                    context_preview = document_chunks[0][:300] + "..."
                     
                     related_sections = [section for section in curriculum_structure.get('sections', [])
                                       if any(word in section.lower() for word in user_question.lower().split())][:2]
@@ -400,52 +509,70 @@ Could you please rephrase your question or specify which aspect you'd like me to
     else:
         ai_response = "AI model not loaded. Cannot answer questions. Please check server logs."
 
+    # Answers from a partially ingested document are not cached
+    if response_cache and answered and document['status'] == 'ready':
+        response_cache.store_response(document['document_id'], user_question, "local",
+                                      PROMPT_TEMPLATE_VERSION, {
+            "answer": ai_response,
+            "confidence": confidence_score,
+            "source_chunk": best_chunk_index
+        })
+
     # Save learning session
     save_learning_session(
         user_id, 
         user_question, 
         ai_response, 
-        current_pdf_metadata.get('title', 'Unknown PDF')
+        pdf_metadata.get('title', 'Unknown PDF')
     )
 
     return jsonify({
         "answer": ai_response,
         "confidence": confidence_score,
-        "source_chunk": best_chunk_index if 'best_chunk_index' in locals() else None,
-        "pdf_metadata": current_pdf_metadata
+        "source_chunk": best_chunk_index if best_chunk_index >= 0 else None,
+        "source_page": document['chunk_spans'][best_chunk_index]['page'] if best_chunk_index >= 0 else None,
+        "document_id": document['document_id'],
+        "pdf_metadata": pdf_metadata
     })
 
 @app.route('/get_pdf_info')
 def get_pdf_info():
-    """Get information about the currently loaded PDF"""
-    if not uploaded_pdf_text:
+    """Get information about the requested (or most recent) PDF"""
+    document = resolve_document(request.args.get('document_id'), request.args.get('user_id', 'anonymous'))
+    if not document:
         return jsonify({"loaded": False})
     
+    text = document['text']
     return jsonify({
         "loaded": True,
-        "metadata": current_pdf_metadata,
-        "chunks_count": len(current_document_context),
-        "text_preview": uploaded_pdf_text[:200] + "..." if len(uploaded_pdf_text) > 200 else uploaded_pdf_text
+        "document_id": document['document_id'],
+        "metadata": document['metadata'],
+        "chunks_count": len(document['chunks']),
+        "status": document.get('status', 'ready'),
+        "pages_processed": document.get('pages_processed'),
+        "text_preview": text[:200] + "..." if len(text) > 200 else text
     })
 
 @app.route('/clear_pdf', methods=['POST'])
 def clear_pdf():
-    """Clear the currently loaded PDF"""
-    global uploaded_pdf_text, current_document_context, current_pdf_metadata
-    
-    uploaded_pdf_text = ""
-    current_document_context = []
-    current_pdf_metadata = {}
+    """Clear the requested (or most recent) PDF for this user"""
+    owner = request_param('user_id', 'anonymous')
+    document_id = request_param('document_id') or document_store.latest_id(owner)
+    if document_id:
+        # Revoking ownership stops any worker from serving or rebuilding it for this owner
+        release_upload(document_id, owner, UPLOAD_FOLDER)
+        document_store.remove(document_id, owner)
     
     return jsonify({"success": True, "message": "PDF cleared successfully"})
 
 @app.route('/get_curriculum_breakdown')
 def get_curriculum_breakdown():
     """Get detailed curriculum breakdown and analysis"""
-    if not uploaded_pdf_text:
+    document = resolve_document(request.args.get('document_id'), request.args.get('user_id', 'anonymous'))
+    if not document:
         return jsonify({"error": "No PDF loaded"})
     
-    curriculum_structure = current_pdf_metadata.get('curriculum_structure', {})
+    curriculum_structure = document['metadata'].get('curriculum_structure', {})
     if not curriculum_structure:
         return jsonify({"error": "No curriculum analysis available"})
     
@@ -0,0 +1,222 @@
+"""Benchmark the ai-service hot paths and write a JSON report comparable across commits.
+
+Stages (PDF extraction, chunking, curriculum analysis, the whole ingestion
+pipeline, response formatting) run directly on synthetic CAPS PDFs of
+several sizes; the Flask endpoints (/upload_pdf, /ask_ai, /ask_ai_stream)
+run through enhanced_app's test client with stub Gemini/OpenAI providers, so no network or API keys are
+needed. Each entry reports runs, throughput, mean/p50/p95/p99 latency and
+the tracemalloc peak of one extra run.
+
+    python benchmarks/hot_paths.py --sizes 5,50,200 --repeat 10 --output bench.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_caps import QUESTIONS, make_caps_pages, make_caps_pdf  # noqa: E402
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(latencies, peak_bytes, units_per_run=1):
+    latencies_ms = [seconds * 1000 for seconds in latencies]
+    total = sum(latencies)
+    return {
+        "runs": len(latencies),
+        "throughput_per_s": round(len(latencies) * units_per_run / total, 2) if total else None,
+        "mean_ms": round(total * 1000 / len(latencies), 3),
+        "p50_ms": round(percentile(latencies_ms, 0.50), 3),
+        "p95_ms": round(percentile(latencies_ms, 0.95), 3),
+        "p99_ms": round(percentile(latencies_ms, 0.99), 3),
+        "peak_mb": round(peak_bytes / (1024 * 1024), 3),
+    }
+
+
+def bench(fn, repeat, units_per_run=1, warmup=1):
+    """Time ``fn(run_index)`` repeat times after warm-up, then measure one traced run."""
+    for run in range(warmup):
+        fn(-1 - run)
+    latencies = []
+    for run in range(repeat):
+        started = time.perf_counter()
+        fn(run)
+        latencies.append(time.perf_counter() - started)
+    # Memory is measured separately: tracemalloc would distort the timings
+    tracemalloc.start()
+    fn(repeat)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return summarize(latencies, peak, units_per_run)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=SERVICE_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def configure_service(workdir, stub_delay_ms, stub_jitter_ms=0, stub_error_rate=0.0):
+    """Environment for importing enhanced_app offline with stub providers."""
+    os.chdir(workdir)  # uploads/ and cache/ are created relative to the working directory
+    os.environ.update({
+        "PROVIDER_STUBS": "true",
+        "PROVIDER_STUB_DELAY_MS": str(stub_delay_ms),
+        "PROVIDER_STUB_JITTER_MS": str(stub_jitter_ms),
+        "PROVIDER_STUB_ERROR_RATE": str(stub_error_rate),
+        "MODEL_WARMUP": "lazy",
+        "RESPONSE_CACHE_BACKEND": "off",
+        "SEMANTIC_CACHE_ENABLED": "false",
+        "INGESTION_CACHE_DIR": os.path.join(workdir, "cache", "ingestion"),
+        "CONVERSATION_STORE_BACKEND": "memory",
+    })
+
+
+def stage_benchmarks(sizes, repeat, workdir):
+    from chunking import chunk_document
+    from curriculum_analyzer import analyze_caps_structure
+    from ingestion import IngestionPipeline
+    from pdf_extraction import iter_page_batches, join_pages, read_pdf_metadata, start_extraction_pool
+
+    # As in the apps: the extraction workers are forked once, before any threads
+    start_extraction_pool()
+    page_batch_size = int(os.getenv('INGESTION_PAGE_BATCH', '16'))
+    pipeline = IngestionPipeline(chunk_document, retrieval_backend="tfidf", page_batch_size=page_batch_size)
+
+    def extract(path):
+        # The page batches IngestionPipeline.process reads
+        total_pages = read_pdf_metadata(path)['total_pages']
+        pages = []
+        for batch in iter_page_batches(path, total_pages, page_batch_size):
+            pages.extend(batch)
+        return join_pages(pages)
+
+    results = {}
+    for pages in sizes:
+        path = os.path.join(workdir, f"caps-{pages}.pdf")
+        make_caps_pdf(path, pages, seed=pages)
+        text, page_offsets = extract(path)
+
+        results[f"extraction/{pages}p"] = bench(lambda run: extract(path), repeat, pages)
+        results[f"chunking/{pages}p"] = bench(
+            lambda run: chunk_document(text, page_offsets), repeat, pages)
+        results[f"curriculum_analysis/{pages}p"] = bench(
+            lambda run: analyze_caps_structure(text), repeat, pages)
+        # The whole uncached pipeline: extraction, chunking, analysis and indexing
+        results[f"ingestion/{pages}p"] = bench(
+            lambda run: pipeline.process(path, f"bench-{pages}", "bench", f"caps-{pages}.pdf"), repeat, pages)
+    return results
+
+
+def formatting_benchmarks(repeat):
+    import enhanced_app
+
+    rng = random.Random(0)
+    # A long, Gemini-sized answer: several paragraphs of curriculum prose
+    answer = "\n\n".join(page.replace("\n", ". ") for page in make_caps_pages(6, seed=1))
+    random.seed(0)
+    return {
+        "format_response_structure": bench(
+            lambda run: enhanced_app.format_response_structure(answer), repeat),
+        "add_personality_to_response": bench(
+            lambda run: enhanced_app.add_personality_to_response(answer, rng.choice(["general", "educational"])),
+            repeat),
+    }
+
+
+def endpoint_benchmarks(sizes, repeat, workdir):
+    import enhanced_app
+
+    client = enhanced_app.app.test_client()
+    # Load (or fail to load) the local QA model up front, not inside a timed run
+    enhanced_app.models.get('local_qa')
+    results = {}
+    for pages in sizes:
+        # Distinct PDFs per run so every upload is a cold ingestion
+        pdfs = []
+        for run in range(repeat + 2):
+            path = os.path.join(workdir, f"upload-{pages}-{run}.pdf")
+            make_caps_pdf(path, pages, seed=1000 * pages + run)
+            with open(path, "rb") as f:
+                pdfs.append(f.read())
+
+        def upload(run, pdfs=pdfs, pages=pages):
+            response = client.post("/upload_pdf", data={
+                "pdf_file": (io.BytesIO(pdfs[run % len(pdfs)]), f"caps-{pages}.pdf"),
+                "user_id": f"bench-{pages}",
+            }, content_type="multipart/form-data")
+            assert response.get_json()["success"], response.get_json()
+
+        results[f"POST /upload_pdf/{pages}p"] = bench(upload, repeat, pages)
+        results[f"POST /upload_pdf (cached)/{pages}p"] = bench(lambda run: upload(0), repeat, pages)
+
+        def ask(run, endpoint, pages=pages):
+            response = client.post(endpoint, json={
+                "question": QUESTIONS[run % len(QUESTIONS)],
+                "user_id": f"bench-{pages}",
+                "session_id": f"bench-{pages}-{endpoint}",
+            })
+            assert response.status_code == 200, response.status_code
+            response.get_data()  # Drain streamed responses
+
+        results[f"POST /ask_ai/{pages}p"] = bench(lambda run: ask(run, "/ask_ai"), repeat)
+        results[f"POST /ask_ai_stream/{pages}p"] = bench(lambda run: ask(run, "/ask_ai_stream"), repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ai-service hot paths")
+    parser.add_argument("--sizes", default="5,50,200", help="comma-separated synthetic PDF page counts")
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per benchmark")
+    parser.add_argument("--stub-delay-ms", type=int, default=0,
+                        help="simulated Gemini/OpenAI latency for the endpoint benchmarks")
+    parser.add_argument("--stages-only", action="store_true",
+                        help="skip everything that imports the Flask app (formatting and endpoints)")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout only)")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    output = os.path.abspath(args.output) if args.output else None
+    with tempfile.TemporaryDirectory(prefix="fefe-bench-") as workdir:
+        configure_service(workdir, args.stub_delay_ms)
+        results = stage_benchmarks(sizes, args.repeat, workdir)
+        if not args.stages_only:
+            results.update(formatting_benchmarks(args.repeat))
+            results.update(endpoint_benchmarks(sizes, args.repeat, workdir))
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"sizes": sizes, "repeat": args.repeat, "stub_delay_ms": args.stub_delay_ms},
+        # ru_maxrss is in kilobytes on Linux
+        "process_peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
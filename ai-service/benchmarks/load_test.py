@@ -0,0 +1,286 @@
+"""Load-test one ai-service node with simulated students at increasing concurrency.
+
+Each virtual student starts a conversation and uploads a CAPS PDF, then
+loops over a weighted mix of /start_conversation, /upload_pdf and /ask_ai
+calls (closed loop, optional think time). Every concurrency level runs for
+a fixed duration; the report gives throughput, per-endpoint latency
+percentiles, error and status counts and which providers answered, plus
+the level where the node saturates (throughput stops growing or p95 breaks
+the SLO).
+
+By default enhanced_app is served in-process with stub Gemini/OpenAI
+providers whose latency, jitter and error rate are set on the command
+line, so routing and fallback are exercised without a network. --url
+points the same load at a running server instead (its providers are
+whatever it was started with).
+
+    python benchmarks/load_test.py --concurrency 1,2,4,8,16,32 --duration 20 \\
+        --mix start=1,upload=1,ask=8 --stub-delay-ms 800 --stub-error-rate 0.05 --output load.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from hot_paths import configure_service, git_commit, percentile  # noqa: E402
+from synthetic_caps import QUESTIONS, make_caps_pdf  # noqa: E402
+
+ENDPOINTS = {"start": "/start_conversation", "upload": "/upload_pdf", "ask": "/ask_ai"}
+
+
+def parse_mix(text):
+    """'start=1,upload=1,ask=8' -> {'start': 1.0, 'upload': 1.0, 'ask': 8.0}"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown operation '{name}' (use {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("the mix needs at least one positive weight")
+    return mix
+
+
+def start_local_server(workdir, stub_delay_ms, stub_jitter_ms, stub_error_rate):
+    """Serve enhanced_app on a free local port from a threaded werkzeug server."""
+    from werkzeug.serving import make_server
+
+    configure_service(workdir, stub_delay_ms, stub_jitter_ms, stub_error_rate)
+    import enhanced_app
+
+    # Load (or fail to load) the local QA model before the first level starts
+    enhanced_app.models.get('local_qa')
+    server = make_server("127.0.0.1", 0, enhanced_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+class Student:
+    """One simulated student: its own HTTP session, conversation and uploads."""
+
+    def __init__(self, base_url, student_id, pdfs, mix, think_time, timeout, seed):
+        self.base_url = base_url
+        self.user_id = f"load-{student_id}"
+        self.session_id = self.user_id
+        self.pdfs = pdfs
+        self.operations = list(mix)
+        self.weights = [mix[name] for name in self.operations]
+        self.think_time = think_time
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.http = requests.Session()
+        self.samples = []  # (operation, seconds, status, ok, ai_service)
+
+    def run(self, stop):
+        # A student has a conversation and a document before asking anything
+        self.call("start")
+        self.call("upload")
+        while not stop.is_set():
+            self.call(self.rng.choices(self.operations, self.weights)[0])
+            if self.think_time:
+                stop.wait(self.rng.expovariate(1 / self.think_time))
+        self.http.close()
+
+    def call(self, operation):
+        url = self.base_url + ENDPOINTS[operation]
+        started = time.perf_counter()
+        status, ok, ai_service = "error", False, None
+        try:
+            if operation == "start":
+                response = self.http.post(url, json={"user_id": self.user_id}, timeout=self.timeout)
+            elif operation == "upload":
+                name, data = self.rng.choice(self.pdfs)
+                response = self.http.post(url, data={"user_id": self.user_id},
+                                          files={"pdf_file": (name, data, "application/pdf")},
+                                          timeout=self.timeout)
+            else:
+                response = self.http.post(url, json={
+                    "question": self.rng.choice(QUESTIONS),
+                    "user_id": self.user_id,
+                    "session_id": self.session_id,
+                }, timeout=self.timeout)
+            status = response.status_code
+            payload = response.json() if response.ok else {}
+            if operation == "start":
+                self.session_id = payload.get("session_id", self.session_id)
+                ok = response.ok
+            elif operation == "upload":
+                ok = response.ok and bool(payload.get("success"))
+            else:
+                ok = response.ok and bool(payload.get("answer"))
+                ai_service = payload.get("ai_service")
+        except requests.Timeout:
+            status = "timeout"
+        except (requests.RequestException, ValueError):
+            status = "error"
+        self.samples.append((operation, time.perf_counter() - started, status, ok, ai_service))
+
+
+def latency_summary(latencies):
+    latencies_ms = [seconds * 1000 for seconds in latencies]
+    return {
+        "p50_ms": round(percentile(latencies_ms, 0.50), 1),
+        "p95_ms": round(percentile(latencies_ms, 0.95), 1),
+        "p99_ms": round(percentile(latencies_ms, 0.99), 1),
+        "max_ms": round(max(latencies_ms), 1),
+    }
+
+
+def run_level(base_url, concurrency, duration, pdfs, mix, think_time, timeout, seed):
+    """Run ``concurrency`` students for ``duration`` seconds and summarize their calls."""
+    stop = threading.Event()
+    students = [Student(base_url, f"{concurrency}-{index}", pdfs, mix, think_time, timeout,
+                        seed + index) for index in range(concurrency)]
+    threads = [threading.Thread(target=student.run, args=(stop,), daemon=True) for student in students]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    samples = [sample for student in students for sample in student.samples]
+    completed = [sample for sample in samples if sample[3]]
+    level = {
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": len(samples),
+        "throughput_per_s": round(len(completed) / elapsed, 2),
+        "error_rate": round(1 - len(completed) / len(samples), 4) if samples else None,
+        "statuses": dict(Counter(str(sample[2]) for sample in samples)),
+        "endpoints": {},
+        "answered_by": dict(Counter(sample[4] for sample in samples if sample[0] == "ask" and sample[4])),
+    }
+    if samples:
+        level.update(latency_summary([sample[1] for sample in samples]))
+    for operation in ENDPOINTS:
+        operation_samples = [sample for sample in samples if sample[0] == operation]
+        if operation_samples:
+            level["endpoints"][ENDPOINTS[operation]] = {
+                "requests": len(operation_samples),
+                "errors": sum(1 for sample in operation_samples if not sample[3]),
+                **latency_summary([sample[1] for sample in operation_samples]),
+            }
+    return level
+
+
+def find_saturation(levels, slo_p95_ms, min_gain):
+    """First level whose throughput gain falls below ``min_gain`` or whose p95 breaks the SLO.
+
+    Returns the best throughput seen up to that point, or None when the
+    node kept scaling through the whole sweep.
+    """
+    best = None
+    for level in levels:
+        if "p95_ms" not in level:
+            continue
+        if slo_p95_ms and level["p95_ms"] > slo_p95_ms:
+            return dict(best or {}, saturated_at=level["concurrency"], reason="p95 above SLO")
+        if best and level["throughput_per_s"] < best["throughput_per_s"] * (1 + min_gain):
+            return dict(best, saturated_at=level["concurrency"], reason="throughput stopped growing")
+        best = {"concurrency": level["concurrency"], "throughput_per_s": level["throughput_per_s"],
+                "p95_ms": level["p95_ms"]}
+    return None
+
+
+def print_level(level):
+    print(f"c={level['concurrency']:>4}  {level['throughput_per_s']:>8.2f} req/s  "
+          f"p50 {level.get('p50_ms', 0):>8.1f} ms  p95 {level.get('p95_ms', 0):>8.1f} ms  "
+          f"p99 {level.get('p99_ms', 0):>8.1f} ms  errors {100 * (level['error_rate'] or 0):5.1f}%",
+          file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrency sweep against the ai-service")
+    parser.add_argument("--url", help="base URL of a running server (default: serve enhanced_app in-process)")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32", help="comma-separated student counts")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per concurrency level")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("start=1,upload=1,ask=8"),
+                        help="relative weights of start, upload and ask calls")
+    parser.add_argument("--think-ms", type=float, default=0,
+                        help="mean pause between a student's calls (exponential; 0 = closed loop)")
+    parser.add_argument("--timeout", type=float, default=60, help="client timeout per request in seconds")
+    parser.add_argument("--pdf-pages", type=int, default=10, help="pages per synthetic upload")
+    parser.add_argument("--pdf-variants", type=int, default=4,
+                        help="distinct PDFs students choose from (repeats hit the ingestion cache)")
+    parser.add_argument("--stub-delay-ms", type=int, default=800, help="simulated Gemini/OpenAI latency")
+    parser.add_argument("--stub-jitter-ms", type=int, default=400, help="extra uniform random latency")
+    parser.add_argument("--stub-error-rate", type=float, default=0.02,
+                        help="fraction of simulated provider calls that fail")
+    parser.add_argument("--slo-p95-ms", type=float, default=5000,
+                        help="p95 latency above which a level counts as saturated (0 = none)")
+    parser.add_argument("--min-gain", type=float, default=0.05,
+                        help="throughput growth below which a level counts as saturated")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here (default: stdout only)")
+    args = parser.parse_args()
+
+    concurrency_levels = [int(level) for level in args.concurrency.split(",") if level]
+    output = os.path.abspath(args.output) if args.output else None
+    with tempfile.TemporaryDirectory(prefix="fefe-load-") as workdir:
+        pdfs = []
+        for variant in range(args.pdf_variants):
+            path = os.path.join(workdir, f"caps-{variant}.pdf")
+            make_caps_pdf(path, args.pdf_pages, seed=variant)
+            with open(path, "rb") as f:
+                pdfs.append((f"caps-{variant}.pdf", f.read()))
+
+        server = None
+        base_url = args.url.rstrip("/") if args.url else None
+        if base_url is None:
+            server, base_url = start_local_server(workdir, args.stub_delay_ms, args.stub_jitter_ms,
+                                                  args.stub_error_rate)
+        try:
+            levels = []
+            for concurrency in concurrency_levels:
+                level = run_level(base_url, concurrency, args.duration, pdfs, args.mix,
+                                  args.think_ms / 1000, args.timeout, args.seed)
+                print_level(level)
+                levels.append(level)
+        finally:
+            if server is not None:
+                server.shutdown()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "target": args.url or "in-process",
+            "concurrency": concurrency_levels,
+            "duration_s": args.duration,
+            "mix": args.mix,
+            "think_ms": args.think_ms,
+            "pdf_pages": args.pdf_pages,
+            "pdf_variants": args.pdf_variants,
+            "stub_delay_ms": None if args.url else args.stub_delay_ms,
+            "stub_jitter_ms": None if args.url else args.stub_jitter_ms,
+            "stub_error_rate": None if args.url else args.stub_error_rate,
+            "slo_p95_ms": args.slo_p95_ms,
+        },
+        "saturation": find_saturation(levels, args.slo_p95_ms, args.min_gain),
+        "levels": levels,
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
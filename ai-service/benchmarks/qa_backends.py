@@ -0,0 +1,114 @@
+"""Compare the torch and ONNX (int8) local QA backends on demo-caps-content.md.
+
+Each backend runs in a fresh process so peak memory is measured on its
+own. Reports load time, per-question latency (p50/p95), peak RSS and how
+often the ONNX answers agree with the torch ones.
+
+    python benchmarks/qa_backends.py [--repeat 5] [--output qa_backends.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+QUESTIONS = [
+    "What are the learning outcomes for trigonometry?",
+    "How is sin(2x) derived?",
+    "Which resources are needed?",
+    "What happens in weeks 3-4?",
+    "What skills are developed?",
+    "How are students assessed?",
+    "What activities are suggested?",
+    "What are the key concepts?",
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_backend(backend, repeat, results):
+    from chunking import chunk_document
+    from qa_engine import build_qa_engine
+    from retrieval import build_retriever, select_chunk_indices
+
+    with open(os.path.join(SERVICE_DIR, "demo-caps-content.md"), encoding="utf-8") as f:
+        text = f.read()
+    chunks = [chunk['text'] for chunk in chunk_document(text)]
+    retriever = build_retriever(chunks)
+
+    started = time.perf_counter()
+    engine = build_qa_engine(backend)
+    load_seconds = time.perf_counter() - started
+
+    answers = {}
+    latencies = []
+    for round_number in range(repeat + 1):
+        for question in QUESTIONS:
+            # Same candidate selection as ask_local_qa
+            indices = select_chunk_indices(retriever, question, len(chunks), 5)
+            started = time.perf_counter()
+            result = engine.answer(question, [chunks[i] for i in indices], min_score=0.0)
+            elapsed = time.perf_counter() - started
+            if round_number == 0:
+                continue  # Warm-up round
+            latencies.append(elapsed * 1000)
+            answers[question] = {"answer": result['answer'] if result else None,
+                                 "score": result['score'] if result else 0.0}
+
+    results[backend] = {
+        "load_seconds": round(load_seconds, 2),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 2),
+            "p50": round(percentile(latencies, 0.5), 2),
+            "p95": round(percentile(latencies, 0.95), 2),
+        },
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "answers": answers,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="timed rounds over the question set")
+    parser.add_argument("--output", help="write the report here as JSON")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    manager = context.Manager()
+    results = manager.dict()
+    for backend in ("torch", "onnx"):
+        process = context.Process(target=run_backend, args=(backend, args.repeat, results))
+        process.start()
+        process.join()
+        if backend not in results:
+            sys.exit(f"{backend} backend failed")
+
+    report = {backend: dict(results[backend]) for backend in ("torch", "onnx")}
+    torch_answers = report["torch"]["answers"]
+    onnx_answers = report["onnx"]["answers"]
+    report["agreement"] = {
+        "exact_answer_match": round(sum(
+            torch_answers[q]["answer"] == onnx_answers[q]["answer"] for q in QUESTIONS) / len(QUESTIONS), 3),
+        "mean_abs_score_diff": round(sum(
+            abs(torch_answers[q]["score"] - onnx_answers[q]["score"]) for q in QUESTIONS) / len(QUESTIONS), 4),
+    }
+    report["speedup_p50"] = round(report["torch"]["latency_ms"]["p50"] / report["onnx"]["latency_ms"]["p50"], 2)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
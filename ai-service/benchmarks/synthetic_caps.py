@@ -0,0 +1,96 @@
+"""Synthetic CAPS curriculum documents for benchmarks and load tests.
+
+Pages follow the layout of demo-caps-content.md (grade/subject heading,
+learning outcomes, assessment standards, key concepts, term breakdown,
+skills, activities, resources) with the wording varied per page, so the
+curriculum analyzer and retriever see realistic, non-repeating input.
+"""
+import random
+
+SUBJECTS = {
+    "Mathematics": ["Trigonometry", "Calculus", "Probability", "Euclidean Geometry", "Algebra"],
+    "Physical Sciences": ["Mechanics", "Electricity", "Chemical Change", "Waves and Sound"],
+    "Life Sciences": ["Genetics", "Evolution", "Human Physiology", "Ecology"],
+    "Geography": ["Climatology", "Geomorphology", "Settlement", "Economic Geography"],
+    "English Home Language": ["Poetry", "Comprehension", "Creative Writing", "Language Structures"],
+}
+VERBS = ["Understand", "Apply", "Derive", "Analyse", "Explain", "Evaluate", "Solve", "Investigate"]
+NOUNS = ["identities", "functions", "models", "equations", "processes", "relationships",
+         "patterns", "arguments", "experiments", "representations"]
+QUALIFIERS = ["from first principles", "in real-world contexts", "using algebraic manipulation",
+              "through group work", "with calculators", "in written reports", "under exam conditions"]
+ACTIVITIES = ["Group investigation", "Peer teaching", "Calculator-based exploration",
+              "Field observation", "Structured debate", "Practical experiment", "Past paper practice"]
+RESOURCES = ["Scientific calculators", "Graphing software", "Reference sheets", "Practice problem sets",
+             "Assessment rubrics", "Laboratory equipment", "Textbooks", "Atlases"]
+
+# Questions that exercise routing (educational/creative/complex) and plain lookups
+QUESTIONS = [
+    "What should I study for the assessment on this topic?",
+    "Can you explain the learning outcomes for this term?",
+    "Write an example problem about the key concepts",
+    "What happens in weeks 3-4?",
+    "Which resources are needed for the activities?",
+    "How do I learn the skills in this curriculum?",
+    "Create a study plan for the term",
+    "What are the assessment standards?",
+]
+
+
+def _phrase(rng):
+    return f"{rng.choice(VERBS)} {rng.choice(NOUNS)} {rng.choice(QUALIFIERS)}"
+
+
+def make_caps_page(rng, page_number):
+    """One page of CAPS-style curriculum text."""
+    subject = rng.choice(sorted(SUBJECTS))
+    topic = rng.choice(SUBJECTS[subject])
+    grade = rng.randint(10, 12)
+    term = rng.randint(1, 4)
+    lines = [
+        f"Grade {grade} {subject} - {topic}",
+        "",
+        "Learning Outcomes:",
+        *[f"- {_phrase(rng)}" for _ in range(4)],
+        "",
+        "Assessment Standards:",
+        *[f"- Students can {_phrase(rng).lower()}" for _ in range(3)],
+        "",
+        "Key Concepts:",
+        *[f"- {topic} {rng.choice(NOUNS).title()}" for _ in range(4)],
+        "",
+        f"Term {term} Breakdown:",
+        *[f"Week {week}-{week + 1}: {_phrase(rng)}" for week in (1, 3, 5, 7)],
+        "",
+        "Skills Development:",
+        *[f"- {rng.choice(NOUNS).title()} reasoning and communication" for _ in range(3)],
+        "",
+        "Activities:",
+        *[f"- {activity}" for activity in rng.sample(ACTIVITIES, 3)],
+        "",
+        "Resources Needed:",
+        *[f"- {resource}" for resource in rng.sample(RESOURCES, 3)],
+        "",
+        f"Time allocation: {rng.randint(2, 8)} hours per week. Page {page_number}.",
+    ]
+    return "\n".join(lines)
+
+
+def make_caps_pages(pages, seed=0):
+    rng = random.Random(seed)
+    return [make_caps_page(rng, page_number) for page_number in range(1, pages + 1)]
+
+
+def make_caps_pdf(path, pages, seed=0):
+    """Write a synthetic CAPS PDF with the given number of pages; returns its page texts."""
+    import fitz
+
+    page_texts = make_caps_pages(pages, seed)
+    with fitz.open() as document:
+        for text in page_texts:
+            page = document.new_page()
+            page.insert_textbox(fitz.Rect(50, 50, 560, 800), text, fontsize=9)
+        document.set_metadata({"title": f"Synthetic CAPS curriculum ({pages} pages)",
+                               "author": "benchmarks"})
+        document.save(path)
+    return page_texts
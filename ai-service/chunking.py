@@ -0,0 +1,103 @@
+import bisect
+import re
+from itertools import accumulate
+
+_WORD = re.compile(r'\S+')
+_SENTENCE_END = re.compile(r'[.!?]["\')\]]*(?=\s|\Z)')
+
+
+def chunk_document(text, page_offsets=None, max_chunk_size=500, overlap=0,
+                   tokenizer=None, respect_sentences=True, respect_pages=True):
+    """Split text into chunks in a single linear pass.
+
+    Sizes are measured in characters, or in model tokens when a (fast)
+    ``tokenizer`` is given. Chunks end at a sentence boundary when one falls
+    in the second half of the chunk, never cross a page boundary when
+    ``page_offsets`` are known, and repeat up to ``overlap`` (same unit) of
+    the previous chunk's tail. Each chunk is a dict with its 'text', the
+    'start'/'end' character span in ``text`` and its 1-based 'page' and
+    'end_page'.
+    """
+    words = text.split()
+    if not words:
+        return []
+    spans = [m.span() for m in _WORD.finditer(text)]
+    num_words = len(words)
+
+    if tokenizer is not None:
+        sizes = _token_counts(text, spans, tokenizer)
+        separator = 0
+    else:
+        sizes = map(len, words)
+        separator = 1  # words are re-joined with single spaces
+
+    # cumulative[i] - cumulative[j] - separator is the size of words[j:i], so
+    # every "how far does this chunk reach" question is a binary search.
+    cumulative = [0]
+    cumulative.extend(accumulate(size + separator for size in sizes))
+
+    if page_offsets and respect_pages:
+        # Word index where each page starts; chunks never straddle one
+        page_starts = [bisect.bisect_left(spans, (offset, -1)) for offset in page_offsets[1:]]
+        page_starts.append(num_words)
+    else:
+        page_starts = [num_words]
+
+    sentence_ends = []
+    if respect_sentences:
+        # Word index just past every word ending in . ! or ? (optionally followed by closers)
+        sentence_ends = [bisect.bisect_left(spans, (m.end(), -1))
+                         for m in _SENTENCE_END.finditer(text)]
+
+    chunks = []
+    lo = 0
+    while lo < num_words:
+        limit = page_starts[bisect.bisect_right(page_starts, lo)]
+        hi = bisect.bisect_right(cumulative, cumulative[lo] + max_chunk_size + separator, lo + 2, limit + 1) - 1
+        hi = max(hi, lo + 1)
+
+        if hi < limit and sentence_ends:
+            last_sentence_end = sentence_ends[bisect.bisect_right(sentence_ends, hi) - 1] \
+                if bisect.bisect_right(sentence_ends, hi) else 0
+            if lo < last_sentence_end < hi and \
+                    (cumulative[last_sentence_end] - cumulative[lo] - separator) * 2 >= max_chunk_size:
+                hi = last_sentence_end
+
+        start, end = spans[lo][0], spans[hi - 1][1]
+        chunks.append({
+            'text': " ".join(words[lo:hi]),
+            'start': start,
+            'end': end,
+            'page': _page_number(page_offsets, start),
+            'end_page': _page_number(page_offsets, end - 1),
+        })
+
+        next_lo = hi
+        if overlap and hi < limit:
+            target = cumulative[hi] - separator - overlap
+            next_lo = max(lo + 1, bisect.bisect_left(cumulative, target, lo + 1, hi))
+        lo = next_lo
+
+    return chunks
+
+
+def _page_number(page_offsets, offset):
+    if not page_offsets:
+        return 1
+    return bisect.bisect_right(page_offsets, offset) or 1
+
+
+def _token_counts(text, spans, tokenizer):
+    """Number of tokenizer tokens falling inside each whitespace-delimited word."""
+    encoded = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True,
+                        verbose=False)
+    counts = [0] * len(spans)
+    word = 0
+    for token_start, token_end in encoded['offset_mapping']:
+        if token_end <= token_start:
+            continue
+        while word < len(spans) - 1 and token_start >= spans[word][1]:
+            word += 1
+        counts[word] += 1
+    # Guard against words the tokenizer dropped entirely (e.g. control chars)
+    return [count or 1 for count in counts]
@@ -0,0 +1,195 @@
+import threading
+
+# Used when tiktoken is not installed: about four characters per token for English
+CHARS_PER_TOKEN = 4
+# Truncated text is cut back to the last sentence (or line) end when that
+# keeps at least this fraction of what fits, otherwise to the last word
+_MIN_SENTENCE_KEEP = 0.5
+# Allowance for the separator each packed piece is joined with
+SEPARATOR_TOKENS = 1
+
+
+class Tokenizer:
+    """Counts and truncates text in a BPE encoding's tokens (tiktoken).
+
+    Without tiktoken it falls back to a character estimate, which ``name``
+    reports as "estimate" so budgets can be read with that in mind.
+    """
+
+    _cache = {}
+    _cache_lock = threading.Lock()
+
+    def __init__(self, encoding="cl100k_base"):
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(encoding)
+            self.name = f"tiktoken:{encoding}"
+        except Exception as e:
+            print(f"⚠️ tiktoken unavailable, estimating prompt tokens from length: {e}")
+            self._encoding = None
+            self.name = "estimate"
+
+    @classmethod
+    def get(cls, encoding="cl100k_base"):
+        """Shared tokenizer per encoding; loading an encoding takes a moment."""
+        with cls._cache_lock:
+            if encoding not in cls._cache:
+                cls._cache[encoding] = cls(encoding)
+            return cls._cache[encoding]
+
+    def count(self, text):
+        if not text:
+            return 0
+        if self._encoding is None:
+            return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text, max_tokens):
+        """The longest prefix of text within max_tokens, ending at a sentence or word boundary."""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        if self._encoding is None:
+            prefix = text[:max_tokens * CHARS_PER_TOKEN]
+        else:
+            prefix = self._encoding.decode(self._encoding.encode(text, disallowed_special=())[:max_tokens])
+        sentence_end = max(prefix.rfind(". "), prefix.rfind("? "), prefix.rfind("! "), prefix.rfind("\n"))
+        if sentence_end >= len(prefix) * _MIN_SENTENCE_KEEP:
+            return prefix[:sentence_end + 1].rstrip()
+        word_end = prefix.rfind(" ")
+        return (prefix[:word_end] if word_end > 0 else prefix).rstrip()
+
+
+class ContextBudgeter:
+    """Packs the variable parts of a prompt into a provider's token budget.
+
+    The instructions (the prompt template with its section labels) and the
+    question always go in; the question is cut only if it alone would
+    overflow the budget. What remains is shared out by value: conversation
+    history, newest first, up to ``history_share`` of it; curriculum
+    metadata lines up to
+    ``metadata_share``; and the retrieved chunks, in retrieval order, get
+    the rest, including whatever history and metadata left unused. A chunk
+    that does not fit whole is cut at a sentence boundary when at least
+    ``min_chunk_tokens`` of room remain, and dropped otherwise.
+
+    ``pack`` returns the parts that fit and a report of token counts and
+    every truncation, for the /ask_ai response. Tokens are counted in the
+    ``encoding`` the provider's model uses (or the closest available one).
+    """
+
+    def __init__(self, max_tokens, encoding="cl100k_base", history_share=0.15, metadata_share=0.1,
+                 min_chunk_tokens=64):
+        self.max_tokens = max_tokens
+        self.encoding = encoding
+        self.history_share = history_share
+        self.metadata_share = metadata_share
+        self.min_chunk_tokens = min_chunk_tokens
+
+    @property
+    def tokenizer(self):
+        # Resolved on first use, so importing the app never loads an encoding
+        return Tokenizer.get(self.encoding)
+
+    def pack(self, instructions, question, history=(), metadata=(), chunks=()):
+        """Fit question, history (oldest first), metadata lines and (index, text) chunks.
+
+        Returns ({"question", "history", "metadata", "chunks"}, report).
+        """
+        tokenizer = self.tokenizer
+        count = tokenizer.count
+        truncations = []
+        instruction_tokens = count(instructions)
+        remaining = self.max_tokens - instruction_tokens
+
+        question_tokens = count(question)
+        if question_tokens > remaining:
+            question = tokenizer.truncate(question, max(remaining, 0))
+            truncations.append(f"question cut from {question_tokens} to {count(question)} tokens")
+            question_tokens = count(question)
+        remaining -= question_tokens
+        shareable = max(remaining, 0)
+
+        # Newest exchanges are worth most; keep them in conversation order
+        kept_history, history_tokens = [], 0
+        history_budget = int(shareable * self.history_share)
+        for position, entry in enumerate(reversed(history)):
+            tokens = count(entry) + SEPARATOR_TOKENS
+            if history_tokens + tokens > history_budget:
+                truncations.append(f"dropped {len(history) - position} older history entries")
+                break
+            kept_history.insert(0, entry)
+            history_tokens += tokens
+        remaining -= history_tokens
+
+        kept_metadata, metadata_tokens = [], 0
+        metadata_budget = int(shareable * self.metadata_share)
+        for position, line in enumerate(metadata):
+            tokens = count(line) + SEPARATOR_TOKENS
+            room = metadata_budget - metadata_tokens - SEPARATOR_TOKENS
+            if tokens - SEPARATOR_TOKENS > room:
+                # Long lists (key concepts, outcomes) keep their leading items
+                cut = tokenizer.truncate(line, room) if room >= self.min_chunk_tokens // 4 else ""
+                if cut:
+                    kept_metadata.append(cut)
+                    metadata_tokens += count(cut) + SEPARATOR_TOKENS
+                    truncations.append(f"curriculum metadata line {position + 1} cut from "
+                                       f"{tokens - SEPARATOR_TOKENS} to {count(cut)} tokens")
+                dropped_lines = len(metadata) - len(kept_metadata)
+                if dropped_lines:
+                    truncations.append(f"dropped {dropped_lines} curriculum metadata lines")
+                break
+            kept_metadata.append(line)
+            metadata_tokens += tokens
+        remaining -= metadata_tokens
+
+        kept_chunks, chunk_tokens, dropped = [], 0, []
+        for index, text in chunks:
+            tokens = count(text)
+            room = remaining - chunk_tokens - SEPARATOR_TOKENS
+            if tokens <= room:
+                kept_chunks.append((index, text))
+                chunk_tokens += tokens + SEPARATOR_TOKENS
+            elif room >= self.min_chunk_tokens:
+                cut = tokenizer.truncate(text, room)
+                kept_chunks.append((index, cut))
+                chunk_tokens += count(cut) + SEPARATOR_TOKENS
+                truncations.append(f"chunk {index} cut from {tokens} to {count(cut)} tokens")
+            else:
+                dropped.append(index)
+        if dropped:
+            truncations.append(f"dropped chunks {', '.join(str(index) for index in dropped)}")
+
+        report = {
+            "budget": self.max_tokens,
+            "tokenizer": tokenizer.name,
+            "tokens": {
+                "instructions": instruction_tokens,
+                "question": question_tokens,
+                "history": history_tokens,
+                "metadata": metadata_tokens,
+                "chunks": chunk_tokens,
+            },
+            "included": {
+                "history": f"{len(kept_history)}/{len(history)}",
+                "metadata": f"{len(kept_metadata)}/{len(metadata)}",
+                "chunks": [index for index, _ in kept_chunks],
+            },
+            "truncations": truncations,
+        }
+        parts = {"question": question, "history": kept_history, "metadata": kept_metadata,
+                 "chunks": kept_chunks}
+        return parts, report
+
+
+def curriculum_metadata_lines(pdf_metadata):
+    """The document's curriculum structure as prompt lines, most useful first."""
+    structure = (pdf_metadata or {}).get('curriculum_structure', {})
+    lines = []
+    for label, key in (("Grades", 'grades'), ("Subject areas", 'subject_areas'), ("Key concepts", 'concepts'),
+                       ("Learning outcomes", 'learning_outcomes')):
+        values = structure.get(key)
+        if values:
+            lines.append(f"- {label}: {', '.join(str(value) for value in values)}")
+    return lines
@@ -0,0 +1,200 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryConversationStore:
+    """In-process conversation histories with idle expiry and an LRU session cap.
+
+    Each session keeps its last ``max_exchanges`` exchanges. A session idle
+    for ``ttl`` seconds expires, and beyond ``max_sessions`` the least
+    recently active session is evicted.
+    """
+
+    def __init__(self, max_sessions=1000, max_exchanges=10, ttl=86400):
+        self.max_sessions = max_sessions
+        self.max_exchanges = max_exchanges
+        self.ttl = ttl
+        self.evictions = 0
+        self.expirations = 0
+        self._sessions = OrderedDict()  # session id -> (last active, exchanges)
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._live_entry(session_id, time.time())
+            return list(entry[1]) if entry else []
+
+    def append(self, session_id, exchange):
+        """Add an exchange and return how many the session now holds."""
+        now = time.time()
+        with self._lock:
+            entry = self._live_entry(session_id, now)
+            exchanges = entry[1] if entry else []
+            exchanges.append(exchange)
+            del exchanges[:-self.max_exchanges]
+            self._sessions[session_id] = (now, exchanges)
+            self._sessions.move_to_end(session_id)
+            self._evict(now)
+            return len(exchanges)
+
+    def clear(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "exchanges": sum(len(exchanges) for _, exchanges in self._sessions.values()),
+                "max_sessions": self.max_sessions,
+                "max_exchanges": self.max_exchanges,
+                "ttl": self.ttl,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _live_entry(self, session_id, now):
+        entry = self._sessions.get(session_id)
+        if entry and entry[0] + self.ttl <= now:
+            del self._sessions[session_id]
+            self.expirations += 1
+            return None
+        return entry
+
+    def _evict(self, now):
+        # Sessions are ordered by last activity, so expired ones are at the front
+        while self._sessions:
+            session_id, (last_active, _) = next(iter(self._sessions.items()))
+            if last_active + self.ttl <= now:
+                self._sessions.popitem(last=False)
+                self.expirations += 1
+            elif len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+            else:
+                break
+
+
+class SQLiteConversationStore:
+    """SQLite-backed conversation histories, shared by workers and kept across restarts.
+
+    Same limits as MemoryConversationStore; eviction and expiry counts are
+    per process.
+    """
+
+    def __init__(self, path, max_sessions=10000, max_exchanges=10, ttl=86400):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.max_exchanges = max_exchanges
+        self.ttl = ttl
+        self.evictions = 0
+        self.expirations = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection_pid = None
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, last_active REAL NOT NULL)")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS sessions_last_active ON sessions (last_active)")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS exchanges ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+                "timestamp TEXT NOT NULL, user TEXT NOT NULL, ai TEXT NOT NULL)")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS exchanges_session ON exchanges (session_id, id)")
+
+    @property
+    def _connection(self):
+        # SQLite connections must not cross a fork: each worker opens its own
+        if self._connection_pid != os.getpid():
+            self._connection_handle = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._connection_pid = os.getpid()
+        return self._connection_handle
+
+    def get(self, session_id):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT last_active FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None or row[0] + self.ttl <= time.time():
+                return []
+            rows = self._connection.execute(
+                "SELECT timestamp, user, ai FROM exchanges WHERE session_id = ? ORDER BY id",
+                (session_id,)).fetchall()
+        return [{"timestamp": timestamp, "user": user, "ai": ai} for timestamp, user, ai in rows]
+
+    def append(self, session_id, exchange):
+        """Add an exchange and return how many the session now holds."""
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT last_active FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is not None and row[0] + self.ttl <= now:
+                # An expired session starts over
+                self._connection.execute("DELETE FROM exchanges WHERE session_id = ?", (session_id,))
+            self._connection.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, last_active) VALUES (?, ?)",
+                (session_id, now))
+            self._connection.execute(
+                "INSERT INTO exchanges (session_id, timestamp, user, ai) VALUES (?, ?, ?, ?)",
+                (session_id, exchange["timestamp"], exchange["user"], exchange["ai"]))
+            self._connection.execute(
+                "DELETE FROM exchanges WHERE session_id = ? AND id NOT IN ("
+                "SELECT id FROM exchanges WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                (session_id, session_id, self.max_exchanges))
+            self.expirations += self._delete_sessions(
+                "SELECT session_id FROM sessions WHERE last_active <= ?", (now - self.ttl,))
+            self.evictions += self._delete_sessions(
+                "SELECT session_id FROM sessions ORDER BY last_active DESC LIMIT -1 OFFSET ?",
+                (self.max_sessions,))
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM exchanges WHERE session_id = ?", (session_id,)).fetchone()[0]
+
+    def clear(self, session_id):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM exchanges WHERE session_id = ?", (session_id,))
+            return self._connection.execute(
+                "DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount > 0
+
+    def stats(self):
+        with self._lock:
+            sessions = self._connection.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            exchanges = self._connection.execute("SELECT COUNT(*) FROM exchanges").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "sessions": sessions,
+            "exchanges": exchanges,
+            "max_sessions": self.max_sessions,
+            "max_exchanges": self.max_exchanges,
+            "ttl": self.ttl,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "path": self.path,
+        }
+
+    def _delete_sessions(self, select, params):
+        session_ids = [row[0] for row in self._connection.execute(select, params).fetchall()]
+        for session_id in session_ids:
+            self._connection.execute("DELETE FROM exchanges WHERE session_id = ?", (session_id,))
+            self._connection.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        return len(session_ids)
+
+
+def build_conversation_store(backend="memory", max_sessions=1000, max_exchanges=10, ttl=86400,
+                             path=None):
+    """Conversation store for a backend name ('memory' or 'sqlite')."""
+    if backend == 'sqlite':
+        try:
+            return SQLiteConversationStore(path, max_sessions, max_exchanges, ttl)
+        except Exception as e:
+            print(f"⚠️ SQLite conversation store unavailable, using memory: {e}")
+    elif backend != 'memory':
+        print(f"⚠️ Unknown conversation store backend '{backend}', using memory")
+    return MemoryConversationStore(max_sessions, max_exchanges, ttl)
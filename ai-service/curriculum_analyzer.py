@@ -0,0 +1,149 @@
+import re
+
+# Field patterns, compiled once. Each category records its matches into the
+# curriculum structure exactly as the old per-pattern re.findall passes did.
+_CATEGORIES = {
+    'grades': r'Grade\s+(\d+)',
+    'learning_outcomes': r'Learning\s+Outcome[s]?\s*:?\s*([^\n]+)',
+    'assessment_standards': r'Assessment\s+Standard[s]?\s*:?\s*([^\n]+)',
+    'content_areas': r'Content\s+Area[s]?\s*:?\s*([^\n]+)',
+    'topics': r'Topic[s]?\s*:?\s*([^\n]+)',
+    'skills': r'Skill[s]?\s*:?\s*([^\n]+)',
+    'concepts': r'Concept[s]?\s*:?\s*([^\n]+)',
+    'term_breakdown': r'Term\s+(\d+)\s*:?\s*([^\n]+)',
+    'weekly_breakdown': r'Week\s+(\d+)\s*:?\s*([^\n]+)',
+    'objectives': r'(?:Learning\s+)?Objective[s]?\s*:?\s*([^\n]+)',
+    'activities': r'Activit(?:y|ies)\s*:?\s*([^\n]+)',
+    'resources': r'Resource[s]?\s*:?\s*([^\n]+)',
+    'time_allocations': r'Time\s*:?\s*(\d+)\s*(?:hours?|minutes?|periods?)',
+    'mathematical_concepts': r'(?:sin|cos|tan|algebra|geometry|calculus|trigonometry|logarithm|equation|formula|theorem)',
+    'subject_areas': r'(?:Mathematics|Science|English|History|Geography|Life Sciences|Physical Sciences|Technology)',
+}
+_CATEGORIES = {category: re.compile(pattern, re.IGNORECASE) for category, pattern in _CATEGORIES.items()}
+# The old 'Knowledge:' pattern never had a key in the structure, so its
+# matches were always dropped; it is not scanned at all any more.
+
+_SECTION = re.compile(
+    r'(?:^|\n)\s*(?:\d+\.?\s*)?([A-Z][^.\n]*(?:Identity|Formula|Concept|Topic|Skill|Knowledge|Learning|Assessment)[^.\n]*)',
+    re.MULTILINE | re.IGNORECASE)
+
+# Literal words the patterns can start with, and the categories to try at
+# each. No word is a prefix of another, so at most one matches at a position.
+_TRIGGERS = {
+    'grade': ('grades',),
+    'learning': ('learning_outcomes', 'objectives'),
+    'assessment': ('assessment_standards',),
+    'content': ('content_areas',),
+    'topic': ('topics',),
+    'skill': ('skills',),
+    'concept': ('concepts',),
+    'term': ('term_breakdown',),
+    'week': ('weekly_breakdown',),
+    'objective': ('objectives',),
+    'activit': ('activities',),
+    'resource': ('resources',),
+    'time': ('time_allocations',),
+}
+_TRIGGERS.update(dict.fromkeys(
+    ('sin', 'cos', 'tan', 'algebra', 'geometry', 'calculus', 'trigonometry', 'logarithm',
+     'equation', 'formula', 'theorem'), ('mathematical_concepts',)))
+_TRIGGERS.update(dict.fromkeys(
+    ('mathematics', 'science', 'english', 'history', 'geography', 'life', 'physical',
+     'technology'), ('subject_areas',)))
+
+# A plain case-sensitive alternation over a lowercased copy of the text is
+# scanned several times faster than any IGNORECASE or grouped variant.
+_TRIGGER_SCAN = re.compile('|'.join(_TRIGGERS))
+# Characters that IGNORECASE matches against an ASCII letter but that do not
+# lowercase to it; they are mapped to that letter before scanning.
+_CASE_FOLDS = str.maketrans({'\u0130': 'i', '\u0131': 'i', '\u017f': 's'})
+
+_SET_FIELDS = ('grades', 'mathematical_concepts', 'subject_areas')
+
+
+def _scan_text(text):
+    if any(character in text for character in '\u0130\u0131\u017f'):
+        text = text.translate(_CASE_FOLDS)
+    return text.lower()
+
+
+class CurriculumAnalyzer:
+    """Single-pass CAPS curriculum extractor that can be fed page by page.
+
+    Each ``feed`` makes one scan for the words any field pattern can start
+    with and runs only the relevant precompiled pattern there, reproducing
+    the old per-pattern ``re.findall`` results. Matches never span two
+    ``feed`` calls, so a document can be analyzed as its pages stream in.
+    """
+
+    def __init__(self):
+        self.structure = {
+            'grades': {},
+            'learning_outcomes': [],
+            'assessment_standards': [],
+            'content_areas': [],
+            'topics': [],
+            'skills': [],
+            'concepts': [],
+            'knowledge_areas': [],
+            'term_breakdown': {},
+            'weekly_breakdown': {},
+            'objectives': [],
+            'activities': [],
+            'resources': [],
+            'time_allocations': [],
+            'mathematical_concepts': {},
+            'subject_areas': {},
+            'sections': []
+        }
+
+    def feed(self, text):
+        """Analyze another piece of the document (typically a page or batch)."""
+        # Where each pattern may match next; findall resumes after a match
+        resume_at = dict.fromkeys(_CATEGORIES, 0)
+        scan_text = _scan_text(text)
+        search = _TRIGGER_SCAN.search
+
+        # Trigger words may overlap ("cosine"), so resume one past each hit
+        trigger = search(scan_text)
+        while trigger:
+            pos = trigger.start()
+            for category in _TRIGGERS[trigger.group()]:
+                if pos >= resume_at[category]:
+                    match = _CATEGORIES[category].match(text, pos)
+                    if match:
+                        resume_at[category] = match.end()
+                        self._record(category, match)
+            trigger = search(scan_text, pos + 1)
+
+        self.structure['sections'].extend(
+            section.strip() for section in _SECTION.findall(text) if len(section.strip()) > 5)
+        return self
+
+    def _record(self, category, match):
+        structure = self.structure
+        if category == 'grades':
+            structure['grades'].setdefault(match.group(1), None)
+        elif category == 'term_breakdown':
+            structure['term_breakdown'][f'Term {match.group(1)}'] = match.group(2).strip()
+        elif category == 'weekly_breakdown':
+            structure['weekly_breakdown'][f'Week {match.group(1)}'] = match.group(2).strip()
+        elif category == 'time_allocations':
+            structure['time_allocations'].append(match.group(1))
+        elif category in ('mathematical_concepts', 'subject_areas'):
+            # Sets are kept as dicts so the output order is first-seen order
+            structure[category].setdefault(match.group(0).lower(), None)
+        else:
+            value = match.group(1).strip()
+            if value:
+                structure[category].append(value)
+
+    def result(self):
+        """The curriculum structure so far, as a fresh JSON-serializable dict."""
+        return {key: (list(value) if key in _SET_FIELDS or isinstance(value, list) else dict(value))
+                for key, value in self.structure.items()}
+
+
+def analyze_caps_structure(text):
+    """Analyze CAPS curriculum structure and extract key concepts."""
+    return CurriculumAnalyzer().feed(text).result()
@@ -0,0 +1,215 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class DocumentStore:
+    """Thread-safe registry of processed documents keyed by (owner, document id).
+
+    Documents are plain dicts holding the text, chunks, metadata (with the
+    curriculum structure) and retrieval index of one upload. The store is
+    bounded both by document count and by approximate text size; the least
+    recently used documents are evicted first. Each WSGI worker keeps its own
+    store, so a miss can be filled by the optional ``loader`` callback, which
+    rebuilds a document from its id for an owner (or returns None). Concurrent
+    misses for the same document share one rebuild. When ``owns`` is given,
+    every lookup first checks ``owns(document_id, owner)``, so access revoked
+    by another worker is honoured even for documents held here.
+    """
+
+    def __init__(self, max_documents=32, max_bytes=256 * 1024 * 1024, loader=None, owns=None):
+        self.max_documents = max_documents
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.owns = owns
+        self._documents = OrderedDict()
+        self._loading = {}
+        self._latest_by_owner = {}
+        self._total_bytes = 0
+        self._evictions = 0
+        self._lock = threading.RLock()
+
+    def put(self, document):
+        """Store a document and make it the owner's most recent one."""
+        key = (document['owner'], document['document_id'])
+        size = document_size(document)
+        with self._lock:
+            if key in self._documents:
+                self._total_bytes -= self._documents.pop(key)[1]
+            self._documents[key] = (document, size)
+            self._total_bytes += size
+            self._latest_by_owner[document['owner']] = document['document_id']
+            self._evict()
+        return document
+
+    def get(self, document_id, owner):
+        """Return the owner's document, loading it on a miss if possible."""
+        key = (owner, document_id)
+        if self.owns and not self.owns(document_id, owner):
+            self.remove(document_id, owner)
+            return None
+        with self._lock:
+            entry = self._documents.get(key)
+            if entry is not None:
+                self._documents.move_to_end(key)
+                return entry[0]
+            if not self.loader:
+                return None
+            pending = self._loading.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._loading[key] = Future()
+
+        if not leader:
+            return pending.result()
+        # Load outside the lock so slow rebuilds don't block other requests
+        try:
+            document = self.loader(document_id, owner)
+            if document is not None:
+                document['owner'] = owner
+                self.put(document)
+            pending.set_result(document)
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._loading[key]
+        return document
+
+    def latest(self, owner):
+        """Return the document the owner uploaded most recently, if still held."""
+        with self._lock:
+            document_id = self._latest_by_owner.get(owner)
+        if document_id is None:
+            return None
+        return self.get(document_id, owner)
+
+    def latest_id(self, owner):
+        """Id of the document the owner uploaded most recently, if still held."""
+        with self._lock:
+            return self._latest_by_owner.get(owner)
+
+    def remove(self, document_id, owner):
+        """Drop one of the owner's documents. Returns True if it was held."""
+        key = (owner, document_id)
+        with self._lock:
+            entry = self._documents.pop(key, None)
+            if entry is None:
+                return False
+            self._total_bytes -= entry[1]
+            if self._latest_by_owner.get(owner) == document_id:
+                del self._latest_by_owner[owner]
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "documents": len(self._documents),
+                "owners": len(self._latest_by_owner),
+                "bytes": self._total_bytes,
+                "max_documents": self.max_documents,
+                "max_bytes": self.max_bytes,
+                "evictions": self._evictions,
+            }
+
+    def _evict(self):
+        # Always keep the newest document, even if it alone exceeds the budget
+        while len(self._documents) > 1 and (
+                len(self._documents) > self.max_documents or self._total_bytes > self.max_bytes):
+            (owner, document_id), (_, size) = self._documents.popitem(last=False)
+            self._total_bytes -= size
+            self._evictions += 1
+            if self._latest_by_owner.get(owner) == document_id:
+                del self._latest_by_owner[owner]
+
+
+def document_size(document):
+    """Approximate memory held by a document: its text plus its chunks."""
+    return len(document.get('text', '')) + sum(len(chunk) for chunk in document.get('chunks', []))
+
+
+def save_uploaded_pdf(file_storage, upload_folder, owner):
+    """Stream an upload to disk, naming it by the SHA-256 of its bytes.
+
+    Returns (document_id, filepath). The content hash doubles as the document
+    id, so every worker can find the same file again after a store miss;
+    ``owner`` is recorded next to it (see ``owns_upload``), along with the
+    name they uploaded it under (see ``uploaded_filename``).
+    """
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=upload_folder, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                block = file_storage.stream.read(1024 * 1024)
+                if not block:
+                    break
+                digest.update(block)
+                out.write(block)
+        document_id = digest.hexdigest()
+        filepath = os.path.join(upload_folder, f"{document_id}.pdf")
+        os.replace(temp_path, filepath)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    marker = _owner_marker(document_id, owner, upload_folder)
+    os.makedirs(os.path.dirname(marker), exist_ok=True)
+    with open(marker, 'w', encoding='utf-8') as f:
+        f.write(file_storage.filename or '')
+    return document_id, filepath
+
+
+def uploaded_pdf_path(document_id, upload_folder):
+    """Path of a previously saved upload, or None if it is not on disk."""
+    if not _valid_document_id(document_id):
+        return None
+    filepath = os.path.join(upload_folder, f"{document_id}.pdf")
+    return filepath if os.path.exists(filepath) else None
+
+
+def owns_upload(document_id, owner, upload_folder):
+    """Whether owner uploaded this document and has not cleared it since.
+
+    Ownership lives on disk next to the upload (one marker file per owner,
+    holding their filename), so every worker sees the same answer.
+    """
+    if not _valid_document_id(document_id):
+        return False
+    return os.path.exists(_owner_marker(document_id, owner, upload_folder))
+
+
+def uploaded_filename(document_id, owner, upload_folder):
+    """The name owner gave the upload, or None if unknown (or they do not own it)."""
+    if not _valid_document_id(document_id):
+        return None
+    try:
+        with open(_owner_marker(document_id, owner, upload_folder), encoding='utf-8') as f:
+            return f.read() or None
+    except OSError:
+        return None
+
+
+def release_upload(document_id, owner, upload_folder):
+    """Revoke owner's access to an upload. Returns True if they had it."""
+    if not _valid_document_id(document_id):
+        return False
+    try:
+        os.remove(_owner_marker(document_id, owner, upload_folder))
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _valid_document_id(document_id):
+    return bool(document_id) and all(c in '0123456789abcdef' for c in document_id)
+
+
+def _owner_marker(document_id, owner, upload_folder):
+    # Owner ids are user input, so the marker is named by their hash
+    owner_hash = hashlib.sha256(str(owner).encode('utf-8')).hexdigest()
+    return os.path.join(upload_folder, f"{document_id}.owners", owner_hash)
@@ -1,74 +1,222 @@
-import fitz  # PyMuPDF for PDF text extraction
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 from flask_cors import CORS
-from transformers import pipeline  # For basic, local QA
 import os
 import requests
 import json
 from datetime import datetime
-import google.generativeai as genai
-from openai import OpenAI
 from dotenv import load_dotenv
 import random
-import re
+from qa_engine import build_qa_engine
+from qa_server import RemoteQAEngine
+from qa_scheduler import MicroBatchScheduler, QAQueueFull
+from retrieval import DEFAULT_EMBEDDING_MODEL, get_embedder, select_chunk_indices
+from document_store import (DocumentStore, owns_upload, release_upload, save_uploaded_pdf,
+                            uploaded_filename, uploaded_pdf_path)
+from ingestion_cache import IngestionCache
+from ingestion import IngestionJobs, IngestionPipeline
+from pdf_extraction import start_extraction_pool
+from chunking import chunk_document
+from response_cache import build_response_cache
+from semantic_cache import SemanticCache
+from conversation_store import build_conversation_store
+from metrics import instrument_app, register_collector, span, timed
+from response_formatting import final_formatting_pass, format_response_structure, make_conversational
+from keyword_matcher import question_features, response_features
+from context_budget import ContextBudgeter, Tokenizer, curriculum_metadata_lines
+from providers import (CircuitBreaker, Provider, ProviderDispatcher, ProviderOverloaded, StreamInterrupted,
+                       StubProvider)
+from provider_router import CostAwareRouter
+from model_registry import ModelRegistry
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for integration with Node.js backend
+instrument_app(app)  # /metrics, plus per-request timings with an X-Debug-Timing header
+# Fork the PDF extraction workers while the process is still single-threaded
+start_extraction_pool()
 
 # --- Enhanced AI Configuration ---
 # Multiple AI providers for different capabilities
 
+# Models and clients load on first use or on a warm-up thread
+# (MODEL_WARMUP=lazy|background|eager) so the service answers /health
+# immediately; SDK imports are deferred into the loaders. See model_registry.py.
+MODEL_WARMUP = os.getenv('MODEL_WARMUP', 'background')
+
 # 1. Local DistilBERT (fast, offline, basic QA)
-try:
-    qa_pipeline = pipeline("question-answering", model="distilbert-base-cased-distilled-squad")
-    print("✅ Local QA model (DistilBERT) loaded successfully")
-except Exception as e:
-    print(f"⚠️ Warning: Could not load local QA model. Error: {e}")
-    qa_pipeline = None
+# Batched inference over all chunks instead of one pipeline call per chunk
+QA_BATCH_SIZE = int(os.getenv('QA_BATCH_SIZE', '16'))
+# Inference backend: torch, or onnx (exported once to QA_ONNX_DIR, int8 unless QA_ONNX_QUANTIZE=false)
+QA_BACKEND = os.getenv('QA_BACKEND', 'torch')
+QA_ONNX_DIR = os.getenv('QA_ONNX_DIR')
+QA_ONNX_QUANTIZE = os.getenv('QA_ONNX_QUANTIZE', 'true').lower() in ('1', 'true', 'yes')
+
+# With QA_SERVER_ADDRESS set, questions go to a shared qa_server.py process
+# instead of every worker loading its own copy of the model.
+QA_SERVER_ADDRESS = os.getenv('QA_SERVER_ADDRESS')
+
+# Concurrent requests' (question, chunk) pairs are batched into shared forward
+# passes; with QA_SCHEDULER_MAX_QUEUE requests waiting, new ones get a 503.
+QA_SCHEDULER_ENABLED = os.getenv('QA_SCHEDULER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+QA_SCHEDULER_MAX_BATCH = int(os.getenv('QA_SCHEDULER_MAX_BATCH', '64'))
+QA_SCHEDULER_MAX_WAIT_MS = float(os.getenv('QA_SCHEDULER_MAX_WAIT_MS', '10'))
+QA_SCHEDULER_MAX_QUEUE = int(os.getenv('QA_SCHEDULER_MAX_QUEUE', '128'))
+
+def load_qa_engine():
+    if QA_SERVER_ADDRESS:
+        return RemoteQAEngine(QA_SERVER_ADDRESS)
+    engine = build_qa_engine(QA_BACKEND, batch_size=QA_BATCH_SIZE, onnx_dir=QA_ONNX_DIR,
+                             quantize=QA_ONNX_QUANTIZE)
+    if not QA_SCHEDULER_ENABLED:
+        return engine
+    return MicroBatchScheduler(engine, max_batch_pairs=QA_SCHEDULER_MAX_BATCH,
+                               max_wait=QA_SCHEDULER_MAX_WAIT_MS / 1000,
+                               max_queue=QA_SCHEDULER_MAX_QUEUE)
 
 # 2. Google Gemini (advanced reasoning, large context)
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-if GEMINI_API_KEY:
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        gemini_model = genai.GenerativeModel('gemini-1.5-flash')  # Updated model name
-        print("✅ Google Gemini AI connected successfully")
-    except Exception as e:
-        print(f"⚠️ Gemini setup failed: {e}")
-        gemini_model = None
-else:
+if not GEMINI_API_KEY:
     print("⚠️ GEMINI_API_KEY not found in environment variables")
-    gemini_model = None
+
+def load_gemini_model():
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai.GenerativeModel('gemini-1.5-flash')  # Updated model name
 
 # 3. OpenAI GPT (creative content, advanced reasoning)
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-if OPENAI_API_KEY:
-    try:
-        openai_client = OpenAI(api_key=OPENAI_API_KEY)
-        print("✅ OpenAI GPT connected successfully")
-    except Exception as e:
-        print(f"⚠️ OpenAI setup failed: {e}")
-        openai_client = None
-else:
+if not OPENAI_API_KEY:
     print("⚠️ OPENAI_API_KEY not found in environment variables")
-    openai_client = None
+
+def load_openai_client():
+    from openai import OpenAI
+    # The SDK's own timeout frees the worker thread when a call hangs; the
+    # dispatcher's deadline only stops waiting. Retries would outlive it.
+    return OpenAI(api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT, max_retries=0)
+
+models = ModelRegistry()
+models.register('local_qa', load_qa_engine)
+models.register('gemini', load_gemini_model, enabled=bool(GEMINI_API_KEY))
+models.register('openai', load_openai_client, enabled=bool(OPENAI_API_KEY))
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 BACKEND_API_URL = "http://localhost:5000/api"
 
-# Global variables for document context
-uploaded_pdf_text = ""
-current_document_context = []
-current_pdf_metadata = {}
+# Retrieval settings: tfidf (default), bm25 or dense embeddings
+RETRIEVAL_BACKEND = os.getenv('RETRIEVAL_BACKEND', 'tfidf')
+RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', '5'))
+
+# Chunking: CHUNK_SIZE/CHUNK_OVERLAP are in characters, or in QA-model tokens with CHUNK_UNIT=tokens
+CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', '500'))
+CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', '0'))
+CHUNK_UNIT = os.getenv('CHUNK_UNIT', 'chars')
+
+# Processed documents are held per owner in a bounded LRU registry
+# (see document_store.py) instead of process-wide globals.
+DOCUMENT_STORE_MAX_DOCS = int(os.getenv('DOCUMENT_STORE_MAX_DOCS', '32'))
+DOCUMENT_STORE_MAX_MB = int(os.getenv('DOCUMENT_STORE_MAX_MB', '256'))
+
+# Ingestion results are cached on disk by PDF hash so re-uploads skip extraction.
+# Bump INGESTION_PIPELINE_VERSION whenever extraction/chunking/analysis output changes.
+INGESTION_PIPELINE_VERSION = '5'
+INGESTION_CACHE_DIR = os.getenv('INGESTION_CACHE_DIR', os.path.join('cache', 'ingestion'))
+INGESTION_CACHE_MAX_MB = int(os.getenv('INGESTION_CACHE_MAX_MB', '1024'))
+# Pages are chunked a batch at a time, so the batch size is part of the cache key too
+INGESTION_PAGE_BATCH = int(os.getenv('INGESTION_PAGE_BATCH', '16'))
+ingestion_cache = IngestionCache(
+    INGESTION_CACHE_DIR,
+    max_bytes=INGESTION_CACHE_MAX_MB * 1024 * 1024,
+    version=f"{INGESTION_PIPELINE_VERSION}-{RETRIEVAL_BACKEND}-{DEFAULT_EMBEDDING_MODEL}-{CHUNK_UNIT}-"
+            f"{CHUNK_SIZE}-{CHUNK_OVERLAP}-{INGESTION_PAGE_BATCH}"
+)
+
+# Background ingestion: pages are processed in batches and each partial
+# document is queryable while the rest of the PDF is still being ingested.
+INGESTION_WORKERS = int(os.getenv('INGESTION_WORKERS', '2'))
+ingestion_jobs = IngestionJobs(max_workers=INGESTION_WORKERS)
+
+# Answers are cached per (document, normalized question, provider, prompt version).
+# Bump PROMPT_TEMPLATE_VERSION whenever prompts or answer formatting change.
+PROMPT_TEMPLATE_VERSION = '1'
+RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '3600'))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1024'))
+RESPONSE_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH', os.path.join('cache', 'responses.sqlite3'))
+# Paraphrases of earlier questions are matched by embedding similarity. On by
+# default only with dense retrieval, which loads the embedding model anyway.
+SEMANTIC_CACHE_ENABLED = os.getenv(
+    'SEMANTIC_CACHE_ENABLED', str(RETRIEVAL_BACKEND == 'dense')).lower() in ('1', 'true', 'yes')
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.9'))
+models.register('embedder', lambda: get_embedder(DEFAULT_EMBEDDING_MODEL),
+                enabled=SEMANTIC_CACHE_ENABLED or RETRIEVAL_BACKEND == 'dense')
+response_cache = build_response_cache(
+    RESPONSE_CACHE_BACKEND,
+    ttl=RESPONSE_CACHE_TTL,
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+    path=RESPONSE_CACHE_PATH,
+    semantic_cache=SemanticCache(threshold=SEMANTIC_CACHE_THRESHOLD, ttl=RESPONSE_CACHE_TTL,
+                                 embedder=lambda: models.get('embedder'))
+    if SEMANTIC_CACHE_ENABLED else None
+)
+# Remote providers run on an asyncio loop with per-provider deadlines (seconds).
+# With PROVIDER_HEDGE_MS set, the next provider in line is started if the
+# current one has not answered after that many milliseconds; first good answer wins.
+GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', '20'))
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', '20'))
+LOCAL_QA_TIMEOUT = float(os.getenv('LOCAL_QA_TIMEOUT', '10'))
+# Local QA runs on its own threads, so hung remote calls cannot queue it past its deadline
+LOCAL_QA_WORKERS = int(os.getenv('LOCAL_QA_WORKERS', '8'))
+PROVIDER_HEDGE_MS = os.getenv('PROVIDER_HEDGE_MS')
+# Replace Gemini/OpenAI with local stubs (tests and load runs): PROVIDER_STUBS=true
+PROVIDER_STUBS = os.getenv('PROVIDER_STUBS', 'false').lower() in ('1', 'true', 'yes')
+PROVIDER_STUB_DELAY_MS = int(os.getenv('PROVIDER_STUB_DELAY_MS', '200'))
+PROVIDER_STUB_JITTER_MS = int(os.getenv('PROVIDER_STUB_JITTER_MS', '0'))
+PROVIDER_STUB_ERROR_RATE = float(os.getenv('PROVIDER_STUB_ERROR_RATE', '0'))
+# Provider choice weighs recent latency and error rate against token cost (see
+# provider_router.py); the keyword rules only decide the quality tier and a preference
+GEMINI_COST_PER_1K_TOKENS = float(os.getenv('GEMINI_COST_PER_1K_TOKENS', '0.0005'))
+OPENAI_COST_PER_1K_TOKENS = float(os.getenv('OPENAI_COST_PER_1K_TOKENS', '0.002'))
+ROUTER_WINDOW = int(os.getenv('ROUTER_WINDOW', '100'))
+ROUTER_WINDOW_SECONDS = float(os.getenv('ROUTER_WINDOW_SECONDS', '300'))
+ROUTER_COST_WEIGHT = float(os.getenv('ROUTER_COST_WEIGHT', '200'))
+ROUTER_PREFERENCE = float(os.getenv('ROUTER_PREFERENCE', '0.2'))
+ROUTER_EXPLORATION = float(os.getenv('ROUTER_EXPLORATION', '0.05'))
+# Gemini and OpenAI sit behind circuit breakers: after CIRCUIT_FAILURE_THRESHOLD
+# failures in a row a provider is skipped outright for CIRCUIT_RECOVERY_SECONDS,
+# then CIRCUIT_HALF_OPEN_CALLS probe calls decide whether it is back
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RECOVERY_SECONDS = float(os.getenv('CIRCUIT_RECOVERY_SECONDS', '30'))
+CIRCUIT_HALF_OPEN_CALLS = int(os.getenv('CIRCUIT_HALF_OPEN_CALLS', '1'))
+# Prompt token budgets per provider (see context_budget.py): history and
+# curriculum metadata get at most their share, retrieved chunks the rest
+GEMINI_PROMPT_TOKENS = int(os.getenv('GEMINI_PROMPT_TOKENS', '6000'))
+OPENAI_PROMPT_TOKENS = int(os.getenv('OPENAI_PROMPT_TOKENS', '3000'))
+PROMPT_HISTORY_SHARE = float(os.getenv('PROMPT_HISTORY_SHARE', '0.15'))
+PROMPT_METADATA_SHARE = float(os.getenv('PROMPT_METADATA_SHARE', '0.1'))
+
+# Every model is registered and configured now
+models.warm_up(MODEL_WARMUP)
 
 # --- Conversational AI Personality System ---
-# Conversation memory and personality traits for human-like interactions
-conversation_memory = {}  # Store conversation history by user session
+# Conversation memory and personality traits for human-like interactions.
+# Histories live in a bounded store (see conversation_store.py): memory (per
+# worker) or sqlite (shared by workers and kept across restarts).
+CONVERSATION_STORE_BACKEND = os.getenv('CONVERSATION_STORE_BACKEND', 'memory')
+CONVERSATION_MAX_SESSIONS = int(os.getenv('CONVERSATION_MAX_SESSIONS', '1000'))
+CONVERSATION_MAX_EXCHANGES = int(os.getenv('CONVERSATION_MAX_EXCHANGES', '10'))
+CONVERSATION_TTL = int(os.getenv('CONVERSATION_TTL', '86400'))
+CONVERSATION_STORE_PATH = os.getenv('CONVERSATION_STORE_PATH', os.path.join('cache', 'conversations.sqlite3'))
+conversation_store = build_conversation_store(
+    CONVERSATION_STORE_BACKEND,
+    max_sessions=CONVERSATION_MAX_SESSIONS,
+    max_exchanges=CONVERSATION_MAX_EXCHANGES,
+    ttl=CONVERSATION_TTL,
+    path=CONVERSATION_STORE_PATH
+)
 personality_traits = {
     "friendly": True,
     "encouraging": True,
@@ -114,26 +262,20 @@ empathy_responses = [
 
 def get_conversation_history(session_id):
     """Get conversation history for a user session"""
-    return conversation_memory.get(session_id, [])
+    return conversation_store.get(session_id)
 
 def add_to_conversation(session_id, user_message, ai_response):
-    """Add exchange to conversation memory"""
-    if session_id not in conversation_memory:
-        conversation_memory[session_id] = []
-    
-    conversation_memory[session_id].append({
+    """Add exchange to conversation memory; returns the session's conversation length"""
+    # The store keeps only the last CONVERSATION_MAX_EXCHANGES exchanges
+    return conversation_store.append(session_id, {
         "timestamp": datetime.now().isoformat(),
         "user": user_message,
         "ai": ai_response
     })
-    
-    # Keep only last 10 exchanges to manage memory
-    if len(conversation_memory[session_id]) > 10:
-        conversation_memory[session_id] = conversation_memory[session_id][-10:]
 
+@timed("formatting")
 def add_personality_to_response(response, question_type="general"):
     """Add conversational personality to AI responses with proper formatting"""
-    
     # First, clean and format the response structure
     response = format_response_structure(response)
     
@@ -142,14 +284,19 @@ def add_personality_to_response(response, question_type="general"):
         encouragement = random.choice(encouraging_phrases)
         response = f"{encouragement}\n\n{response}"
     
+    # One scan finds both "explain" and the complexity words
+    features = response_features(response)
+    
     # Add conversational transitions
-    if len(response) > 100 and "explain" in response.lower():
+    if len(response) > 100 and features["explain"]:
         transition = random.choice(transition_phrases)
-        response = response.replace("Let me explain", transition, 1)
+        transitioned = response.replace("Let me explain", transition, 1)
+        if transitioned != response:
+            response = transitioned
+            features = response_features(response)
     
     # Add empathy for complex topics
-    complexity_words = ["difficult", "complex", "advanced", "challenging", "confusing"]
-    if any(word in response.lower() for word in complexity_words):
+    if features["complexity"]:
         empathy = random.choice(empathy_responses)
         response = f"{empathy}\n\n{response}"
     
@@ -161,229 +308,68 @@ def add_personality_to_response(response, question_type="general"):
     
     return response
 
-def final_formatting_pass(text):
-    """Final pass to ensure perfect formatting"""
-    
-    # Remove excessive newlines
-    text = re.sub(r'\n{3,}', '\n\n', text)
-    
-    # Ensure proper paragraph spacing
-    paragraphs = text.split('\n\n')
-    formatted_paragraphs = []
-    
-    for paragraph in paragraphs:
-        paragraph = paragraph.strip()
-        if paragraph:
-            # Ensure each paragraph ends properly
-            if not paragraph.endswith(('.', '!', '?', ':')):
-                paragraph += '.'
-            formatted_paragraphs.append(paragraph)
-    
-    # Join with consistent spacing
-    result = '\n\n'.join(formatted_paragraphs)
-    
-    # Final cleanup
-    result = result.strip()
-    
-    return result
-
-def make_conversational(text):
-    """Make text more conversational and human-like with proper formatting"""
-    # Replace formal phrases with conversational ones
-    conversational_replacements = {
-        "In conclusion": "So basically",
-        "Furthermore": "Also",
-        "Therefore": "So",
-        "Additionally": "Plus",
-        "In summary": "To sum it up",
-        "It is important to note": "What's really important here is",
-        "One should": "You should",
-        "It is recommended": "I'd recommend",
-        "According to": "From what I understand",
-        "In order to": "To"
-    }
-    
-    for formal, casual in conversational_replacements.items():
-        text = text.replace(formal, casual)
-    
-    # Format the text with proper structure
-    text = format_response_structure(text)
-    
-    # Add conversational connectors
-    if ". " in text:
-        sentences = text.split(". ")
-        if len(sentences) > 2:
-            # Add conversational connectors randomly
-            connectors = ["By the way", "Also", "And here's the thing", "Plus", "What's interesting is"]
-            if random.choice([True, False]) and len(sentences) > 1:
-                connector = random.choice(connectors)
-                sentences[1] = f"{connector}, {sentences[1].lower()}"
-            text = ". ".join(sentences)
-    
-    return text
-
-def format_response_structure(text):
-    """Format AI responses with proper alignment, spacing, and structure"""
-    
-    # Clean up the text first
-    text = text.strip()
-    
-    # Fix punctuation issues
-    text = fix_punctuation(text)
-    
-    # Split into logical sections
-    sections = split_into_sections(text)
-    
-    # Format each section properly
-    formatted_sections = []
-    for section in sections:
-        formatted_section = format_section(section)
-        if formatted_section:
-            formatted_sections.append(formatted_section)
-    
-    # Join sections with proper spacing
-    return "\n\n".join(formatted_sections)
+# Streamed answers are formatted a block at a time: a paragraph, or a run of
+# whole sentences once this many characters are waiting without a paragraph break
+STREAM_BLOCK_CHARS = int(os.getenv('STREAM_BLOCK_CHARS', '400'))
 
-def fix_punctuation(text):
-    """Fix common punctuation and spacing issues"""
-    
-    # Fix multiple spaces
-    text = re.sub(r'\s+', ' ', text)
-    
-    # Fix missing spaces after punctuation
-    text = re.sub(r'([.!?])([A-Z])', r'\1 \2', text)
-    
-    # Fix missing periods at end of sentences
-    if text and not text.endswith(('.', '!', '?')):
-        text += '.'
-    
-    # Fix spacing around commas
-    text = re.sub(r'\s*,\s*', ', ', text)
-    
-    # Fix spacing around colons
-    text = re.sub(r'\s*:\s*', ': ', text)
-    
-    # Fix quotes spacing
-    text = re.sub(r'\s*"\s*', '"', text)
-    text = re.sub(r'"\s+', '" ', text)
-    text = re.sub(r'\s+"', ' "', text)
-    
-    return text
+def iter_text_blocks(tokens, max_chars=STREAM_BLOCK_CHARS):
+    """Regroup streamed tokens into paragraphs (or sentence runs) that can be formatted alone.
 
-def split_into_sections(text):
-    """Split text into logical sections for better formatting"""
-    
-    # Common section indicators
-    section_indicators = [
-        r'\d+\.', # Numbered lists
-        r'[A-Z][a-z]*:', # Topic headers like "Definition:", "Example:"
-        r'Here\'s', r'Let me', r'Now,', r'First,', r'Second,', r'Finally,',
-        r'For example', r'To understand', r'Think of it'
-    ]
-    
-    sections = []
-    current_section = ""
-    
-    sentences = text.split('. ')
-    
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if not sentence:
-            continue
-            
-        # Check if this starts a new section
-        is_new_section = False
-        for indicator in section_indicators:
-            if re.match(indicator, sentence, re.IGNORECASE):
-                is_new_section = True
-                break
-        
-        if is_new_section and current_section:
-            sections.append(current_section.strip())
-            current_section = sentence
-        else:
-            if current_section:
-                current_section += ". " + sentence
-            else:
-                current_section = sentence
-    
-    if current_section:
-        sections.append(current_section.strip())
-    
-    return sections
-
-def format_section(section):
-    """Format individual sections with proper structure"""
-    
-    if not section:
-        return ""
-    
-    # Ensure proper sentence ending
-    if not section.endswith(('.', '!', '?')):
-        section += '.'
-    
-    # Handle lists and numbered items
-    if re.match(r'\d+\.', section):
-        return format_numbered_item(section)
-    
-    # Handle definition-style sections
-    if ':' in section and len(section.split(':')) == 2:
-        return format_definition_section(section)
-    
-    # Handle example sections
-    if section.lower().startswith(('for example', 'think of it', 'imagine')):
-        return format_example_section(section)
-    
-    # Regular paragraph formatting
-    return format_paragraph(section)
-
-def format_numbered_item(section):
-    """Format numbered list items"""
-    return f"   {section}"
-
-def format_definition_section(section):
-    """Format definition-style sections"""
-    parts = section.split(':', 1)
-    if len(parts) == 2:
-        topic = parts[0].strip()
-        explanation = parts[1].strip()
-        return f"**{topic}:** {explanation}"
-    return section
-
-def format_example_section(section):
-    """Format example sections"""
-    return f"💡 {section}"
-
-def format_paragraph(section):
-    """Format regular paragraphs with proper line breaks"""
-    
-    # If it's a long paragraph, add logical breaks
-    if len(section) > 200:
-        sentences = section.split('. ')
-        if len(sentences) > 2:
-            # Group sentences into smaller chunks
-            chunks = []
-            current_chunk = []
-            current_length = 0
-            
-            for sentence in sentences:
-                sentence_length = len(sentence)
-                if current_length + sentence_length > 150 and current_chunk:
-                    chunks.append('. '.join(current_chunk) + '.')
-                    current_chunk = [sentence]
-                    current_length = sentence_length
+    Text with no sentence end in sight (a long list, a run-on) is cut at a
+    word once twice ``max_chars`` are waiting. If the stream is interrupted,
+    what was received is still yielded before the error propagates.
+    """
+    buffer = ""
+    try:
+        for token in tokens:
+            buffer += token
+            while True:
+                paragraph_end = buffer.find("\n\n")
+                if paragraph_end != -1:
+                    block, buffer = buffer[:paragraph_end], buffer[paragraph_end + 2:]
+                elif len(buffer) >= max_chars and ". " in buffer:
+                    sentence_end = buffer.rfind(". ") + 1
+                    block, buffer = buffer[:sentence_end], buffer[sentence_end + 1:]
+                elif len(buffer) >= 2 * max_chars:
+                    word_end = buffer.rfind(" ")
+                    block, buffer = (buffer[:word_end], buffer[word_end + 1:]) if word_end > 0 else (buffer, "")
                 else:
-                    current_chunk.append(sentence)
-                    current_length += sentence_length
-            
-            if current_chunk:
-                chunks.append('. '.join(current_chunk) + '.')
-            
-            return '\n'.join(chunks)
-    
-    return section
-
-def create_contextual_prompt(question, conversation_history, document_context=""):
+                    break
+                if block.strip():
+                    yield block
+    except StreamInterrupted:
+        if buffer.strip():
+            yield buffer
+        raise
+    if buffer.strip():
+        yield buffer
+
+def stream_personality(tokens):
+    """Incremental add_personality_to_response: yields formatted blocks as the answer streams in.
+
+    The opener is decided up front and the empathy line is added ahead of
+    the first block that mentions a hard topic, so nothing already sent
+    has to be rewritten.
+    """
+    if random.choice([True, False]):
+        yield random.choice(encouraging_phrases)
+    empathised = transitioned = connected = False
+    for block in iter_text_blocks(tokens):
+        block = format_response_structure(block)
+        if not block:
+            continue
+        if not transitioned and "Let me explain" in block:
+            block = block.replace("Let me explain", random.choice(transition_phrases), 1)
+            transitioned = True
+        if not empathised and response_features(block)["complexity"]:
+            yield random.choice(empathy_responses)
+            empathised = True
+        # Conversational connectors are only considered for the first block
+        block = make_conversational(block, add_connector=not connected)
+        connected = True
+        yield final_formatting_pass(block)
+
+def create_contextual_prompt(question, conversation_history, document_context="", curriculum_context=""):
     """Create a context-aware prompt that feels conversational with proper formatting"""
     
     # Build context from conversation history
@@ -406,6 +392,8 @@ Current question: {question}
 
 {f"Document context: {document_context}" if document_context else ""}
 
+{f"Curriculum details:{chr(10)}{curriculum_context}" if curriculum_context else ""}
+
 RESPONSE FORMATTING REQUIREMENTS:
 - Use proper paragraphs with clear spacing
 - Write in complete, well-punctuated sentences
@@ -435,39 +423,61 @@ Response:"""
     
     return prompt
 
+def build_provider_prompt(provider, provider_request):
+    """The request's prompt packed into the provider's token budget.
+
+    The highest-value history, curriculum metadata and retrieved chunks
+    that fit are kept; the sizes and truncations are recorded on the
+    request under prompt_reports for the response.
+    """
+    with span("prompt_assembly"):
+        document = provider_request.get('document')
+        chunk_indices = provider_request.get('chunk_indices') or []
+        chunks = [(i, document['chunks'][i]) for i in chunk_indices] if document else []
+        recent_topics = [exchange["user"] for exchange in provider_request.get('history', [])[-3:]]
+        budgeter = prompt_budgeters[provider]
+        parts, report = budgeter.pack(
+            # The template with every section label present, so labels are budgeted too
+            create_contextual_prompt("", [{"user": ""}], " ", " "),
+            provider_request['question'],
+            recent_topics,
+            curriculum_metadata_lines(provider_request.get('pdf_metadata')),
+            chunks
+        )
+        prompt = create_contextual_prompt(
+            parts["question"],
+            [{"user": topic} for topic in parts["history"]],
+            " ".join(text for _, text in parts["chunks"]),
+            "\n".join(parts["metadata"])
+        )
+        report["prompt_tokens"] = budgeter.tokenizer.count(prompt)
+    provider_request.setdefault('prompt_reports', {})[provider] = report
+    return prompt
+
 def get_available_ai_services():
     """Check which AI services are available"""
+    # Asked of the dispatcher, so stub providers count as available
     services = {
-        'local_qa': qa_pipeline is not None,
-        'gemini': gemini_model is not None,
-        'openai': openai_client is not None
+        'local_qa': provider_dispatcher.available('local'),
+        'gemini': provider_dispatcher.available('gemini'),
+        'openai': provider_dispatcher.available('openai')
     }
     return services
 
-def smart_ai_router(question, context, complexity="medium"):
-    """Route questions to the best available AI service based on complexity"""
-    services = get_available_ai_services()
-    
-    # Determine question complexity
-    complex_keywords = ['explain', 'analyze', 'create', 'generate', 'design', 'plan', 'develop', 'synthesize']
-    creative_keywords = ['write', 'create', 'story', 'example', 'scenario', 'imagine']
-    educational_keywords = ['teach', 'learn', 'study', 'curriculum', 'lesson', 'assessment']
-    
-    is_complex = any(keyword in question.lower() for keyword in complex_keywords)
-    is_creative = any(keyword in question.lower() for keyword in creative_keywords)
-    is_educational = any(keyword in question.lower() for keyword in educational_keywords)
-    
-    # Smart routing logic
-    if is_educational and services['gemini']:
-        return "gemini"  # Best for educational content
-    elif is_creative and services['openai']:
-        return "openai"  # Best for creative tasks
-    elif is_complex and (services['gemini'] or services['openai']):
-        return "gemini" if services['gemini'] else "openai"
-    elif services['local_qa']:
-        return "local"  # Fast local processing
-    else:
-        return "fallback"
+@timed("routing")
+def smart_ai_router(question, context, complexity="medium", features=None, prompt=None, candidates=None):
+    """Route questions to the best available AI service: a decision dict with the provider order and why"""
+    # Keyword features (reused from the caller when it has them) set the quality tier
+    return provider_router.route(question, context, complexity,
+                                 features=features or question_features(question),
+                                 available=provider_dispatcher.available,
+                                 circuit_open=provider_dispatcher.circuit_open,
+                                 prompt=prompt, candidates=candidates)
+
+def answers_tier(answered_by, tier):
+    """Whether the provider that answered gives the quality a tier's cache entries promise"""
+    profile = provider_router.profiles.get(answered_by)
+    return bool(profile) and profile.get("quality") == tier
 
 def ask_gemini(question, context, pdf_metadata):
     """Enhanced educational responses using Google Gemini"""
@@ -477,7 +487,7 @@ def ask_gemini(question, context, pdf_metadata):
 You are an expert CAPS curriculum educator and AI tutor. A student has uploaded a curriculum document and is asking a question about it.
 
 DOCUMENT CONTEXT:
-{context[:8000]}  # Large context window for Gemini
+{Tokenizer.get().truncate(context, 2000)}  # Large context window for Gemini
 
 CURRICULUM METADATA:
 - Grades: {pdf_metadata.get('curriculum_structure', {}).get('grades', [])}
@@ -501,7 +511,7 @@ Format your response with clear sections using emojis and bullet points for easy
 Be specific, practical, and educational. Aim for a response that truly helps the student learn.
 """
 
-        response = gemini_model.generate_content(educational_prompt)
+        response = models.get('gemini').generate_content(educational_prompt, request_options={"timeout": GEMINI_TIMEOUT})
         
         return {
             "answer": response.text,
@@ -522,7 +532,7 @@ def ask_openai(question, context, pdf_metadata):
 You are a creative and engaging CAPS curriculum tutor. Help this student with their question by providing an interactive, creative response.
 
 CURRICULUM CONTENT:
-{context[:6000]}
+{Tokenizer.get().truncate(context, 1500)}
 
 CURRICULUM INFO:
 - Target Grades: {pdf_metadata.get('curriculum_structure', {}).get('grades', [])}
@@ -544,7 +554,7 @@ Provide a creative, engaging educational response that includes:
 Make it engaging, practical, and memorable. Use analogies, examples, and interactive elements to help the student truly understand and retain the information.
 """
 
-        response = openai_client.chat.completions.create(
+        response = models.get('openai').chat.completions.create(
             model="gpt-3.5-turbo",  # or "gpt-4" if available
             messages=[
                 {"role": "system", "content": "You are an expert educational AI tutor specializing in CAPS curriculum."},
@@ -565,31 +575,34 @@ Make it engaging, practical, and memorable. Use analogies, examples, and interac
         print(f"OpenAI error: {e}")
         return None
 
-def ask_local_qa(question, context):
-    """Basic QA using local DistilBERT model"""
-    if not qa_pipeline:
+def ask_local_qa(question, document, chunk_indices=None):
+    """Basic QA using local DistilBERT model over the given (or all) chunks"""
+    qa_engine = models.get('local_qa')
+    if not qa_engine:
         return None
     
     try:
-        # Use existing local QA logic
-        best_answer = None
-        max_score = -1
+        document_chunks = document['chunks']
+        if chunk_indices is None:
+            chunk_indices = list(range(len(document_chunks)))
+        candidate_chunks = [document_chunks[i] for i in chunk_indices]
         
-        for chunk in current_document_context:
-            truncated_chunk = chunk[:1000]
-            result = qa_pipeline(question=question, context=truncated_chunk)
-            
-            if result and result['score'] > max_score and result['score'] > 0.3:
-                best_answer = result['answer']
-                max_score = result['score']
+        # Score the candidate chunks in a handful of batched forward passes
+        with span("local_qa"):
+            result = qa_engine.answer(question, candidate_chunks, min_score=0.3)
         
-        if best_answer:
+        if result and result['answer']:
+            source_chunk = chunk_indices[result['chunk_index']]
             return {
-                "answer": best_answer,
-                "confidence": max_score,
+                "answer": result['answer'],
+                "confidence": result['score'],
+                "source_chunk": source_chunk,
+                "source_page": document['chunk_spans'][source_chunk]['page'],
                 "ai_service": "Local DistilBERT",
                 "response_type": "basic_qa"
             }
+    except QAQueueFull:
+        raise
     except Exception as e:
         print(f"Local QA error: {e}")
     
@@ -599,7 +612,7 @@ def ask_local_qa(question, context):
 def ask_gemini_conversational(question, contextual_prompt, pdf_metadata):
     """Conversational educational responses using Google Gemini"""
     try:
-        response = gemini_model.generate_content(contextual_prompt)
+        response = models.get('gemini').generate_content(contextual_prompt, request_options={"timeout": GEMINI_TIMEOUT})
         
         # Add personality to the response
         enhanced_response = add_personality_to_response(response.text, "educational")
@@ -618,7 +631,7 @@ def ask_gemini_conversational(question, contextual_prompt, pdf_metadata):
 def ask_openai_conversational(question, contextual_prompt, pdf_metadata):
     """Conversational and creative educational content using OpenAI"""
     try:
-        response = openai_client.chat.completions.create(
+        response = models.get('openai').chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": "You are a friendly, encouraging AI tutor who makes learning fun and conversational."},
@@ -641,6 +654,118 @@ def ask_openai_conversational(question, contextual_prompt, pdf_metadata):
         print(f"OpenAI conversational error: {e}")
         return None
 
+def ask_local_conversational(question, document, chunk_indices):
+    """Local QA answer with personality enhancement, used as the last provider in line"""
+    basic_response = ask_local_qa(question, document, chunk_indices)
+    if not basic_response or not basic_response.get("answer"):
+        return None
+    return {
+        "answer": add_personality_to_response(basic_response["answer"]),
+        "confidence": basic_response.get("confidence", 0.6),
+        "source_page": basic_response.get("source_page"),
+        "ai_service": "Local QA (Enhanced)",
+        "response_type": "enhanced_local"
+    }
+
+def build_circuit_breaker():
+    return CircuitBreaker(failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+                          recovery_time=CIRCUIT_RECOVERY_SECONDS,
+                          half_open_max_calls=CIRCUIT_HALF_OPEN_CALLS)
+
+def build_provider_dispatcher():
+    """Gemini, OpenAI and local QA behind one dispatcher; each call gets the /ask_ai request dict"""
+    if PROVIDER_STUBS:
+        stub_settings = {
+            "delay": PROVIDER_STUB_DELAY_MS / 1000,
+            "jitter": PROVIDER_STUB_JITTER_MS / 1000,
+            "error_rate": PROVIDER_STUB_ERROR_RATE
+        }
+        # Stubs still pack their prompts, so load runs pay for prompt assembly
+        gemini_provider = StubProvider("gemini", timeout=GEMINI_TIMEOUT, breaker=build_circuit_breaker(),
+                                       prepare=lambda req: build_provider_prompt('gemini', req), **stub_settings)
+        openai_provider = StubProvider("openai", timeout=OPENAI_TIMEOUT, breaker=build_circuit_breaker(),
+                                       prepare=lambda req: build_provider_prompt('openai', req), **stub_settings)
+    else:
+        gemini_provider = Provider(
+            "gemini",
+            lambda req: ask_gemini_conversational(req['question'], build_provider_prompt('gemini', req),
+                                                  req['pdf_metadata']),
+            timeout=GEMINI_TIMEOUT,
+            available=lambda: models.available('gemini'),
+            stream=lambda req: stream_gemini_conversational(build_provider_prompt('gemini', req)),
+            breaker=build_circuit_breaker()
+        )
+        openai_provider = Provider(
+            "openai",
+            lambda req: ask_openai_conversational(req['question'], build_provider_prompt('openai', req),
+                                                  req['pdf_metadata']),
+            timeout=OPENAI_TIMEOUT,
+            available=lambda: models.available('openai'),
+            stream=lambda req: stream_openai_conversational(build_provider_prompt('openai', req)),
+            breaker=build_circuit_breaker()
+        )
+    local_provider = Provider(
+        "local",
+        lambda req: ask_local_conversational(req['question'], req['document'], req['chunk_indices'])
+        if req.get('document') else None,
+        timeout=LOCAL_QA_TIMEOUT,
+        available=lambda: models.available('local_qa'),
+        max_workers=LOCAL_QA_WORKERS
+    )
+    hedge_delay = int(PROVIDER_HEDGE_MS) / 1000 if PROVIDER_HEDGE_MS else None
+    return ProviderDispatcher([gemini_provider, openai_provider, local_provider], hedge_delay=hedge_delay,
+                              on_result=provider_router.observe)
+
+# gpt-3.5-turbo counts in cl100k_base; Gemini has no local tokenizer, so the
+# same encoding stands in for it
+prompt_budgeters = {
+    "gemini": ContextBudgeter(GEMINI_PROMPT_TOKENS, "cl100k_base", PROMPT_HISTORY_SHARE, PROMPT_METADATA_SHARE),
+    "openai": ContextBudgeter(OPENAI_PROMPT_TOKENS, "cl100k_base", PROMPT_HISTORY_SHARE, PROMPT_METADATA_SHARE)
+}
+
+provider_router = CostAwareRouter(
+    {
+        "gemini": {"quality": "premium", "latency": 2.0, "cost_per_1k_tokens": GEMINI_COST_PER_1K_TOKENS},
+        "openai": {"quality": "premium", "latency": 2.0, "cost_per_1k_tokens": OPENAI_COST_PER_1K_TOKENS},
+        "local": {"quality": "basic", "latency": 0.5, "cost_per_1k_tokens": 0.0}
+    },
+    window=ROUTER_WINDOW,
+    horizon=ROUTER_WINDOW_SECONDS,
+    cost_weight=ROUTER_COST_WEIGHT,
+    preference=ROUTER_PREFERENCE,
+    exploration=ROUTER_EXPLORATION
+)
+register_collector(provider_router.render_prometheus)
+provider_dispatcher = build_provider_dispatcher()
+
+# How streamed answers are labelled: (ai_service, response_type)
+STREAMED_PROVIDERS = {
+    "gemini": ("Google Gemini (Conversational)", "conversational_educational"),
+    "openai": ("OpenAI GPT (Conversational)", "conversational_creative"),
+}
+
+def stream_gemini_conversational(contextual_prompt):
+    """Gemini answer text as it is generated"""
+    for chunk in models.get('gemini').generate_content(contextual_prompt, stream=True,
+                                                       request_options={"timeout": GEMINI_TIMEOUT}):
+        yield chunk.text
+
+def stream_openai_conversational(contextual_prompt):
+    """OpenAI answer text as it is generated"""
+    stream = models.get('openai').chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": "You are a friendly, encouraging AI tutor who makes learning fun and conversational."},
+            {"role": "user", "content": contextual_prompt}
+        ],
+        max_tokens=800,
+        temperature=0.7,
+        stream=True
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
 # --- Conversation Management Endpoints ---
 @app.route('/start_conversation', methods=['POST'])
 def start_conversation():
@@ -675,8 +800,7 @@ def get_conversation_history_endpoint(session_id):
 @app.route('/clear_conversation/<session_id>', methods=['POST'])
 def clear_conversation(session_id):
     """Clear conversation history for a session"""
-    if session_id in conversation_memory:
-        del conversation_memory[session_id]
+    conversation_store.clear(session_id)
     
     return jsonify({
         "session_id": session_id,
@@ -684,122 +808,16 @@ def clear_conversation(session_id):
         "message": "Ready for a fresh start! What would you like to learn about?"
     })
 
-# [Previous functions remain the same: extract_text_from_pdf, chunk_text, analyze_caps_structure, synthesize_learning_breakdown]
+# [Previous functions remain the same: synthesize_learning_breakdown]
+# PDF text extraction lives in pdf_extraction.py, chunking in chunking.py,
+# curriculum analysis in curriculum_analyzer.py
 
-def extract_text_from_pdf(pdf_path):
-    """Extracts text from a PDF document."""
-    text = ""
-    metadata = {}
-    try:
-        document = fitz.open(pdf_path)
-        metadata['total_pages'] = len(document)
-        metadata['title'] = document.metadata.get('title', 'Unknown')
-        metadata['author'] = document.metadata.get('author', 'Unknown')
-        
-        for page_num in range(len(document)):
-            page = document.load_page(page_num)
-            text += f"\n--- Page {page_num + 1} ---\n"
-            text += page.get_text()
-        
-        metadata['word_count'] = len(text.split())
-        return text, metadata
-    except Exception as e:
-        print(f"Error extracting text from PDF: {e}")
-        return None, None
-
-def chunk_text(text, max_chunk_size=500):
-    """Splits text into smaller, manageable chunks."""
-    words = text.split()
-    chunks = []
-    current_chunk = []
-    for word in words:
-        current_chunk.append(word)
-        if len(" ".join(current_chunk)) > max_chunk_size:
-            chunks.append(" ".join(current_chunk[:-1]))
-            current_chunk = [word]
-    if current_chunk:
-        chunks.append(" ".join(current_chunk))
-    return chunks
-
-def analyze_caps_structure(text):
-    """Analyze CAPS curriculum structure and extract key concepts."""
-    import re
-    
-    patterns = {
-        'grade_levels': r'Grade\s+(\d+)',
-        'learning_outcomes': r'Learning\s+Outcome[s]?\s*:?\s*([^\n]+)',
-        'assessment_standards': r'Assessment\s+Standard[s]?\s*:?\s*([^\n]+)',
-        'content_areas': r'Content\s+Area[s]?\s*:?\s*([^\n]+)',
-        'topics': r'Topic[s]?\s*:?\s*([^\n]+)',
-        'skills': r'Skill[s]?\s*:?\s*([^\n]+)',
-        'concepts': r'Concept[s]?\s*:?\s*([^\n]+)',
-        'knowledge': r'Knowledge\s*:?\s*([^\n]+)',
-        'term_work': r'Term\s+(\d+)\s*:?\s*([^\n]+)',
-        'weekly_breakdown': r'Week\s+(\d+)\s*:?\s*([^\n]+)',
-        'objectives': r'(?:Learning\s+)?Objective[s]?\s*:?\s*([^\n]+)',
-        'activities': r'Activit(?:y|ies)\s*:?\s*([^\n]+)',
-        'resources': r'Resource[s]?\s*:?\s*([^\n]+)',
-        'time_allocation': r'Time\s*:?\s*(\d+)\s*(?:hours?|minutes?|periods?)',
-        'mathematical_concepts': r'(?:sin|cos|tan|algebra|geometry|calculus|trigonometry|logarithm|equation|formula|theorem)',
-        'subject_areas': r'(?:Mathematics|Science|English|History|Geography|Life Sciences|Physical Sciences|Technology)',
-    }
-    
-    curriculum_structure = {
-        'grades': set(),
-        'learning_outcomes': [],
-        'assessment_standards': [],
-        'content_areas': [],
-        'topics': [],
-        'skills': [],
-        'concepts': [],
-        'knowledge_areas': [],
-        'term_breakdown': {},
-        'weekly_breakdown': {},
-        'objectives': [],
-        'activities': [],
-        'resources': [],
-        'time_allocations': [],
-        'mathematical_concepts': set(),
-        'subject_areas': set(),
-        'sections': []
-    }
-    
-    # Extract structured information
-    for category, pattern in patterns.items():
-        if category == 'grade_levels':
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            curriculum_structure['grades'].update(matches)
-        elif category == 'term_work':
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            for term, content in matches:
-                curriculum_structure['term_breakdown'][f'Term {term}'] = content.strip()
-        elif category == 'weekly_breakdown':
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            for week, content in matches:
-                curriculum_structure['weekly_breakdown'][f'Week {week}'] = content.strip()
-        elif category == 'time_allocation':
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            curriculum_structure['time_allocations'].extend(matches)
-        elif category in ['mathematical_concepts', 'subject_areas']:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            curriculum_structure[category].update([m.lower() for m in matches])
-        else:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            key = category.replace('_', '_')
-            if key in curriculum_structure:
-                curriculum_structure[key].extend([m.strip() for m in matches if m.strip()])
-    
-    # Extract sections by looking for numbered sections or headings
-    section_pattern = r'(?:^|\n)\s*(?:\d+\.?\s*)?([A-Z][^.\n]*(?:Identity|Formula|Concept|Topic|Skill|Knowledge|Learning|Assessment)[^.\n]*)'
-    sections = re.findall(section_pattern, text, re.MULTILINE | re.IGNORECASE)
-    curriculum_structure['sections'] = [s.strip() for s in sections if len(s.strip()) > 5]
-    
-    # Convert sets to lists for JSON serialization
-    curriculum_structure['grades'] = list(curriculum_structure['grades'])
-    curriculum_structure['mathematical_concepts'] = list(curriculum_structure['mathematical_concepts'])
-    curriculum_structure['subject_areas'] = list(curriculum_structure['subject_areas'])
-    
-    return curriculum_structure
+def chunk_pages(text, page_offsets):
+    """Chunk a run of pages with the configured size, overlap and unit."""
+    qa_engine = models.get('local_qa') if CHUNK_UNIT == 'tokens' else None
+    tokenizer = qa_engine.tokenizer if qa_engine else None
+    return chunk_document(text, page_offsets, max_chunk_size=CHUNK_SIZE,
+                          overlap=CHUNK_OVERLAP, tokenizer=tokenizer)
 
 def synthesize_learning_breakdown(curriculum_structure, user_question):
     """Create a structured learning breakdown based on curriculum analysis."""
@@ -854,6 +872,109 @@ def synthesize_learning_breakdown(curriculum_structure, user_question):
     
     return breakdown
 
+ingestion_pipeline = IngestionPipeline(
+    chunk_pages,
+    retrieval_backend=RETRIEVAL_BACKEND,
+    ingestion_cache=ingestion_cache,
+    page_batch_size=INGESTION_PAGE_BATCH
+)
+
+def owns_document(document_id, owner):
+    """Whether the owner uploaded this document and has not cleared it"""
+    return owns_upload(document_id, owner, UPLOAD_FOLDER)
+
+def load_saved_document(document_id, owner):
+    """Rebuild the owner's document from its saved upload, e.g. one received by another worker."""
+    filepath = uploaded_pdf_path(document_id, UPLOAD_FOLDER)
+    if not filepath:
+        return None
+    return ingestion_pipeline.process(filepath, document_id, owner,
+                                      uploaded_filename(document_id, owner, UPLOAD_FOLDER))
+
+document_store = DocumentStore(
+    max_documents=DOCUMENT_STORE_MAX_DOCS,
+    max_bytes=DOCUMENT_STORE_MAX_MB * 1024 * 1024,
+    loader=load_saved_document,
+    owns=owns_document
+)
+
+def ingest_in_background(report, filepath, document_id, owner, filename):
+    """Ingestion job body: publish every partial document as its pages are indexed."""
+    def on_progress(document, pages_processed):
+        # Cleared while still ingesting: finish the job but publish nothing
+        if owns_document(document_id, owner):
+            document_store.put(document)
+        report(pages_total=document['metadata'].get('total_pages'), pages_processed=pages_processed)
+    
+    return ingestion_pipeline.process(filepath, document_id, owner, filename, on_progress=on_progress)
+
+def request_param(name, default=None):
+    """Read a parameter from the JSON body, form data or query string."""
+    data = request.get_json(silent=True) or {}
+    return data.get(name) or request.form.get(name) or request.args.get(name) or default
+
+def resolve_document(document_id, owner):
+    """Find the requested document, or the owner's latest upload if no id is given."""
+    if document_id:
+        return document_store.get(document_id, owner)
+    return document_store.latest(owner)
+
+def conversational_fallback(pdf_metadata):
+    """Encouraging reply for when no provider could answer"""
+    curriculum_structure = pdf_metadata.get('curriculum_structure', {})
+    context_info = f"this document covers grades {', '.join(curriculum_structure.get('grades', []))}"
+    
+    fallback_response = f"You know what, that's a great question! While I'm still figuring out the best way to answer it from {context_info}, I'd love to help. Could you try asking about specific learning objectives, concepts, or assessment criteria? I'm here to make learning easier for you!"
+    
+    return {
+        "answer": fallback_response,
+        "confidence": 0.5,
+        "ai_service": "Conversational Fallback",
+        "response_type": "encouraging_fallback"
+    }
+
+def general_conversation_fallback():
+    """Encouraging reply for general conversation (no document) that no provider answered"""
+    encouraging_response = f"{random.choice(encouraging_phrases)} I'd love to help you learn! While I work best with curriculum documents, I can still try to explain things. What would you like to understand better?"
+    return {
+        "answer": encouraging_response,
+        "confidence": 0.7,
+        "ai_service": "Conversational Assistant",
+        "response_type": "encouraging"
+    }
+
+def requires_pdf_response():
+    """Reply to a document question asked before any PDF was uploaded"""
+    return {
+        "answer": "Hey! I'd love to help you learn. I work best when you upload a curriculum PDF, but I can still try to answer general questions. What would you like to know?",
+        "requires_pdf": True,
+        "confidence": 0.8,
+        "ai_service": "Conversational",
+        "response_type": "helpful_suggestion"
+    }
+
+def sse_event(payload, event=None):
+    """One server-sent event carrying a JSON payload"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload)}\n\n"
+
+def qa_scheduler_stats():
+    """Micro-batching stats of the loaded QA engine, if it is scheduled locally"""
+    engine = models.models['local_qa']
+    if engine.state != 'ready' or not isinstance(engine.get(), MicroBatchScheduler):
+        return None
+    return engine.get().stats()
+
+@app.errorhandler(ProviderOverloaded)
+def provider_overloaded(error):
+    """Shed load when every provider was busy, e.g. the QA scheduler's queue is full"""
+    return jsonify({
+        "answer": "I'm helping a lot of students right now! Please ask me again in a moment.",
+        "confidence": 0,
+        "ai_service": "Conversational",
+        "response_type": "overloaded"
+    }), 503, {"Retry-After": "1"}
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -866,13 +987,20 @@ def health():
         "status": "healthy",
         "ai_services": services,
         "total_services": sum(services.values()),
+        "circuit_breakers": provider_dispatcher.breakers(),
+        "models": models.status(),
+        "qa_scheduler": qa_scheduler_stats(),
+        "documents": document_store.stats(),
+        "ingestion_cache": ingestion_cache.stats(),
+        "response_cache": response_cache.stats() if response_cache else None,
+        "conversations": conversation_store.stats(),
+        "providers": provider_dispatcher.stats(),
+        "routing": provider_router.stats(),
         "timestamp": datetime.now().isoformat()
     })
 
 @app.route('/upload_pdf', methods=['POST'])
 def upload_pdf():
-    global uploaded_pdf_text, current_document_context, current_pdf_metadata
-    
     if 'pdf_file' not in request.files:
         return jsonify({"success": False, "message": "No PDF file part"})
     
@@ -881,27 +1009,41 @@ def upload_pdf():
         return jsonify({"success": False, "message": "No selected file"})
     
     if file and file.filename.endswith('.pdf'):
-        filepath = os.path.join(UPLOAD_FOLDER, file.filename)
-        file.save(filepath)
+        owner = request_param('user_id', 'anonymous')
+        filename = file.filename
+        document_id, filepath = save_uploaded_pdf(file, UPLOAD_FOLDER, owner)
         
-        extracted_text, metadata = extract_text_from_pdf(filepath)
-        if extracted_text:
-            uploaded_pdf_text = extracted_text
-            current_document_context = chunk_text(uploaded_pdf_text)
-            current_pdf_metadata = metadata
-            
-            # Analyze CAPS curriculum structure
-            curriculum_analysis = analyze_caps_structure(uploaded_pdf_text)
-            current_pdf_metadata['curriculum_structure'] = curriculum_analysis
+        if str(request_param('async', '')).lower() in ('1', 'true', 'yes'):
+            # Respond straight away; progress is at /ingestion_status/<job_id>
+            job = ingestion_jobs.submit(
+                lambda report: ingest_in_background(report, filepath, document_id, owner, filename),
+                document_id=document_id,
+                filename=filename
+            )
+            return jsonify({
+                "success": True,
+                "message": "PDF uploaded, processing in the background.",
+                "document_id": document_id,
+                "job_id": job['job_id'],
+                "status_url": f"/ingestion_status/{job['job_id']}",
+                "events_url": f"/ingestion_events/{job['job_id']}"
+            }), 202
+        
+        document = ingestion_pipeline.process(filepath, document_id, owner, filename)
+        if document:
+            document_store.put(document)
+            metadata = document['metadata']
+            curriculum_analysis = metadata['curriculum_structure']
             
             return jsonify({
                 "success": True, 
                 "message": "PDF uploaded and processed successfully!",
+                "document_id": document_id,
                 "metadata": {
                     "filename": file.filename,
                     "pages": metadata.get('total_pages', 0),
                     "word_count": metadata.get('word_count', 0),
-                    "chunks": len(current_document_context)
+                    "chunks": len(document['chunks'])
                 },
                 "curriculum_analysis": {
                     "grades_covered": curriculum_analysis.get('grades', []),
@@ -917,10 +1059,36 @@ def upload_pdf():
     
     return jsonify({"success": False, "message": "Invalid file type. Please upload a PDF."})
 
+@app.route('/ingestion_status/<job_id>')
+def ingestion_status(job_id):
+    """Progress of a background PDF ingestion job"""
+    job = ingestion_jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Unknown ingestion job"}), 404
+    return jsonify(job)
+
+@app.route('/ingestion_events/<job_id>')
+def ingestion_events(job_id):
+    """Server-sent events stream of a background ingestion job's progress"""
+    def generate():
+        seen_version = -1
+        while True:
+            job = ingestion_jobs.wait_for_update(job_id, seen_version)
+            if not job:
+                yield f"event: error\ndata: {json.dumps({'error': 'Unknown ingestion job'})}\n\n"
+                return
+            if job['version'] == seen_version:
+                yield ": keep-alive\n\n"
+                continue
+            seen_version = job['version']
+            yield f"data: {json.dumps(job)}\n\n"
+            if job['status'] in IngestionJobs.TERMINAL_STATES:
+                return
+    
+    return Response(generate(), mimetype='text/event-stream', headers={"Cache-Control": "no-cache"})
+
 @app.route('/ask_ai', methods=['POST'])
 def ask_ai():
-    global uploaded_pdf_text, current_pdf_metadata
-    
     data = request.json
     user_question = data.get('question')
     user_id = data.get('user_id', 'anonymous')
@@ -938,87 +1106,84 @@ def ask_ai():
     # Get conversation history for context
     conversation_history = get_conversation_history(session_id)
     
+    # The user's document: the one asked for, or their latest upload
+    document = resolve_document(data.get('document_id'), user_id)
+    pdf_metadata = document['metadata'] if document else {}
+    
+    # Every keyword category of the question, found in one scan
+    features = question_features(user_question)
+    routing = None
+    provider_request = {}
+    
     # Handle general conversation without PDF requirement for better UX
-    if not uploaded_pdf_text and any(word in user_question.lower() for word in ["hello", "hi", "hey", "what", "how", "help", "explain"]):
-        # Allow general conversation even without PDF
-        contextual_prompt = create_contextual_prompt(user_question, conversation_history)
+    if not document and features["conversational"]:
+        # Allow general conversation even without PDF; each provider builds its
+        # prompt from the history within its own token budget
+        provider_request = {
+            "question": user_question,
+            "history": conversation_history,
+            "pdf_metadata": pdf_metadata
+        }
         
-        # Try to get a conversational response
-        ai_response = None
-        if gemini_model:
-            try:
-                response = gemini_model.generate_content(contextual_prompt)
-                ai_response = {
-                    "answer": add_personality_to_response(response.text),
-                    "confidence": 0.9,
-                    "ai_service": "Gemini (Conversational)",
-                    "response_type": "general_conversation"
-                }
-            except Exception as e:
-                print(f"Gemini error: {e}")
+        # Try to get a conversational response within the provider deadlines
+        routing = smart_ai_router(user_question, "", features=features, candidates=["gemini", "openai"])
+        answered_by, ai_response = provider_dispatcher.dispatch(routing["order"], provider_request)
+        routing = dict(routing, answered_by=answered_by)
+        if ai_response:
+            ai_response = dict(ai_response, response_type="general_conversation")
         
         # Fallback for general conversation
         if not ai_response:
-            encouraging_response = f"{random.choice(encouraging_phrases)} I'd love to help you learn! While I work best with curriculum documents, I can still try to explain things. What would you like to understand better?"
-            ai_response = {
-                "answer": encouraging_response,
-                "confidence": 0.7,
-                "ai_service": "Conversational Assistant",
-                "response_type": "encouraging"
-            }
+            ai_response = general_conversation_fallback()
     
-    elif not uploaded_pdf_text:
-        return jsonify({
-            "answer": "Hey! I'd love to help you learn. I work best when you upload a curriculum PDF, but I can still try to answer general questions. What would you like to know?",
-            "requires_pdf": True,
-            "confidence": 0.8,
-            "ai_service": "Conversational",
-            "response_type": "helpful_suggestion"
-        })
+    elif not document:
+        return jsonify(requires_pdf_response())
     
     else:
-        # Full conversational AI with document context
-        document_context = " ".join(current_document_context[:5])
-        contextual_prompt = create_contextual_prompt(user_question, conversation_history, document_context)
+        # Full conversational AI with the chunks most relevant to the question
+        document_chunks = document['chunks']
+        relevant_indices = select_chunk_indices(document['retriever'], user_question,
+                                                len(document_chunks), RETRIEVAL_TOP_K)
+        document_context = " ".join(document_chunks[i] for i in relevant_indices)
         
         # Smart AI routing with conversational enhancement
-        ai_service = smart_ai_router(user_question, uploaded_pdf_text)
-        ai_response = None
-        
-        # Try advanced AI services with conversational prompts
-        if ai_service == "gemini":
-            ai_response = ask_gemini_conversational(user_question, contextual_prompt, current_pdf_metadata)
-        elif ai_service == "openai":
-            ai_response = ask_openai_conversational(user_question, contextual_prompt, current_pdf_metadata)
-        
-        # Fallback to local QA with personality enhancement
-        if not ai_response:
-            basic_response = ask_local_qa(user_question, document_context)
-            if basic_response and basic_response.get("answer"):
-                enhanced_answer = add_personality_to_response(basic_response["answer"])
-                ai_response = {
-                    "answer": enhanced_answer,
-                    "confidence": basic_response.get("confidence", 0.6),
-                    "ai_service": "Local QA (Enhanced)",
-                    "response_type": "enhanced_local"
-                }
+        routing = smart_ai_router(user_question, document_context, features=features)
+
+        # Repeated (or paraphrased) questions about the same document skip the
+        # providers; answers are cached per quality tier, and only when a provider of
+        # that quality gave them (a premium question answered by local QA is not stored)
+        ai_response = response_cache.lookup(document['document_id'], user_question, routing["tier"],
+                                            PROMPT_TEMPLATE_VERSION) if response_cache else None
+        if ai_response:
+            ai_response = dict(ai_response, cached=True)
+            routing = dict(routing, answered_by="cache")
+
+        # Routed provider first; the others (premium tier: ending with local QA) start
+        # when it fails, misses its deadline or, with hedging, is slow to answer
+        else:
+            provider_request = {
+                "question": user_question,
+                "history": conversation_history,
+                "pdf_metadata": pdf_metadata,
+                "document": document,
+                "chunk_indices": relevant_indices
+            }
+            answered_by, ai_response = provider_dispatcher.dispatch(routing["order"], provider_request)
+            routing = dict(routing, answered_by=answered_by)
+
+        # Answers from a partially ingested document are not cached
+        if ai_response and response_cache and not ai_response.get("cached") \
+                and answers_tier(answered_by, routing["tier"]) \
+                and document['status'] == 'ready':
+            response_cache.store_response(document['document_id'], user_question, routing["tier"],
+                                          PROMPT_TEMPLATE_VERSION, ai_response)
     
     # Final fallback with personality
     if not ai_response:
-        curriculum_structure = current_pdf_metadata.get('curriculum_structure', {})
-        context_info = f"this document covers grades {', '.join(curriculum_structure.get('grades', []))}"
-        
-        fallback_response = f"You know what, that's a great question! While I'm still figuring out the best way to answer it from {context_info}, I'd love to help. Could you try asking about specific learning objectives, concepts, or assessment criteria? I'm here to make learning easier for you!"
-        
-        ai_response = {
-            "answer": fallback_response,
-            "confidence": 0.5,
-            "ai_service": "Conversational Fallback",
-            "response_type": "encouraging_fallback"
-        }
+        ai_response = conversational_fallback(pdf_metadata)
 
     # Add to conversation memory
-    add_to_conversation(session_id, user_question, ai_response["answer"])
+    conversation_length = add_to_conversation(session_id, user_question, ai_response["answer"])
 
     # Save learning session with conversational context
     try:
@@ -1029,8 +1194,8 @@ def ask_ai():
             "answer": ai_response["answer"],
             "ai_service": ai_response.get("ai_service", "unknown"),
             "confidence": ai_response.get("confidence", 0),
-            "pdf_title": current_pdf_metadata.get('title', 'No PDF uploaded'),
-            "conversation_length": len(conversation_history),
+            "pdf_title": pdf_metadata.get('title', 'No PDF uploaded'),
+            "conversation_length": conversation_length,
             "response_type": ai_response.get("response_type", "standard"),
             "timestamp": datetime.now().isoformat()
         }
@@ -1043,18 +1208,152 @@ def ask_ai():
         "confidence": ai_response.get("confidence", 0),
         "ai_service": ai_response.get("ai_service", "unknown"),
         "response_type": ai_response.get("response_type", "conversational"),
-        "conversation_length": len(conversation_history),
-        "pdf_metadata": current_pdf_metadata,
+        "source_page": ai_response.get("source_page"),
+        "cached": ai_response.get("cached", False),
+        "matched_question": ai_response.get("matched_question"),
+        "conversation_length": conversation_length,
+        "document_id": document['document_id'] if document else None,
+        "pdf_metadata": pdf_metadata,
+        "routing": routing,
+        "prompts": provider_request.get("prompt_reports", {}),
         "available_services": get_available_ai_services()
     })
 
+@app.route('/ask_ai_stream', methods=['POST'])
+def ask_ai_stream():
+    """Streaming /ask_ai: server-sent events with formatted answer blocks as they are generated.
+
+    Each ``data:`` event carries {"delta": text}; blocks are joined with a
+    blank line. A final ``done`` event carries the same fields as /ask_ai.
+    Cached and local-QA answers arrive as a single delta.
+    """
+    data = request.json
+    user_question = data.get('question')
+    user_id = data.get('user_id', 'anonymous')
+    session_id = data.get('session_id', user_id)
+    
+    if not user_question:
+        greeting = {
+            "answer": random.choice(conversation_starters),
+            "confidence": 1.0,
+            "ai_service": "Conversational",
+            "response_type": "greeting"
+        }
+        return Response([sse_event({"delta": greeting["answer"]}), sse_event(greeting, "done")],
+                        mimetype='text/event-stream', headers={"Cache-Control": "no-cache"})
+    
+    conversation_history = get_conversation_history(session_id)
+    document = resolve_document(data.get('document_id'), user_id)
+    pdf_metadata = document['metadata'] if document else {}
+    features = question_features(user_question)
+    
+    if document:
+        document_chunks = document['chunks']
+        relevant_indices = select_chunk_indices(document['retriever'], user_question,
+                                                len(document_chunks), RETRIEVAL_TOP_K)
+        document_context = " ".join(document_chunks[i] for i in relevant_indices)
+        routing = smart_ai_router(user_question, document_context, features=features)
+        cached_response = response_cache.lookup(document['document_id'], user_question, routing["tier"],
+                                                PROMPT_TEMPLATE_VERSION) if response_cache else None
+    elif features["conversational"]:
+        # General conversation, as in /ask_ai, only goes to the remote providers
+        relevant_indices = []
+        routing = smart_ai_router(user_question, "", features=features, candidates=["gemini", "openai"])
+        cached_response = None
+    else:
+        suggestion = requires_pdf_response()
+        return Response([sse_event({"delta": suggestion["answer"]}), sse_event(suggestion, "done")],
+                        mimetype='text/event-stream', headers={"Cache-Control": "no-cache"})
+    
+    provider_request = {
+        "question": user_question,
+        "history": conversation_history,
+        "pdf_metadata": pdf_metadata,
+        "document": document,
+        "chunk_indices": relevant_indices
+    }
+    
+    def generate():
+        ai_response = dict(cached_response, cached=True) if cached_response else None
+        answered_by = "cache" if cached_response else None
+        if not ai_response:
+            name, tokens = provider_dispatcher.open_stream(routing["order"], provider_request)
+            if tokens:
+                answered_by = name
+                ai_service_label, response_type = STREAMED_PROVIDERS.get(
+                    name, (f"{name} (Conversational)", "conversational"))
+                blocks = []
+                incomplete = False
+                try:
+                    for block in stream_personality(tokens):
+                        blocks.append(block)
+                        yield sse_event({"delta": block})
+                except StreamInterrupted:
+                    # What was sent stays sent; the answer is flagged and never reused
+                    incomplete = True
+                if blocks:
+                    ai_response = {
+                        "answer": "\n\n".join(blocks),
+                        "confidence": 0.5 if incomplete else 0.9,
+                        "ai_service": ai_service_label,
+                        "response_type": response_type if document else "general_conversation",
+                        "incomplete": incomplete
+                    }
+        
+        if ai_response:
+            if ai_response.get("cached"):
+                yield sse_event({"delta": ai_response["answer"]})
+        else:
+            # Nothing could be streamed: local QA, then the encouraging fallback
+            if document:
+                try:
+                    answered_by, ai_response = provider_dispatcher.dispatch(["local"], provider_request)
+                except ProviderOverloaded:
+                    ai_response = None  # Headers are already sent; fall back below
+                ai_response = ai_response or conversational_fallback(pdf_metadata)
+            else:
+                ai_response = general_conversation_fallback()
+            yield sse_event({"delta": ai_response["answer"]})
+        
+        # The full message is remembered and cached exactly like a /ask_ai answer;
+        # a cut-off one is neither, so later turns do not build on half an answer
+        if ai_response.get("incomplete"):
+            conversation_length = len(conversation_history)
+        else:
+            conversation_length = add_to_conversation(session_id, user_question, ai_response["answer"])
+        if document and response_cache and not ai_response.get("cached") \
+                and not ai_response.get("incomplete") \
+                and answers_tier(answered_by, routing["tier"]) \
+                and document['status'] == 'ready':
+            response_cache.store_response(document['document_id'], user_question, routing["tier"],
+                                          PROMPT_TEMPLATE_VERSION, ai_response)
+        
+        yield sse_event({
+            "answer": ai_response["answer"],
+            "confidence": ai_response.get("confidence", 0),
+            "ai_service": ai_response.get("ai_service", "unknown"),
+            "response_type": ai_response.get("response_type", "conversational"),
+            "source_page": ai_response.get("source_page"),
+            "cached": ai_response.get("cached", False),
+            "incomplete": ai_response.get("incomplete", False),
+            "matched_question": ai_response.get("matched_question"),
+            "conversation_length": conversation_length,
+            "document_id": document['document_id'] if document else None,
+            "routing": dict(routing, answered_by=answered_by),
+            "prompts": provider_request.get("prompt_reports", {})
+        }, "done")
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route('/get_curriculum_breakdown')
 def get_curriculum_breakdown():
     """Get detailed curriculum breakdown and analysis"""
-    if not uploaded_pdf_text:
+    document = resolve_document(request.args.get('document_id'), request.args.get('user_id', 'anonymous'))
+    if not document:
         return jsonify({"error": "No PDF loaded"})
     
-    curriculum_structure = current_pdf_metadata.get('curriculum_structure', {})
+    curriculum_structure = document['metadata'].get('curriculum_structure', {})
     if not curriculum_structure:
         return jsonify({"error": "No curriculum analysis available"})
     
@@ -1089,26 +1388,32 @@ def get_curriculum_breakdown():
 
 @app.route('/get_pdf_info')
 def get_pdf_info():
-    """Get information about the currently loaded PDF"""
-    if not uploaded_pdf_text:
+    """Get information about the requested (or most recent) PDF"""
+    document = resolve_document(request.args.get('document_id'), request.args.get('user_id', 'anonymous'))
+    if not document:
         return jsonify({"loaded": False})
     
+    text = document['text']
     return jsonify({
         "loaded": True,
-        "metadata": current_pdf_metadata,
-        "chunks_count": len(current_document_context),
-        "text_preview": uploaded_pdf_text[:200] + "..." if len(uploaded_pdf_text) > 200 else uploaded_pdf_text,
+        "document_id": document['document_id'],
+        "metadata": document['metadata'],
+        "chunks_count": len(document['chunks']),
+        "status": document.get('status', 'ready'),
+        "pages_processed": document.get('pages_processed'),
+        "text_preview": text[:200] + "..." if len(text) > 200 else text,
         "ai_services": get_available_ai_services()
     })
 
 @app.route('/clear_pdf', methods=['POST'])
 def clear_pdf():
-    """Clear the currently loaded PDF"""
-    global uploaded_pdf_text, current_document_context, current_pdf_metadata
-    
-    uploaded_pdf_text = ""
-    current_document_context = []
-    current_pdf_metadata = {}
+    """Clear the requested (or most recent) PDF for this user"""
+    owner = request_param('user_id', 'anonymous')
+    document_id = request_param('document_id') or document_store.latest_id(owner)
+    if document_id:
+        # Revoking ownership stops any worker from serving or rebuilding it for this owner
+        release_upload(document_id, owner, UPLOAD_FOLDER)
+        document_store.remove(document_id, owner)
     
     return jsonify({"success": True, "message": "PDF cleared successfully"})
 
@@ -0,0 +1,219 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from curriculum_analyzer import CurriculumAnalyzer
+from metrics import span
+from pdf_extraction import iter_page_batches, join_pages, read_pdf_metadata
+from retrieval import build_retriever
+
+
+class IngestionPipeline:
+    """Streams a saved PDF through extraction, chunking, analysis and indexing.
+
+    Pages are processed in batches of ``page_batch_size``. When an
+    ``on_progress`` callback is given it receives a usable partial document
+    as pages arrive, so questions can be answered while ingestion runs.
+    Partial documents are published each time the page count doubles and
+    carry a cheap interim index (TF-IDF instead of dense embeddings), so
+    republishing costs linear time overall; the configured retriever is
+    built once, over the finished document.
+    """
+
+    # Backends cheap enough to rebuild for every partial document
+    INTERIM_BACKENDS = ("tfidf", "bm25")
+
+    def __init__(self, chunker, retrieval_backend="tfidf", ingestion_cache=None,
+                 page_batch_size=16):
+        self.chunker = chunker
+        self.retrieval_backend = retrieval_backend
+        self.ingestion_cache = ingestion_cache
+        self.page_batch_size = page_batch_size
+
+    def process(self, filepath, document_id, owner, filename, on_progress=None):
+        """Build the document record for a saved PDF, or None if unreadable."""
+        # The document id is the PDF's content hash, so a repeat upload is a cache hit
+        if self.ingestion_cache:
+            document = self.ingestion_cache.get(document_id)
+            if document:
+                # The cached copy holds content only; owner and name come from this upload
+                document['owner'] = owner
+                document['filename'] = filename
+                document['metadata']['filename'] = filename
+                if on_progress:
+                    on_progress(document, document['metadata'].get('total_pages', 0))
+                return document
+
+        metadata = read_pdf_metadata(filepath)
+        if metadata is None:
+            return None
+        metadata['filename'] = filename
+
+        # The joined text and page offsets grow batch by batch; joining the
+        # batch texts with the page separator gives join_pages(all pages)
+        text_parts = []
+        page_offsets = []
+        pages_processed = 0
+        chunks = []
+        chunk_spans = []
+        analyzer = CurriculumAnalyzer()
+        word_count = 0
+        batch_start = 0
+        publish_at = 1
+        interim_backend = self.retrieval_backend if self.retrieval_backend in self.INTERIM_BACKENDS else "tfidf"
+        try:
+            batches = iter_page_batches(filepath, metadata['total_pages'], self.page_batch_size)
+            while True:
+                with span("extraction"):
+                    batch = next(batches, None)
+                if batch is None:
+                    break
+                batch_text, batch_page_offsets = join_pages(batch)
+                with span("chunking"):
+                    batch_chunks = self.chunker(batch_text, batch_page_offsets)
+                # Chunk spans are made relative to the whole document for citations
+                for chunk in batch_chunks:
+                    chunks.append(chunk['text'])
+                    chunk_spans.append({
+                        'start': batch_start + chunk['start'],
+                        'end': batch_start + chunk['end'],
+                        'page': pages_processed + chunk['page'],
+                        'end_page': pages_processed + chunk['end_page'],
+                    })
+                text_parts.append(batch_text)
+                page_offsets.extend(batch_start + offset for offset in batch_page_offsets)
+                pages_processed += len(batch)
+                batch_start += len(batch_text) + 1
+                # Analyze CAPS curriculum structure page by page as pages arrive
+                with span("curriculum_analysis"):
+                    for page in batch:
+                        analyzer.feed(page)
+                word_count += len(batch_text.split())
+
+                if on_progress and publish_at <= pages_processed < metadata['total_pages']:
+                    publish_at = pages_processed * 2
+                    partial_metadata = dict(metadata, word_count=word_count,
+                                            curriculum_structure=analyzer.result())
+                    partial = self._document(document_id, owner, filename, pages_processed,
+                                             "\n".join(text_parts), list(page_offsets), list(chunks),
+                                             list(chunk_spans), partial_metadata, "processing",
+                                             self._build_retriever(chunks, interim_backend))
+                    on_progress(partial, pages_processed)
+        except Exception as e:
+            print(f"Error extracting text from PDF: {e}")
+            return None
+
+        if not pages_processed:
+            return None
+
+        metadata['word_count'] = word_count
+        metadata['curriculum_structure'] = analyzer.result()
+        # Cached without owner or filename: the same PDF may be uploaded by others under other names
+        document = self._document(document_id, None, None, pages_processed, "\n".join(text_parts),
+                                  page_offsets, chunks, chunk_spans, dict(metadata, filename=None), "ready",
+                                  self._build_retriever(chunks, self.retrieval_backend))
+        if self.ingestion_cache:
+            self.ingestion_cache.put(document_id, document)
+        document['owner'] = owner
+        document['filename'] = filename
+        document['metadata']['filename'] = filename
+        if on_progress:
+            on_progress(document, pages_processed)
+        return document
+
+    def _document(self, document_id, owner, filename, pages_processed, text, page_offsets, chunks,
+                  chunk_spans, metadata, status, retriever):
+        return {
+            "document_id": document_id,
+            "owner": owner,
+            "filename": filename,
+            "status": status,
+            "pages_processed": pages_processed,
+            "text": text,
+            "page_offsets": page_offsets,
+            "chunks": chunks,
+            "chunk_spans": chunk_spans,
+            "metadata": metadata,
+            "retriever": retriever
+        }
+
+    def _build_retriever(self, chunks, backend):
+        with span("retrieval_index"):
+            return build_retriever(chunks, backend)
+
+
+class IngestionJobs:
+    """Runs ingestion in background threads and tracks per-job progress.
+
+    Job records are plain dicts; ``wait_for_update`` lets a server-sent
+    events stream block until a job changes instead of polling.
+    """
+
+    TERMINAL_STATES = ('completed', 'failed')
+
+    def __init__(self, max_workers=2, max_finished_jobs=256):
+        self.max_finished_jobs = max_finished_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="ingestion")
+        self._jobs = OrderedDict()
+        self._changed = threading.Condition()
+
+    def submit(self, target, **info):
+        """Queue ``target(report)`` and return the new job record.
+
+        ``target`` calls ``report(**fields)`` to publish progress and returns
+        a truthy value on success.
+        """
+        job_id = uuid.uuid4().hex
+        job = dict(info, job_id=job_id, status='queued', pages_total=None,
+                   pages_processed=0, error=None, created_at=time.time(),
+                   updated_at=time.time(), version=0)
+        with self._changed:
+            self._jobs[job_id] = job
+            self._prune()
+        self._executor.submit(self._run, job_id, target)
+        return dict(job)
+
+    def get(self, job_id):
+        with self._changed:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def wait_for_update(self, job_id, seen_version, timeout=15.0):
+        """Block until the job's version passes seen_version (or timeout)."""
+        with self._changed:
+            self._changed.wait_for(
+                lambda: job_id not in self._jobs or self._jobs[job_id]['version'] > seen_version,
+                timeout=timeout)
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _run(self, job_id, target):
+        self._update(job_id, status='processing')
+        try:
+            result = target(lambda **fields: self._update(job_id, **fields))
+            if result:
+                self._update(job_id, status='completed')
+            else:
+                self._update(job_id, status='failed', error="Failed to extract text from PDF.")
+        except Exception as e:
+            print(f"Ingestion job {job_id} failed: {e}")
+            self._update(job_id, status='failed', error=str(e))
+
+    def _update(self, job_id, **fields):
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            job['updated_at'] = time.time()
+            job['version'] += 1
+            self._changed.notify_all()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items()
+                    if job['status'] in self.TERMINAL_STATES]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
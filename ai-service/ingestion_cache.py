@@ -0,0 +1,122 @@
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+
+class IngestionCache:
+    """On-disk cache of processed documents keyed by the PDF's content hash.
+
+    Each entry is one pickle file holding everything ingestion produced (text,
+    page offsets, chunks, curriculum structure, retrieval index), so a repeat
+    upload skips PyMuPDF and the analyzers entirely. File modification times
+    double as LRU timestamps: hits touch the file and the oldest files are
+    deleted once the directory grows past ``max_bytes``. Entries written by a
+    different pipeline ``version`` are treated as misses.
+
+    Only point this at a directory the service owns; entries are unpickled.
+    """
+
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024, version="1"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._total_bytes = sum(size for _, _, size in self._entries())
+
+    def get(self, content_hash):
+        """Return the cached document record for a hash, or None."""
+        path = self._path(content_hash)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            self._count(hit=False)
+            return None
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable ingestion cache entry {content_hash}: {e}")
+            self._count(hit=False)
+            return None
+
+        if entry.get('version') != self.version:
+            self._count(hit=False)
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # evicted by another worker since it was read; the entry is still good
+        self._count(hit=True)
+        return entry['document']
+
+    def put(self, content_hash, document):
+        """Persist a document record, evicting old entries if over budget."""
+        path = self._path(content_hash)
+        entry = {'version': self.version, 'created_at': time.time(), 'document': document}
+        # Write then rename so concurrent workers never read a partial file
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(temp_path, path)
+            size = os.path.getsize(path)
+        except Exception as e:
+            print(f"⚠️ Could not write ingestion cache entry {content_hash}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        with self._lock:
+            self._total_bytes += size - previous_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _path(self, content_hash):
+        return os.path.join(self.directory, f"{content_hash}.pkl")
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.pkl'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+        return entries
+
+    def _evict(self):
+        # Re-scan the directory: other workers share it and may have written too
+        entries = sorted(self._entries())
+        self._total_bytes = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self._total_bytes -= size
+            except FileNotFoundError:
+                pass
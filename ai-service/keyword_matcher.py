@@ -0,0 +1,62 @@
+import re
+
+# Keyword sets the apps classify questions and answers against. Matching is
+# case-insensitive substring matching, as with `keyword in text.lower()`
+# ("hi" also matches "this"), so the categories behave as they always have.
+QUESTION_KEYWORDS = {
+    "complex": ['explain', 'analyze', 'create', 'generate', 'design', 'plan', 'develop', 'synthesize'],
+    "creative": ['write', 'create', 'story', 'example', 'scenario', 'imagine'],
+    "educational": ['teach', 'learn', 'study', 'curriculum', 'lesson', 'assessment'],
+    "conversational": ["hello", "hi", "hey", "what", "how", "help", "explain"],
+    "learning": ['learn', 'study', 'concept', 'breakdown', 'explain', 'what is', 'how to', 'teach',
+                 'understand'],
+}
+RESPONSE_KEYWORDS = {
+    "complexity": ["difficult", "complex", "advanced", "challenging", "confusing"],
+    "explain": ["explain"],
+}
+
+
+class KeywordMatcher:
+    """Finds every keyword of several named sets in one scan of the text.
+
+    All keywords go into one compiled alternation, tried longest first at
+    every position through a lookahead, so overlapping keywords are seen.
+    A shorter keyword starting at the same position is a prefix of the one
+    reported there, so each keyword also counts for the keywords it
+    contains ("what is" implies "what"). Adding a category is adding a set.
+    """
+
+    def __init__(self, keyword_sets):
+        self.keyword_sets = {name: frozenset(keyword.lower() for keyword in keywords)
+                             for name, keywords in keyword_sets.items()}
+        keywords = sorted(set().union(*self.keyword_sets.values()), key=lambda keyword: (-len(keyword), keyword))
+        self._pattern = re.compile("(?=(" + "|".join(re.escape(keyword) for keyword in keywords) + "))")
+        self._implied = {keyword: frozenset(other for other in keywords if other in keyword)
+                         for keyword in keywords}
+
+    def matches(self, text):
+        """The keywords (of any set) that occur in ``text``."""
+        found = set()
+        for match in self._pattern.finditer(text.lower()):
+            found |= self._implied[match.group(1)]
+        return found
+
+    def features(self, text):
+        """{set name: whether any of its keywords occurs in ``text``}"""
+        found = self.matches(text)
+        return {name: not keywords.isdisjoint(found) for name, keywords in self.keyword_sets.items()}
+
+
+question_matcher = KeywordMatcher(QUESTION_KEYWORDS)
+response_matcher = KeywordMatcher(RESPONSE_KEYWORDS)
+
+
+def question_features(question):
+    """Which QUESTION_KEYWORDS categories a question falls into"""
+    return question_matcher.features(question or "")
+
+
+def response_features(text):
+    """Which RESPONSE_KEYWORDS categories an answer mentions"""
+    return response_matcher.features(text or "")
@@ -0,0 +1,259 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+
+# Stage timings feed Prometheus histograms at /metrics when METRICS_ENABLED is
+# set; a request can also ask for its own breakdown with a debug header.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_trace = contextvars.ContextVar('trace', default=None)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram for one label value, Prometheus style."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        for index, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[index] += 1
+                break
+        self.total += seconds
+        self.count += 1
+
+
+class HistogramFamily:
+    """Histograms of one metric, one per value of its single label."""
+
+    def __init__(self, name, help_text, label, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, seconds):
+        with self._lock:
+            histogram = self._histograms.get(label_value)
+            if histogram is None:
+                histogram = self._histograms[label_value] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_value, histogram in sorted(self._histograms.items()):
+                label = f'{self.label}="{_escape(label_value)}"'
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {histogram.count}')
+                lines.append(f'{self.name}_sum{{{label}}} {histogram.total:.6f}')
+                lines.append(f'{self.name}_count{{{label}}} {histogram.count}')
+        return "\n".join(lines)
+
+
+class CounterFamily:
+    """Monotonic counters of one metric, one per combination of its labels."""
+
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._counts[label_values] = self._counts.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, count in sorted(self._counts.items()):
+                labels = ",".join(f'{label}="{_escape(value)}"' for label, value in zip(self.labels, label_values))
+                lines.append(f'{self.name}{{{labels}}} {count}')
+        return "\n".join(lines)
+
+
+stage_durations = HistogramFamily(
+    "fefe_stage_duration_seconds", "Time spent in each processing stage.", "stage")
+request_durations = HistogramFamily(
+    "fefe_request_duration_seconds", "Time spent handling each endpoint.", "endpoint")
+
+# Counter families and collectors (callables returning exposition text) that
+# other modules add to /metrics
+_counters = []
+_collectors = []
+
+
+def register_counter(counter):
+    _counters.append(counter)
+    return counter
+
+
+def register_collector(collector):
+    _collectors.append(collector)
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "trace", "started")
+
+    def __init__(self, name, trace):
+        self.name = name
+        self.trace = trace
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.started
+        if METRICS_ENABLED:
+            stage_durations.observe(self.name, elapsed)
+        if self.trace is not None:
+            self.trace.append((self.name, elapsed))
+        return False
+
+
+def span(name, trace=None):
+    """Time a stage: ``with span("retrieval"): ...``.
+
+    Feeds the stage histogram and the current request's trace, if any.
+    Pass ``trace`` explicitly from threads that do not share the request's
+    context. With metrics disabled and no trace this is a shared no-op.
+    """
+    trace = trace if trace is not None else _current_trace.get()
+    if trace is None and not METRICS_ENABLED:
+        return _NOOP_SPAN
+    return _Span(name, trace)
+
+
+def timed(name):
+    """Decorator form of span(): ``@timed("formatting")`` times every call."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def bind_trace(func, trace):
+    """func, to be run in another thread as part of the request traced by ``trace``.
+
+    Threads (and executors) start with an empty context, so spans opened
+    inside func would otherwise miss the request's trace.
+    """
+    context = contextvars.copy_context()
+    context.run(_current_trace.set, trace)
+    return functools.partial(context.run, func)
+
+
+def current_trace():
+    """The running request's list of (stage, seconds), or None if it is not traced."""
+    return _current_trace.get()
+
+
+def start_trace():
+    """Begin a trace for the current request; returns a token for end_trace()."""
+    return _current_trace.set([])
+
+
+def end_trace(token):
+    trace = _current_trace.get()
+    _current_trace.reset(token)
+    return trace
+
+
+def timing_breakdown(trace):
+    """Per-stage milliseconds of a trace, stages repeated within it summed."""
+    breakdown = {}
+    for name, seconds in trace or ():
+        breakdown[name] = round(breakdown.get(name, 0.0) + seconds * 1000, 2)
+    return breakdown
+
+
+def server_timing_header(trace):
+    """The trace as a Server-Timing header value (shown in browser dev tools)."""
+    return ", ".join(f"{name.replace('.', '-')};dur={ms}"
+                     for name, ms in timing_breakdown(trace).items())
+
+
+def render_prometheus():
+    sections = [stage_durations.render(), request_durations.render()]
+    sections += [counter.render() for counter in _counters]
+    sections += [collector() for collector in _collectors]
+    return "\n".join(section for section in sections if section) + "\n"
+
+
+def instrument_app(app, debug_header="X-Debug-Timing"):
+    """Time every request of a Flask app and serve /metrics.
+
+    A request carrying ``debug_header`` is traced: its stage breakdown is
+    returned in a Server-Timing header and, for JSON responses, a "timing"
+    field.
+    """
+    from flask import Response, g, request
+
+    @app.before_request
+    def start_request_timing():
+        g.request_started = time.perf_counter()
+        if request.headers.get(debug_header):
+            g.trace_token = start_trace()
+
+    @app.after_request
+    def finish_request_timing(response):
+        started = g.get('request_started')
+        elapsed = time.perf_counter() - started if started is not None else 0.0
+        if METRICS_ENABLED and started is not None:
+            request_durations.observe(request.url_rule.rule if request.url_rule else "unmatched", elapsed)
+        trace = current_trace() if 'trace_token' in g else None
+        if trace is not None:
+            trace = trace + [("total", elapsed)]
+            response.headers['Server-Timing'] = server_timing_header(trace)
+            if response.is_json and not response.is_streamed:
+                payload = response.get_json(silent=True)
+                if isinstance(payload, dict):
+                    payload['timing'] = timing_breakdown(trace)
+                    response.set_data(json.dumps(payload))
+        return response
+
+    @app.teardown_request
+    def end_request_trace(error=None):
+        # Always reset, so a worker thread never carries a trace into its next request
+        token = g.pop('trace_token', None)
+        if token is not None:
+            end_trace(token)
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        """Stage and request latency histograms in Prometheus text format"""
+        return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+
+
+class LazyModel:
+    """A model or client that is built the first time it is needed.
+
+    ``loader()`` does the heavy imports and returns the loaded object, or
+    None when the provider is not configured. A model registered with
+    ``enabled=False`` (e.g. no API key) is never loaded. A failed load is
+    remembered so requests do not retry it on every call.
+    """
+
+    def __init__(self, name, loader, enabled=True):
+        self.name = name
+        self.loader = loader
+        self.state = "idle" if enabled else "disabled"
+        self.error = None
+        self.load_seconds = None
+        self._value = None
+        self._lock = threading.Lock()
+
+    def available(self):
+        """True unless the model is disabled or failed to load; never triggers a load."""
+        return self.state not in ("disabled", "failed", "unavailable")
+
+    def get(self):
+        """The loaded object (loading it now if needed), or None if unavailable."""
+        if self.state == "ready":
+            return self._value
+        if not self.available():
+            return None
+        with self._lock:
+            if self.state == "idle":
+                self._load()
+        return self._value
+
+    def _load(self):
+        self.state = "loading"
+        started = time.perf_counter()
+        try:
+            value = self.loader()
+        except Exception as e:
+            print(f"⚠️ Could not load {self.name}: {e}")
+            self.state = "failed"
+            self.error = str(e)
+            return
+        self.load_seconds = round(time.perf_counter() - started, 2)
+        if value is None:
+            self.state = "unavailable"
+            return
+        self._value = value
+        self.state = "ready"
+        print(f"✅ {self.name} loaded in {self.load_seconds}s")
+
+    def status(self):
+        return {"state": self.state, "load_seconds": self.load_seconds, "error": self.error}
+
+    def _reset_after_fork(self):
+        # A load running in another thread of the parent never finishes here
+        self._lock = threading.Lock()
+        if self.state == "loading":
+            self.state = "idle"
+
+
+class ModelRegistry:
+    """Named LazyModels, with optional warm-up at startup.
+
+    ``warm_up(mode)``: "lazy" loads nothing until first use, "background"
+    loads everything on a daemon thread so the service answers /health
+    straight away, and "eager" loads in the calling thread. Use "eager"
+    with pre-forking servers that import the app in the master (e.g.
+    gunicorn --preload) so workers share the loaded weights copy-on-write.
+    """
+
+    WARMUP_MODES = ("lazy", "background", "eager")
+
+    def __init__(self):
+        self.models = {}
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def register(self, name, loader, enabled=True):
+        self.models[name] = LazyModel(name, loader, enabled=enabled)
+        return self.models[name]
+
+    def get(self, name):
+        model = self.models.get(name)
+        return model.get() if model else None
+
+    def available(self, name):
+        model = self.models.get(name)
+        return bool(model and model.available())
+
+    def warm_up(self, mode="background"):
+        if mode not in self.WARMUP_MODES:
+            print(f"⚠️ Unknown model warm-up mode {mode!r}, loading lazily")
+            return
+        if mode == "lazy":
+            return
+        if mode == "eager":
+            self._load_all()
+            return
+        threading.Thread(target=self._load_all, name="model-warmup", daemon=True).start()
+
+    def status(self):
+        return {name: model.status() for name, model in self.models.items()}
+
+    def _load_all(self):
+        for model in list(self.models.values()):
+            model.get()
+
+    def _reset_after_fork(self):
+        for model in self.models.values():
+            model._reset_after_fork()
@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz  # PyMuPDF for PDF text extraction
+
+# Below this many pages the cost of starting worker processes outweighs the gain
+PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '32'))
+MAX_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS', str(os.cpu_count() or 1)))
+
+# One long-lived pool per process, forked by start_extraction_pool() before
+# any threads exist (see there); None until then, or after it broke
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _extract_page_range(pdf_path, start, stop):
+    """Worker: open the PDF independently and return the text of pages [start, stop)."""
+    with fitz.open(pdf_path) as document:
+        return [document.load_page(page_num).get_text() for page_num in range(start, stop)]
+
+
+def _page_ranges(total_pages, batch_size):
+    for start in range(0, total_pages, batch_size):
+        yield start, min(start + batch_size, total_pages)
+
+
+def read_pdf_metadata(pdf_path):
+    """Page count, title and author of a PDF, or None if it cannot be opened."""
+    try:
+        with fitz.open(pdf_path) as document:
+            return {
+                'total_pages': len(document),
+                'title': document.metadata.get('title', 'Unknown'),
+                'author': document.metadata.get('author', 'Unknown'),
+            }
+    except Exception as e:
+        print(f"Error reading PDF: {e}")
+        return None
+
+
+def start_extraction_pool(workers=None):
+    """Fork the page-extraction worker processes now and keep them for the process's life.
+
+    Call this at import time, before model warm-up, ingestion or scheduler
+    threads start: forking a process that already runs threads (torch's
+    among them) can deadlock the child on a lock some thread held. Forking
+    is still used because spawned or forkserver children re-import the
+    Flask app (and its models) as their main module. Without a started pool,
+    or on platforms without fork, pages are extracted in-process.
+    """
+    global _pool, _pool_pid
+    workers = workers or MAX_WORKERS
+    if workers < 2 or 'fork' not in multiprocessing.get_all_start_methods():
+        return None
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+            _pool_pid = os.getpid()
+            # With fork, the first submit launches every worker at once
+            _pool.submit(int).result()
+        return _pool
+
+
+def _extraction_pool():
+    # A pool inherited through a later fork (e.g. by a pre-forking server's
+    # workers) belongs to the parent and cannot be used here
+    with _pool_lock:
+        return _pool if _pool_pid == os.getpid() else None
+
+
+def _discard_pool(pool):
+    # A broken pool has already shut itself down
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+
+
+def iter_page_batches(pdf_path, total_pages, batch_size):
+    """Yield lists of page texts, batch_size pages at a time, in page order.
+
+    Large documents are handed to the extraction pool with one task per
+    batch; batches are still yielded in order, as soon as each one is ready.
+    If a worker dies, the remaining pages are extracted in-process.
+    """
+    ranges = list(_page_ranges(total_pages, batch_size))
+    pool = _extraction_pool() if total_pages >= PARALLEL_MIN_PAGES and len(ranges) > 1 else None
+    if pool is None:
+        yield from _iter_serial(pdf_path, ranges)
+        return
+
+    futures = [pool.submit(_extract_page_range, pdf_path, start, stop) for start, stop in ranges]
+    for index, future in enumerate(futures):
+        try:
+            batch = future.result()
+        except BrokenProcessPool:
+            print("⚠️ PDF extraction pool broke, extracting the remaining pages in-process")
+            _discard_pool(pool)
+            yield from _iter_serial(pdf_path, ranges[index:])
+            return
+        yield batch
+
+
+def _iter_serial(pdf_path, ranges):
+    with fitz.open(pdf_path) as document:
+        for start, stop in ranges:
+            yield [document.load_page(page_num).get_text() for page_num in range(start, stop)]
+
+
+def join_pages(pages, separator="\n"):
+    """Join page texts once, returning (text, page_offsets).
+
+    page_offsets[i] is the character offset where page i starts in text.
+    """
+    page_offsets = []
+    position = 0
+    for page in pages:
+        page_offsets.append(position)
+        position += len(page) + len(separator)
+    return separator.join(pages), page_offsets
@@ -0,0 +1,178 @@
+import random
+import threading
+import time
+from collections import deque
+
+from metrics import CounterFamily, register_counter
+
+routing_decisions = register_counter(CounterFamily(
+    "fefe_routing_decisions_total", "Providers chosen by the router, by tier and reason.",
+    ("provider", "tier", "reason")))
+
+# Rough token count of a text: about four characters per token for English
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return len(text or "") // CHARS_PER_TOKEN + 1
+
+
+class RollingStats:
+    """A provider's recent calls: at most the last ``size``, none older than ``horizon`` seconds."""
+
+    def __init__(self, size=100, horizon=300.0):
+        self.horizon = horizon
+        self._calls = deque(maxlen=size)  # (finished at, seconds, ok, cost)
+
+    def add(self, seconds, ok, cost, now):
+        self._calls.append((now, seconds, ok, cost))
+
+    def summary(self, now):
+        while self._calls and self._calls[0][0] + self.horizon <= now:
+            self._calls.popleft()
+        calls = len(self._calls)
+        successes = [seconds for _, seconds, ok, _ in self._calls if ok]
+        return {
+            "calls": calls,
+            "errors": calls - len(successes),
+            "error_rate": round((calls - len(successes)) / calls, 4) if calls else None,
+            "mean_latency": round(sum(successes) / len(successes), 4) if successes else None,
+            "mean_cost": round(sum(cost for *_, cost in self._calls) / calls, 6) if calls else None,
+        }
+
+
+class CostAwareRouter:
+    """Chooses the provider order for a question from what recent calls cost.
+
+    ``profiles`` maps each provider to its quality ("premium" for the LLMs,
+    "basic" for local QA), a prior latency in seconds and a price per 1k
+    tokens. Questions that are complex, creative or educational (from the
+    keyword features, or ``complexity="high"``) need the premium tier and
+    keep basic providers only as a last resort; other questions may go to
+    any provider.
+
+    Each candidate is scored by expected seconds to a good answer (mean
+    latency of recent successes over the success rate, priors until there
+    are calls) plus ``cost_weight`` seconds per dollar of expected token
+    cost; the lowest score goes first. The provider the keyword rules
+    prefer (Gemini for educational, OpenAI for creative questions) gets a
+    ``preference`` discount, and ``exploration`` of decisions try another
+    candidate so the statistics stay fresh. Providers whose circuit
+    breaker is open get no traffic.
+    """
+
+    def __init__(self, profiles, window=100, horizon=300.0, cost_weight=200.0, preference=0.2,
+                 exploration=0.05, seed=None):
+        self.profiles = profiles
+        self.cost_weight = cost_weight
+        self.preference = preference
+        self.exploration = exploration
+        self._stats = {name: RollingStats(window, horizon) for name in profiles}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+    def observe(self, name, seconds, ok, request=None, response=None):
+        """Record one finished provider call (the dispatcher's on_result hook)."""
+        if name not in self._stats:
+            return
+        # The prompt as packed for this provider, when it reported one
+        prompt_report = (request or {}).get("prompt_reports", {}).get(name)
+        prompt_tokens = prompt_report["prompt_tokens"] if prompt_report else \
+            estimate_tokens((request or {}).get("prompt"))
+        tokens = prompt_tokens + estimate_tokens((response or {}).get("answer"))
+        cost = tokens / 1000 * self.profiles[name].get("cost_per_1k_tokens", 0.0)
+        now = time.time()
+        with self._lock:
+            self._stats[name].add(seconds, ok, cost, now)
+
+    def route(self, question, context="", complexity="medium", features=None, available=None,
+              circuit_open=None, prompt=None, candidates=None):
+        """Decide the provider order for one question.
+
+        Returns {"provider", "order", "tier", "reason", "estimates",
+        "skipped"}. ``context`` (the retrieved document text) counts towards
+        the prompt's token cost unless the full ``prompt`` is given;
+        ``available(name)`` filters unconfigured providers,
+        ``circuit_open(name)`` those being refused by their breaker, and
+        ``candidates`` limits the providers considered.
+        """
+        features = features or {}
+        premium = complexity == "high" or any(features.get(name) for name in ("complex", "creative", "educational"))
+        tier = "premium" if premium else "basic"
+        preferred = "gemini" if features.get("educational") else "openai" if features.get("creative") else None
+        # The prompt sent is question plus context unless the caller built one
+        prompt_tokens = estimate_tokens(prompt if prompt is not None else f"{question} {context or ''}")
+        now = time.time()
+
+        estimates, skipped, fallbacks = {}, {}, []
+        with self._lock:
+            for name in candidates or self.profiles:
+                profile = self.profiles.get(name)
+                if profile is None or (available and not available(name)):
+                    skipped[name] = "unavailable"
+                    continue
+                if circuit_open and circuit_open(name):
+                    skipped[name] = "circuit open"
+                    continue
+                if premium and profile.get("quality") != "premium":
+                    fallbacks.append(name)
+                    continue
+                estimates[name] = self._estimate(name, profile, prompt_tokens, now, name == preferred)
+
+        ranked = sorted(estimates, key=lambda name: estimates[name]["score"])
+        if not ranked:
+            reason = "no premium provider available" if fallbacks else "no provider available"
+        elif len(ranked) > 1 and self._random.random() < self.exploration:
+            ranked.insert(0, ranked.pop(self._random.randrange(1, len(ranked))))
+            reason = "exploration"
+        elif ranked[0] == preferred:
+            reason = f"preferred for {'educational' if preferred == 'gemini' else 'creative'} questions"
+        else:
+            reason = "lowest expected latency and cost"
+        order = ranked + fallbacks
+        decision = {
+            "provider": order[0] if order else None,
+            "order": order,
+            "tier": tier,
+            "reason": reason,
+            "estimates": estimates,
+            "skipped": skipped,
+        }
+        routing_decisions.inc((decision["provider"] or "none", tier, reason))
+        return decision
+
+    def _estimate(self, name, profile, prompt_tokens, now, preferred):
+        summary = self._stats[name].summary(now)
+        latency = summary["mean_latency"] if summary["mean_latency"] is not None else profile.get("latency", 1.0)
+        # Laplace-smoothed, so a few early failures do not rule a provider out
+        success_rate = (summary["calls"] - summary["errors"] + 1) / (summary["calls"] + 2)
+        expected_seconds = latency / success_rate
+        expected_cost = (prompt_tokens + profile.get("answer_tokens", 400)) / 1000 * \
+            profile.get("cost_per_1k_tokens", 0.0)
+        score = expected_seconds + self.cost_weight * expected_cost
+        if preferred:
+            score *= 1 - self.preference
+        return {
+            "expected_seconds": round(expected_seconds, 4),
+            "expected_cost": round(expected_cost, 6),
+            "score": round(score, 4),
+        }
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return {name: stats.summary(now) for name, stats in self._stats.items()}
+
+    def render_prometheus(self):
+        """Rolling per-provider statistics as Prometheus gauges."""
+        lines = []
+        gauges = (("fefe_provider_error_rate", "error_rate", "Recent error rate of each provider."),
+                  ("fefe_provider_latency_seconds", "mean_latency", "Mean latency of recent successful calls."),
+                  ("fefe_provider_cost_dollars", "mean_cost", "Mean estimated token cost of recent calls."))
+        stats = self.stats()
+        for metric, field, help_text in gauges:
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+            for name, summary in sorted(stats.items()):
+                if summary[field] is not None:
+                    lines.append(f'{metric}{{provider="{name}"}} {float(summary[field])}')
+        return "\n".join(lines)
@@ -0,0 +1,474 @@
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import bind_trace, current_trace, span
+
+
+class ProviderOverloaded(Exception):
+    """Raised by a provider that is shedding load; dispatch() re-raises it if nobody answers."""
+
+
+class StreamInterrupted(Exception):
+    """Raised by a provider stream that stalled past its deadline or failed midway."""
+
+
+class CircuitBreaker:
+    """Per-provider circuit breaker: closed, open or half-open.
+
+    Closed lets every call through and opens after ``failure_threshold``
+    failures in a row. Open rejects calls outright for ``recovery_time``
+    seconds, then turns half-open and lets ``half_open_max_calls`` probe
+    calls through at a time: a successful probe closes the circuit, a
+    failed one opens it again.
+
+    Every state change starts a new generation, and allow() hands each
+    admitted call the current one. An outcome reported for an earlier
+    generation is ignored, so a slow call let through while closed cannot
+    settle a later half-open probe.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, recovery_time=30.0, half_open_max_calls=1):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._trips = 0
+        self._rejected = 0
+        self._generation = 1
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def allow(self):
+        """The generation to report the call under if it may go ahead now, else None.
+
+        A half-open circuit hands out probe slots.
+        """
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == self.CLOSED:
+                return self._generation
+            if state == self.HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return self._generation
+            self._rejected += 1
+            return None
+
+    def record(self, ok, generation):
+        """The outcome of a call that allow() let through under ``generation``."""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if generation != self._generation:
+                return
+            if state == self.HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+            if ok:
+                if state != self.CLOSED:
+                    self._close()
+                self._failures = 0
+            else:
+                self._failures += 1
+                if state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                    self._open()
+
+    def abandon(self, generation):
+        """A call that allow() let through ended without an outcome (e.g. it lost a hedge)."""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if generation == self._generation and state == self.HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+    def status(self):
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "retry_in": round(self._opened_at + self.recovery_time - now, 1) if state == self.OPEN else None,
+                "trips": self._trips,
+                "rejected": self._rejected,
+                "failure_threshold": self.failure_threshold,
+                "recovery_time": self.recovery_time,
+            }
+
+    def _current_state(self, now):
+        if self._state == self.OPEN and now >= self._opened_at + self.recovery_time:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+            self._generation += 1
+        return self._state
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probes = 0
+        self._trips += 1
+        self._generation += 1
+
+    def _close(self):
+        self._state = self.CLOSED
+        self._generation += 1
+
+
+class Provider:
+    """One way of answering a question: a blocking ``call(request)`` with a deadline.
+
+    ``call`` receives the request dict built by /ask_ai (question, prompt,
+    document, ...) and returns a response dict, or None when it could not
+    answer. It runs in a worker thread so a slow SDK call never blocks the
+    event loop; ``available`` reports whether the provider is configured.
+    The optional ``stream(request)`` yields the raw answer text piece by piece.
+    With a ``breaker`` (CircuitBreaker), the dispatcher skips the provider
+    without calling it while the circuit is open. The deadline only stops
+    the dispatcher waiting, so ``call`` should also pass it to its SDK. With
+    ``max_workers`` set the provider gets a thread pool of its own instead
+    of sharing the dispatcher's, so time queued behind other providers'
+    slow calls never counts against its deadline.
+    """
+
+    def __init__(self, name, call, timeout=30.0, available=None, stream=None, breaker=None,
+                 max_workers=None):
+        self.name = name
+        self.call = call
+        self.timeout = timeout
+        self.stream = stream
+        self.breaker = breaker
+        self.max_workers = max_workers
+        self._available = available
+
+    def available(self):
+        return self._available() if self._available else True
+
+
+class StubProvider(Provider):
+    """Local stand-in for a remote LLM provider, for tests and load runs.
+
+    Answers every request with a canned response after ``delay`` seconds
+    (plus up to ``jitter`` more, uniformly), or returns None (a failed
+    call) when ``fail`` is set or, at random, for ``error_rate`` of calls.
+    ``prepare(request)``, if given, runs first, e.g. to build the prompt the
+    real provider would send.
+    """
+
+    def __init__(self, name, delay=0.0, fail=False, timeout=30.0, answer=None,
+                 jitter=0.0, error_rate=0.0, seed=None, breaker=None, prepare=None):
+        super().__init__(name, self._answer, timeout=timeout, stream=self._stream, breaker=breaker)
+        self.prepare = prepare
+        self.delay = delay
+        self.fail = fail
+        self.answer = answer
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+
+    def _simulate(self, request):
+        """Sleep for the simulated latency; True if this call should fail."""
+        if self.prepare:
+            self.prepare(request)
+        time.sleep(self.delay + (self._random.uniform(0, self.jitter) if self.jitter else 0.0))
+        return self.fail or (self.error_rate > 0 and self._random.random() < self.error_rate)
+
+    def _text(self, request):
+        return self.answer or f"[{self.name} stub] An answer to: {request.get('question', '')}"
+
+    def _answer(self, request):
+        if self._simulate(request):
+            return None
+        return {
+            "answer": self._text(request),
+            "confidence": 0.9,
+            "ai_service": f"Stub {self.name}",
+            "response_type": "stub"
+        }
+
+    def _stream(self, request):
+        # The delay is time to first token; the rest follows word by word
+        if self._simulate(request):
+            raise RuntimeError(f"{self.name} stub failure")
+        for word in self._text(request).split(" "):
+            yield word + " "
+
+
+class ProviderDispatcher:
+    """Runs providers on a shared asyncio loop with deadlines, hedging and fallback.
+
+    ``dispatch(order, request)`` starts the first available provider in
+    ``order``. The next one is started as soon as the current one fails or
+    misses its deadline, or, when ``hedge_delay`` (seconds) is set, once
+    that long has passed without an answer. The first good response wins
+    and the rest are abandoned. A provider whose circuit breaker is open is
+    passed over at once, as if it had failed. Per-provider call outcomes
+    are counted for /health, and each finished call is reported to
+    ``on_result(name, seconds, ok, request, response)`` if given.
+    """
+
+    def __init__(self, providers, hedge_delay=None, max_workers=16, on_result=None):
+        self.providers = {provider.name: provider for provider in providers}
+        self.hedge_delay = hedge_delay
+        self.max_workers = max_workers
+        self.on_result = on_result
+        self._stats = {name: {"calls": 0, "successes": 0, "failures": 0, "timeouts": 0,
+                              "hedged": 0, "wins": 0, "rejected": 0, "short_circuited": 0}
+                       for name in self.providers}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._executor = None
+        self._executors = {}  # providers with a pool of their own
+        self._pid = None
+
+    def available(self, name):
+        provider = self.providers.get(name)
+        return bool(provider and provider.available())
+
+    def circuit_open(self, name):
+        """Whether calls to the provider are currently being refused by its breaker."""
+        provider = self.providers.get(name)
+        return bool(provider and provider.breaker and provider.breaker.state == CircuitBreaker.OPEN)
+
+    def breakers(self):
+        """Circuit breaker status of every provider that has one."""
+        return {name: provider.breaker.status() for name, provider in self.providers.items()
+                if provider.breaker}
+
+    def _admit(self, name):
+        """The breaker generation the call is admitted under (0 without a breaker), or None."""
+        breaker = self.providers[name].breaker
+        generation = breaker.allow() if breaker else 0
+        if generation is None:
+            self._count(name, "short_circuited")
+        return generation
+
+    def dispatch(self, order, request):
+        """Answer request with the first good provider in order: (name, response) or (None, None)."""
+        order = [name for name in order if self.available(name)]
+        if not order:
+            return None, None
+        # The loop thread does not see this request's context, so hand its trace over
+        future = asyncio.run_coroutine_threadsafe(self.race(order, request, current_trace()),
+                                                  self._ensure_loop())
+        return future.result()
+
+    async def race(self, order, request, trace=None):
+        """Coroutine behind dispatch(), for callers already running an event loop."""
+        pending = set()
+        remaining = list(order)
+
+        def launch(hedged=False):
+            # Providers with an open circuit are skipped without waiting on them
+            while remaining:
+                name = remaining.pop(0)
+                generation = self._admit(name)
+                if generation is None:
+                    continue
+                task = asyncio.ensure_future(self._call(name, request, generation, trace))
+                task.provider_name = name
+                pending.add(task)
+                if hedged:
+                    self._count(name, "hedged")
+                return
+
+        overloaded = None
+        launch()
+        try:
+            while pending:
+                hedge_after = self.hedge_delay if remaining and self.hedge_delay is not None else None
+                done, _ = await asyncio.wait(pending, timeout=hedge_after,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch(hedged=True)
+                    continue
+                for task in done:
+                    pending.discard(task)
+                    try:
+                        response = task.result()
+                    except ProviderOverloaded as e:
+                        overloaded, response = e, None
+                    if response:
+                        self._count(task.provider_name, "wins")
+                        return task.provider_name, response
+                    # A failure starts the next provider straight away
+                    if remaining:
+                        launch()
+            if overloaded:
+                raise overloaded
+            return None, None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _call(self, name, request, generation, trace=None):
+        provider = self.providers[name]
+        loop = asyncio.get_running_loop()
+        self._count(name, "calls")
+        started = time.perf_counter()
+        try:
+            with span(f"provider.{name}", trace=trace):
+                response = await asyncio.wait_for(
+                    loop.run_in_executor(self._executors.get(name, self._executor),
+                                         bind_trace(provider.call, trace), request),
+                    provider.timeout)
+        except ProviderOverloaded:
+            # Shedding load is not a sign of an unhealthy provider
+            self._settle(provider, None, generation)
+            self._count(name, "rejected")
+            self._report(name, started, False, request)
+            raise
+        except asyncio.CancelledError:
+            self._settle(provider, None, generation)
+            raise
+        except asyncio.TimeoutError:
+            print(f"⚠️ {name} missed its {provider.timeout}s deadline")
+            self._settle(provider, False, generation)
+            self._count(name, "timeouts")
+            self._report(name, started, False, request)
+            return None
+        except Exception as e:
+            print(f"{name} error: {e}")
+            self._settle(provider, False, generation)
+            self._count(name, "failures")
+            self._report(name, started, False, request)
+            return None
+        self._settle(provider, bool(response), generation)
+        self._count(name, "successes" if response else "failures")
+        self._report(name, started, bool(response), request, response)
+        return response
+
+    def open_stream(self, order, request):
+        """Start streaming from the first provider in order that produces a token in time.
+
+        Returns (name, tokens), where tokens yields the answer text as it
+        arrives, or (None, None) when no provider could start. Each provider
+        must produce its first token, and every token after it, within its
+        deadline; a stream that stalls or fails midway raises
+        StreamInterrupted from tokens. The call counts as a success (and a
+        win) only once the stream has finished. Streams are not hedged: once
+        text has reached the client it cannot be swapped out.
+        """
+        for name in order:
+            provider = self.providers.get(name)
+            if not (provider and provider.stream and provider.available()):
+                continue
+            generation = self._admit(name)
+            if generation is None:
+                continue
+            self._count(name, "calls")
+            started = time.perf_counter()
+            tokens = self._stream_tokens(provider, request)
+            try:
+                first = next(tokens)
+            except (StopIteration, StreamInterrupted):
+                self._settle(provider, False, generation)
+                self._report(name, started, False, request)
+                continue
+            return name, self._tracked(name, provider, request, generation, started, first, tokens)
+        return None, None
+
+    def _stream_tokens(self, provider, request):
+        # The SDK iterator runs in its own thread so every read can have a deadline
+        pieces = queue.Queue()
+        cancelled = threading.Event()
+        done = object()
+
+        def pump():
+            try:
+                for token in provider.stream(request):
+                    if cancelled.is_set():
+                        return
+                    if token:
+                        pieces.put(token)
+                pieces.put(done)
+            except Exception as e:
+                pieces.put(e)
+
+        threading.Thread(target=bind_trace(pump, current_trace()), name=f"{provider.name}-stream",
+                         daemon=True).start()
+        try:
+            while True:
+                try:
+                    piece = pieces.get(timeout=provider.timeout)
+                except queue.Empty:
+                    print(f"⚠️ {provider.name} stream stalled past its {provider.timeout}s deadline")
+                    self._count(provider.name, "timeouts")
+                    raise StreamInterrupted(f"{provider.name} stalled")
+                if piece is done:
+                    return
+                if isinstance(piece, Exception):
+                    print(f"{provider.name} stream error: {piece}")
+                    self._count(provider.name, "failures")
+                    raise StreamInterrupted(f"{provider.name} failed: {piece}") from piece
+                yield piece
+        finally:
+            cancelled.set()
+
+    def _tracked(self, name, provider, request, generation, started, first, tokens):
+        # Settles the call once the stream ends; a client that hangs up gives no verdict
+        ok = None
+        try:
+            yield first
+            yield from tokens
+            ok = True
+        except StreamInterrupted:
+            ok = False
+            raise
+        finally:
+            self._settle(provider, ok, generation)
+            if ok is not None:
+                self._report(name, started, ok, request)
+            if ok:
+                self._count(name, "successes")
+                self._count(name, "wins")
+
+    def stats(self):
+        with self._lock:
+            return {name: dict(counts, available=self.available(name), timeout=self.providers[name].timeout)
+                    for name, counts in self._stats.items()}
+
+    @staticmethod
+    def _settle(provider, ok, generation):
+        """Tell the provider's breaker how a call admitted under ``generation`` ended (None: no verdict)."""
+        if provider.breaker is None:
+            return
+        if ok is None:
+            provider.breaker.abandon(generation)
+        else:
+            provider.breaker.record(ok, generation)
+
+    def _report(self, name, started, ok, request, response=None):
+        if self.on_result is not None:
+            try:
+                self.on_result(name, time.perf_counter() - started, ok, request, response)
+            except Exception as e:
+                print(f"⚠️ Provider result hook failed: {e}")
+
+    def _count(self, name, field):
+        with self._lock:
+            self._stats[name][field] += 1
+
+    def _ensure_loop(self):
+        with self._lock:
+            # A forked worker inherits the object but not the loop thread
+            if self._loop is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="provider")
+                self._executors = {name: ThreadPoolExecutor(max_workers=provider.max_workers,
+                                                            thread_name_prefix=f"provider-{name}")
+                                   for name, provider in self.providers.items() if provider.max_workers}
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="provider-loop",
+                                 daemon=True).start()
+            return self._loop
@@ -0,0 +1,188 @@
+import os
+
+import numpy as np
+
+QA_MODEL_NAME = "distilbert-base-cased-distilled-squad"
+
+
+class BatchedQAEngine:
+    """Runs extractive QA over many context chunks in a few padded batches.
+
+    The question is tokenized once and paired with every chunk (split into
+    overlapping windows when a chunk is longer than the model allows), the
+    resulting features are sorted by length and packed into batches so the
+    model does one forward pass per batch instead of one per chunk.
+    """
+
+    def __init__(self, qa_pipeline, batch_size=16, max_seq_length=384,
+                 doc_stride=128, max_answer_length=30):
+        self.model = qa_pipeline.model
+        self._configure(qa_pipeline.tokenizer, batch_size, max_seq_length,
+                        doc_stride, max_answer_length)
+
+    def _configure(self, tokenizer, batch_size, max_seq_length, doc_stride, max_answer_length):
+        self.tokenizer = tokenizer
+        self.batch_size = max(1, int(batch_size))
+        self.max_seq_length = max_seq_length
+        self.doc_stride = doc_stride
+        self.max_answer_length = max_answer_length
+        self.uses_token_type_ids = 'token_type_ids' in self.tokenizer.model_input_names
+
+    def answer(self, question, contexts, min_score=0.0):
+        """Return the best answer span across all contexts, or None.
+
+        The result is a dict with 'answer', 'score', 'chunk_index' and the
+        character 'start'/'end' of the span inside that chunk.
+        """
+        return self.answer_many([(question, contexts, min_score)])[0]
+
+    def answer_many(self, requests):
+        """answer() for several (question, contexts, min_score) requests at once.
+
+        Features from every request are packed into the same batches, so
+        concurrent questions share forward passes. Returns one result (or
+        None) per request, in order.
+        """
+        requests = [(question, list(contexts), min_score) for question, contexts, min_score in requests]
+        features = []
+        for request_index, (question, contexts, _) in enumerate(requests):
+            if not question or not contexts:
+                continue
+            for feature in self._build_features(question, contexts):
+                feature['request_index'] = request_index
+                features.append(feature)
+
+        best = [None] * len(requests)
+        # Sorting by length keeps padding inside each batch to a minimum
+        features.sort(key=lambda f: len(f['input_ids']))
+        for batch_start in range(0, len(features), self.batch_size):
+            batch = features[batch_start:batch_start + self.batch_size]
+            start_logits, end_logits = self._forward(batch)
+            for row, feature in enumerate(batch):
+                candidate = self._best_span(feature, start_logits[row], end_logits[row])
+                current = best[feature['request_index']]
+                if candidate and (current is None or candidate['score'] > current['score']):
+                    best[feature['request_index']] = candidate
+
+        results = []
+        for (_, contexts, min_score), candidate in zip(requests, best):
+            if candidate is None or candidate['score'] <= min_score:
+                results.append(None)
+                continue
+            context = contexts[candidate['chunk_index']]
+            candidate['answer'] = context[candidate['start']:candidate['end']].strip()
+            results.append(candidate)
+        return results
+
+    def _build_features(self, question, contexts):
+        """Pair the once-tokenized question with windows over every context."""
+        tokenizer = self.tokenizer
+        question_ids = tokenizer.encode(question, add_special_tokens=False)
+        question_ids = question_ids[:self.max_seq_length // 2]
+
+        # A placeholder context tells us where the context tokens land
+        # between the model's special tokens, whatever the architecture.
+        template = tokenizer.build_inputs_with_special_tokens(question_ids, [-1])
+        context_offset = template.index(-1)
+        context_budget = self.max_seq_length - (len(template) - 1)
+        stride = min(self.doc_stride, max(1, context_budget // 2))
+
+        encoded = tokenizer(contexts, add_special_tokens=False,
+                            return_offsets_mapping=True)
+
+        features = []
+        for chunk_index, (context_ids, offsets) in enumerate(
+                zip(encoded['input_ids'], encoded['offset_mapping'])):
+            if not context_ids:
+                continue
+            window_start = 0
+            while True:
+                window_ids = context_ids[window_start:window_start + context_budget]
+                feature = {
+                    'chunk_index': chunk_index,
+                    'input_ids': tokenizer.build_inputs_with_special_tokens(question_ids, window_ids),
+                    'context_offset': context_offset,
+                    'offsets': offsets[window_start:window_start + len(window_ids)],
+                }
+                if self.uses_token_type_ids:
+                    feature['token_type_ids'] = tokenizer.create_token_type_ids_from_sequences(
+                        question_ids, window_ids)
+                features.append(feature)
+
+                if window_start + context_budget >= len(context_ids):
+                    break
+                window_start += context_budget - stride
+        return features
+
+    def _forward(self, batch):
+        """Pad a batch of features and return numpy start/end logits."""
+        import torch
+
+        input_ids, attention_mask, token_type_ids = self._pad(batch)
+        inputs = {
+            'input_ids': torch.from_numpy(input_ids),
+            'attention_mask': torch.from_numpy(attention_mask),
+        }
+        if self.uses_token_type_ids:
+            inputs['token_type_ids'] = torch.from_numpy(token_type_ids)
+
+        with torch.inference_mode():
+            outputs = self.model(**inputs)
+        return outputs.start_logits.numpy(), outputs.end_logits.numpy()
+
+    def _pad(self, batch):
+        """Right-pad a batch of features into int64 input_ids/attention_mask/token_type_ids arrays."""
+        pad_id = self.tokenizer.pad_token_id or 0
+        width = max(len(f['input_ids']) for f in batch)
+
+        input_ids = np.full((len(batch), width), pad_id, dtype=np.int64)
+        attention_mask = np.zeros((len(batch), width), dtype=np.int64)
+        token_type_ids = np.zeros((len(batch), width), dtype=np.int64)
+        for row, feature in enumerate(batch):
+            length = len(feature['input_ids'])
+            input_ids[row, :length] = feature['input_ids']
+            attention_mask[row, :length] = 1
+            if self.uses_token_type_ids:
+                token_type_ids[row, :length] = feature['token_type_ids']
+        return input_ids, attention_mask, token_type_ids
+
+    def _best_span(self, feature, start_logits, end_logits):
+        """Pick the highest scoring span inside the feature's context window."""
+        offset = feature['context_offset']
+        length = len(feature['offsets'])
+        if length == 0:
+            return None
+
+        # Same scoring as the transformers QA pipeline: softmax over the
+        # context tokens, then the best start/end pair within max length.
+        start = _softmax(start_logits[offset:offset + length])
+        end = _softmax(end_logits[offset:offset + length])
+        scores = np.triu(np.outer(start, end))
+        scores = np.tril(scores, self.max_answer_length - 1)
+
+        flat_index = int(np.argmax(scores))
+        start_token, end_token = divmod(flat_index, length)
+        return {
+            'chunk_index': feature['chunk_index'],
+            'score': float(scores[start_token, end_token]),
+            'start': feature['offsets'][start_token][0],
+            'end': feature['offsets'][end_token][1],
+        }
+
+
+def _softmax(logits):
+    exp = np.exp(logits - np.max(logits))
+    return exp / exp.sum()
+
+
+def build_qa_engine(backend="torch", model_name=QA_MODEL_NAME, batch_size=16,
+                    onnx_dir=None, quantize=True):
+    """Load the local QA model on the "torch" (transformers) or "onnx" backend."""
+    if backend == "onnx":
+        from qa_onnx import build_onnx_qa_engine
+        onnx_dir = onnx_dir or os.path.join('cache', 'onnx', model_name.replace('/', '--'))
+        return build_onnx_qa_engine(model_name, onnx_dir, quantize=quantize, batch_size=batch_size)
+    if backend != "torch":
+        print(f"⚠️ Unknown QA backend {backend!r}, using torch")
+    from transformers import pipeline
+    return BatchedQAEngine(pipeline("question-answering", model=model_name), batch_size=batch_size)
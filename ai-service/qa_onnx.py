@@ -0,0 +1,123 @@
+import os
+from contextlib import contextmanager
+
+from qa_engine import BatchedQAEngine
+
+
+@contextmanager
+def _export_lock(output_dir):
+    """Hold an exclusive lock on output_dir while exporting, across processes."""
+    try:
+        import fcntl
+    except ImportError:  # No flock (Windows): exports are not serialized
+        yield
+        return
+    with open(os.path.join(output_dir, ".export.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def export_onnx_model(model_name, output_dir, quantize=True):
+    """Export a QA model to ONNX (int8 dynamically quantized by default) once.
+
+    Returns (model_path, tokenizer_dir). The export is skipped when the
+    file already exists, so only the first start pays for it. Workers
+    starting together wait on a file lock for one export, and models are
+    written to temporary files and renamed into place, so a crash never
+    leaves a truncated model behind.
+    """
+    model_file = "model-int8.onnx" if quantize else "model.onnx"
+    model_path = os.path.join(output_dir, model_file)
+    if os.path.exists(model_path):
+        return model_path, output_dir
+
+    os.makedirs(output_dir, exist_ok=True)
+    with _export_lock(output_dir):
+        # Another worker may have finished the export while this one waited
+        if not os.path.exists(model_path):
+            _export(model_name, output_dir, model_path, quantize)
+    return model_path, output_dir
+
+
+def _export(model_name, output_dir, model_path, quantize):
+    import torch
+    from transformers import AutoModelForQuestionAnswering, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForQuestionAnswering.from_pretrained(model_name)
+    model.eval()
+    # Saved first: the model file appearing means the export is complete
+    tokenizer.save_pretrained(output_dir)
+
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids')
+                   if name in tokenizer.model_input_names]
+    sample = tokenizer("What is a double angle identity?", "sin(2x) = 2sin(x)cos(x)",
+                       return_tensors="pt")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes.update({"start_logits": {0: "batch", 1: "sequence"},
+                         "end_logits": {0: "batch", 1: "sequence"}})
+
+    float_path = os.path.join(output_dir, "model.onnx")
+    temp_float_path = os.path.join(output_dir, f".{os.getpid()}.model.onnx")
+    temp_model_path = os.path.join(output_dir, f".{os.getpid()}.{os.path.basename(model_path)}")
+    try:
+        with torch.inference_mode():
+            torch.onnx.export(
+                model,
+                tuple(sample[name] for name in input_names),
+                temp_float_path,
+                input_names=input_names,
+                output_names=["start_logits", "end_logits"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+            )
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(temp_float_path, temp_model_path, weight_type=QuantType.QInt8)
+            os.replace(temp_model_path, model_path)
+        os.replace(temp_float_path, float_path)
+    finally:
+        for path in (temp_float_path, temp_model_path):
+            if os.path.exists(path):
+                os.remove(path)
+    print(f"✅ Exported {model_name} to {model_path}")
+
+
+class OnnxQAEngine(BatchedQAEngine):
+    """BatchedQAEngine running on ONNX Runtime instead of PyTorch.
+
+    Feature building, batching and span scoring are inherited unchanged,
+    so answers keep the same dict contract; only the forward pass differs.
+    torch is not needed at runtime once the model has been exported.
+    """
+
+    def __init__(self, model_path, tokenizer, batch_size=16, max_seq_length=384,
+                 doc_stride=128, max_answer_length=30, intra_op_threads=0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self._configure(tokenizer, batch_size, max_seq_length, doc_stride, max_answer_length)
+
+    def _forward(self, batch):
+        input_ids, attention_mask, token_type_ids = self._pad(batch)
+        inputs = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in self.input_names:
+            inputs['token_type_ids'] = token_type_ids
+        start_logits, end_logits = self.session.run(["start_logits", "end_logits"], inputs)
+        return start_logits, end_logits
+
+
+def build_onnx_qa_engine(model_name, cache_dir, quantize=True, batch_size=16):
+    """Export the model if needed and return an OnnxQAEngine for it."""
+    from transformers import AutoTokenizer
+
+    model_path, tokenizer_dir = export_onnx_model(model_name, cache_dir, quantize=quantize)
+    return OnnxQAEngine(model_path, AutoTokenizer.from_pretrained(tokenizer_dir), batch_size=batch_size)
@@ -0,0 +1,153 @@
+import os
+import queue
+import threading
+import time
+
+from providers import ProviderOverloaded
+
+
+class QAQueueFull(ProviderOverloaded):
+    """The QA scheduler's queue is full; the caller should retry later (HTTP 503)."""
+
+
+class _PendingRequest:
+    def __init__(self, question, contexts, min_score):
+        self.request = (question, contexts, min_score)
+        self.pairs = max(1, len(contexts))
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+        self.cancelled = False  # the caller stopped waiting; skip it
+
+
+class MicroBatchScheduler:
+    """Batches QA requests from concurrent callers into shared forward passes.
+
+    Wraps an engine with ``answer_many`` (BatchedQAEngine) and offers the
+    same ``answer()`` as the engine, so it drops in wherever one is used.
+    A single inference thread takes the oldest waiting request, then keeps
+    collecting until ``max_batch_pairs`` (question, chunk) pairs are
+    gathered or ``max_wait`` seconds have passed, and answers the group
+    with one answer_many() call. At most ``max_queue`` requests may wait;
+    beyond that answer() raises QAQueueFull straight away, which keeps
+    tail latency bounded under overload. A request whose caller timed out
+    is dropped before batching rather than answered for nobody.
+    """
+
+    def __init__(self, engine, max_batch_pairs=64, max_wait=0.01, max_queue=128, timeout=30.0):
+        self.engine = engine
+        self.max_batch_pairs = max(1, int(max_batch_pairs))
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._pid = None
+        self._stats = {"requests": 0, "rejected": 0, "cancelled": 0, "batches": 0, "pairs": 0, "errors": 0}
+
+    @property
+    def tokenizer(self):
+        return self.engine.tokenizer
+
+    def answer(self, question, contexts, min_score=0.0):
+        """Queue one request and wait for its result (see BatchedQAEngine.answer)."""
+        pending = self.submit(question, contexts, min_score)
+        if not pending.done.wait(self.timeout):
+            pending.cancelled = True
+            raise TimeoutError(f"QA request not answered within {self.timeout}s")
+        if pending.error:
+            raise pending.error
+        return pending.result
+
+    def submit(self, question, contexts, min_score=0.0):
+        """Queue one request without waiting; the returned request's ``done`` is set when answered."""
+        pending = _PendingRequest(question, list(contexts), min_score)
+        self._ensure_worker()
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._stats["rejected"] += 1
+                raise QAQueueFull(f"QA queue is full ({self.max_queue} requests waiting)")
+            self._queued += 1
+            self._stats["requests"] += 1
+        self._queue.put(pending)
+        return pending
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, queued=self._queued)
+        stats["mean_batch_pairs"] = round(stats["pairs"] / stats["batches"], 1) if stats["batches"] else 0
+        return stats
+
+    def _ensure_worker(self):
+        with self._lock:
+            # A forked worker inherits the object but not the inference thread
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                self._queued = 0
+                threading.Thread(target=self._run, args=(self._queue,), name="qa-scheduler",
+                                 daemon=True).start()
+
+    def _run(self, requests):
+        carried = None
+        while True:
+            if carried is not None and carried.cancelled:
+                self._drop(carried)
+                carried = None
+            batch = [carried or self._next(requests, None)]
+            carried = None
+            pairs = batch[0].pairs
+            deadline = time.monotonic() + self.max_wait
+            while pairs < self.max_batch_pairs:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                pending = self._next(requests, remaining)
+                if pending is None:
+                    break
+                if pairs + pending.pairs > self.max_batch_pairs:
+                    # Would overflow the batch: it leads the next one instead
+                    carried = pending
+                    break
+                batch.append(pending)
+                pairs += pending.pairs
+            with self._lock:
+                self._queued -= len(batch)
+            self._answer(batch, pairs)
+
+    def _next(self, requests, timeout):
+        """The next request still being waited for, or None if none arrives in time."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                pending = requests.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if not pending.cancelled:
+                return pending
+            self._drop(pending)
+
+    def _drop(self, pending):
+        with self._lock:
+            self._queued -= 1
+            self._stats["cancelled"] += 1
+
+    def _answer(self, batch, pairs):
+        try:
+            results = self.engine.answer_many([pending.request for pending in batch])
+        except Exception as e:
+            print(f"QA scheduler inference error: {e}")
+            with self._lock:
+                self._stats["errors"] += 1
+            for pending in batch:
+                pending.error = e
+                pending.done.set()
+            return
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["pairs"] += pairs
+        for pending, result in zip(batch, results):
+            pending.result = result
+            pending.done.set()
@@ -0,0 +1,184 @@
+import argparse
+import os
+import threading
+from multiprocessing.connection import Client, Listener
+
+from qa_engine import QA_MODEL_NAME, build_qa_engine
+from qa_scheduler import MicroBatchScheduler, QAQueueFull
+
+# multiprocessing.connection exchanges pickles, so whoever can connect and
+# authenticate can run code in the server: TCP stays on the loopback interface
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost")
+
+
+def server_authkey():
+    """The shared secret from QA_SERVER_AUTHKEY; there is deliberately no default."""
+    authkey = os.getenv('QA_SERVER_AUTHKEY')
+    if not authkey:
+        raise ValueError("QA_SERVER_AUTHKEY must be set for the QA model server and its clients")
+    return authkey.encode()
+
+
+def parse_address(address):
+    """A Unix socket path, or a (host, port) tuple for a loopback "host:port"."""
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit() and '/' not in address:
+        if host not in LOOPBACK_HOSTS:
+            raise ValueError(f"QA server address {address!r} is not on the loopback interface")
+        return host, int(port)
+    return address
+
+
+class QAModelServer:
+    """Serves BatchedQAEngine.answer() to every WSGI worker on the host.
+
+    One process owns the model; workers reach it through RemoteQAEngine
+    over a Unix socket (created owner-only, mode 0600), or loopback TCP for
+    a "host:port" address. Run it with ``python qa_server.py --address
+    /tmp/fefe-qa.sock`` and set QA_SERVER_ADDRESS and QA_SERVER_AUTHKEY for
+    the apps.
+
+    Each connection is handled on its own thread and its requests go
+    through one MicroBatchScheduler, so questions from different workers
+    share forward passes. A full scheduler queue is reported back as
+    QAQueueFull.
+    """
+
+    def __init__(self, scheduler, address, authkey=None):
+        self.scheduler = scheduler
+        self.address = parse_address(address)
+        self.authkey = authkey or server_authkey()
+
+    def serve_forever(self):
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)  # Left behind by a previous run
+        # The socket file is created with the process umask; keep it owner-only
+        previous_umask = os.umask(0o177)
+        try:
+            listener = Listener(self.address, authkey=self.authkey)
+        finally:
+            os.umask(previous_umask)
+        with listener:
+            print(f"✅ QA model server listening on {self.address}")
+            while True:
+                try:
+                    connection = listener.accept()
+                except Exception as e:
+                    print(f"⚠️ QA server rejected a connection: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+
+    def _handle(self, connection):
+        with connection:
+            while True:
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    return
+                command = message[0]
+                if command == "ping":
+                    connection.send(("ok", self.stats()))
+                    continue
+                if command != "answer":
+                    connection.send(("error", f"unknown command {command!r}"))
+                    continue
+                try:
+                    connection.send(("ok", self.scheduler.answer(*message[1:])))
+                except QAQueueFull as e:
+                    connection.send(("busy", str(e)))
+                except Exception as e:
+                    connection.send(("error", str(e)))
+
+    def stats(self):
+        return self.scheduler.stats()
+
+
+class RemoteQAEngine:
+    """Client side of QAModelServer with the same answer() contract as BatchedQAEngine.
+
+    Each thread keeps its own connection and reconnects after errors. The
+    tokenizer (only needed for token-based chunking) is loaded locally on
+    first use; the model itself never is.
+    """
+
+    def __init__(self, address, authkey=None, timeout=30.0, model_name=QA_MODEL_NAME):
+        self.address = parse_address(address)
+        self.authkey = authkey or server_authkey()
+        self.timeout = timeout
+        self.model_name = model_name
+        self._local = threading.local()
+        self._tokenizer = None
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        return self._tokenizer
+
+    def answer(self, question, contexts, min_score=0.0):
+        return self._call(("answer", question, list(contexts), min_score))
+
+    def ping(self):
+        return self._call(("ping",))
+
+    def _call(self, message):
+        connection = self._connection()
+        try:
+            connection.send(message)
+            if not connection.poll(self.timeout):
+                raise TimeoutError(f"QA server did not answer within {self.timeout}s")
+            status, payload = connection.recv()
+        except Exception:
+            # The stream may be out of step now; start afresh next time
+            self._local.connection = None
+            connection.close()
+            raise
+        if status == "busy":
+            raise QAQueueFull(payload)
+        if status != "ok":
+            raise RuntimeError(f"QA server error: {payload}")
+        return payload
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None or getattr(self._local, "pid", None) != os.getpid():
+            connection = Client(self.address, authkey=self.authkey)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared DistilBERT QA model server")
+    parser.add_argument("--address", default=os.getenv('QA_SERVER_ADDRESS', '/tmp/fefe-qa.sock'),
+                        help="Unix socket path or loopback host:port")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv('QA_BATCH_SIZE', '16')),
+                        help="features per forward pass")
+    parser.add_argument("--max-batch-pairs", type=int,
+                        default=int(os.getenv('QA_SCHEDULER_MAX_BATCH', '64')),
+                        help="most (question, chunk) pairs answered together")
+    parser.add_argument("--max-wait-ms", type=float,
+                        default=float(os.getenv('QA_SCHEDULER_MAX_WAIT_MS', '10')),
+                        help="how long the first queued request waits for others to batch with")
+    parser.add_argument("--max-queue", type=int, default=int(os.getenv('QA_SCHEDULER_MAX_QUEUE', '128')),
+                        help="requests allowed to wait before new ones are rejected")
+    parser.add_argument("--backend", default=os.getenv('QA_BACKEND', 'torch'), choices=["torch", "onnx"],
+                        help="inference backend")
+    args = parser.parse_args()
+    # Refuse a bad address or a missing key before spending time loading the model
+    try:
+        parse_address(args.address)
+        authkey = server_authkey()
+    except ValueError as e:
+        parser.error(str(e))
+
+    engine = build_qa_engine(args.backend, batch_size=args.batch_size,
+                             onnx_dir=os.getenv('QA_ONNX_DIR'),
+                             quantize=os.getenv('QA_ONNX_QUANTIZE', 'true').lower() in ('1', 'true', 'yes'))
+    scheduler = MicroBatchScheduler(engine, max_batch_pairs=args.max_batch_pairs,
+                                    max_wait=args.max_wait_ms / 1000, max_queue=args.max_queue)
+    QAModelServer(scheduler, args.address, authkey).serve_forever()
+
+if __name__ == "__main__":
+    main()
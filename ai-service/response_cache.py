@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import span
+
+_WHITESPACE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION = re.compile(r'[\s?!.]+$')
+
+
+def normalize_question(question):
+    """Case- and whitespace-insensitive form of a question, minus trailing ?!."""
+    return _TRAILING_PUNCTUATION.sub('', _WHITESPACE.sub(' ', question.strip().lower()))
+
+
+class MemoryResponseStore:
+    """In-process LRU store of cached responses with per-entry expiry."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, response = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def set(self, key, response, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._entries),
+                    "max_entries": self.max_entries}
+
+
+class SQLiteResponseStore:
+    """SQLite-backed store, shared by every worker pointed at the same file.
+
+    Responses are stored as JSON; the least recently used rows are deleted
+    once the table holds more than ``max_entries``.
+    """
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection_pid = None
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, last_used REAL NOT NULL)")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    @property
+    def _connection(self):
+        # SQLite connections must not cross a fork: each worker opens its own
+        if self._connection_pid != os.getpid():
+            self._connection_handle = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._connection_pid = os.getpid()
+        return self._connection_handle
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT response, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._connection.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, response, expires_at):
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, expires_at, last_used) "
+                "VALUES (?, ?, ?, ?)", (key, json.dumps(response), expires_at, now))
+            self._connection.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+            self._connection.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                "ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def stats(self):
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"backend": "sqlite", "entries": entries, "max_entries": self.max_entries,
+                "path": self.path}
+
+
+class ResponseCache:
+    """Cache of /ask_ai answers keyed by document, question, provider and prompt version.
+
+    Two requests share an entry when they ask the same normalized question
+    about the same document (content hash), were routed to the same provider
+    and were answered with the same prompt template version. Entries expire
+    after ``ttl`` seconds; the store bounds the number kept. An optional
+    ``semantic_cache`` (see semantic_cache.py) is consulted on exact misses
+    so paraphrased questions can be answered from cache too.
+    """
+
+    def __init__(self, store, ttl=3600, semantic_cache=None):
+        self.store = store
+        self.ttl = ttl
+        self.semantic_cache = semantic_cache
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(document_id, question, provider, template_version):
+        raw = json.dumps([document_id, normalize_question(question), provider, template_version])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def lookup(self, document_id, question, provider, template_version):
+        """Cached response for a question, exact or (if enabled) semantic, or None."""
+        key = self.make_key(document_id, question, provider, template_version)
+        with span("response_cache"):
+            response = self.get(key)
+        if response is None and self.semantic_cache:
+            with span("semantic_cache"):
+                response = self.semantic_cache.lookup((document_id, provider, template_version), question)
+            if response is not None:
+                # Repeats of this paraphrase become exact hits
+                self.put(key, response)
+        return response
+
+    def store_response(self, document_id, question, provider, template_version, response):
+        self.put(self.make_key(document_id, question, provider, template_version), response)
+        if self.semantic_cache:
+            self.semantic_cache.add((document_id, provider, template_version), question, response)
+
+    def get(self, key):
+        """Return the cached response for a key, or None."""
+        try:
+            response = self.store.get(key)
+        except Exception as e:
+            print(f"⚠️ Response cache lookup failed: {e}")
+            response = None
+        with self._lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return response
+
+    def put(self, key, response):
+        try:
+            self.store.set(key, response, time.time() + self.ttl)
+        except Exception as e:
+            print(f"⚠️ Could not write response cache entry: {e}")
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        stats = dict(self.store.stats(), hits=hits, misses=misses, ttl=self.ttl)
+        stats["hit_rate"] = round(hits / (hits + misses), 3) if hits + misses else 0.0
+        if self.semantic_cache:
+            stats["semantic"] = self.semantic_cache.stats()
+        return stats
+
+
+def build_response_cache(backend="memory", ttl=3600, max_entries=1024, path=None,
+                         semantic_cache=None):
+    """Response cache for a backend name ('memory', 'sqlite' or 'off'), or None."""
+    if backend == 'off':
+        return None
+    if backend == 'sqlite':
+        try:
+            return ResponseCache(SQLiteResponseStore(path, max_entries), ttl=ttl,
+                                 semantic_cache=semantic_cache)
+        except Exception as e:
+            print(f"⚠️ SQLite response cache unavailable, using memory: {e}")
+    elif backend != 'memory':
+        print(f"⚠️ Unknown response cache backend '{backend}', using memory")
+    return ResponseCache(MemoryResponseStore(max_entries), ttl=ttl, semantic_cache=semantic_cache)
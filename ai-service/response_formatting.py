@@ -0,0 +1,216 @@
+import random
+import re
+from functools import lru_cache
+
+# Every pattern is compiled once here; the formatting functions below run on
+# each answer (twice for add_personality_to_response), so they avoid
+# rescanning the text where one pass gives the same result.
+
+# Runs of whitespace, and the gap in "end.Next" that needs a space
+_SPACING = re.compile(r'\s+|(?<=[.!?])(?=[A-Z])')
+# A run of commas, colons and quotes with the spaces around them
+_PUNCTUATION_RUN = re.compile(r'\s*[,:"][\s,:"]*')
+_COMMA = re.compile(r'\s*,\s*')
+_COLON = re.compile(r'\s*:\s*')
+_QUOTE = re.compile(r'\s*"\s*')
+
+# Sentences that start a new section: numbered items, "Topic:" headers and
+# phrases that open an explanation or example
+_SECTION_START = re.compile(
+    r"\d+\.|[A-Z][a-z]*:|Here's|Let me|Now,|First,|Second,|Finally,"
+    r"|For example|To understand|Think of it",
+    re.IGNORECASE
+)
+_NUMBERED_ITEM = re.compile(r'\d+\.')
+_EXAMPLE_OPENERS = ('for example', 'think of it', 'imagine')
+
+_EXCESS_NEWLINES = re.compile(r'\n{3,}')
+
+CONVERSATIONAL_REPLACEMENTS = {
+    "In conclusion": "So basically",
+    "Furthermore": "Also",
+    "Therefore": "So",
+    "Additionally": "Plus",
+    "In summary": "To sum it up",
+    "It is important to note": "What's really important here is",
+    "One should": "You should",
+    "It is recommended": "I'd recommend",
+    "According to": "From what I understand",
+    "In order to": "To"
+}
+# No phrase overlaps another or reappears in a replacement, so one
+# alternation gives the same text as replacing them one after another
+_FORMAL_PHRASES = re.compile("|".join(re.escape(formal) for formal in CONVERSATIONAL_REPLACEMENTS))
+
+CONVERSATIONAL_CONNECTORS = ["By the way", "Also", "And here's the thing", "Plus", "What's interesting is"]
+
+
+def format_response_structure(text):
+    """Format AI responses with proper alignment, spacing, and structure.
+
+    Sentences are split once; each section is formatted as soon as the
+    next one starts, instead of collecting the sections first.
+    """
+    text = fix_punctuation(text.strip())
+
+    formatted_sections = []
+    current_section = []
+    for sentence in text.split('. '):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if current_section and _SECTION_START.match(sentence):
+            formatted_section = format_section(". ".join(current_section))
+            if formatted_section:
+                formatted_sections.append(formatted_section)
+            current_section = [sentence]
+        else:
+            current_section.append(sentence)
+
+    if current_section:
+        formatted_section = format_section(". ".join(current_section))
+        if formatted_section:
+            formatted_sections.append(formatted_section)
+
+    # Join sections with proper spacing
+    return "\n\n".join(formatted_sections)
+
+
+def fix_punctuation(text):
+    """Fix common punctuation and spacing issues"""
+    # Collapse whitespace and add missing spaces after sentence ends
+    text = _SPACING.sub(' ', text)
+
+    # Fix missing periods at end of sentences
+    if text and not text.endswith(('.', '!', '?')):
+        text += '.'
+
+    # Spacing around commas, colons and quotes
+    return _PUNCTUATION_RUN.sub(_fix_punctuation_run, text)
+
+
+def _fix_punctuation_run(match):
+    return _space_punctuation_run(match.group())
+
+
+@lru_cache(maxsize=256)
+def _space_punctuation_run(run):
+    # The fixes interact (", :" or ' "'), so they are applied in their
+    # original order; the handful of distinct runs per answer are cached.
+    # Quotes end up with no spaces around them at all, so the old follow-up
+    # fixes for spaces after and before quotes never changed anything.
+    run = _COMMA.sub(', ', run)
+    run = _COLON.sub(': ', run)
+    return _QUOTE.sub('"', run)
+
+
+def format_section(section):
+    """Format individual sections with proper structure"""
+    if not section:
+        return ""
+
+    # Ensure proper sentence ending
+    if not section.endswith(('.', '!', '?')):
+        section += '.'
+
+    # Handle lists and numbered items
+    if _NUMBERED_ITEM.match(section):
+        return format_numbered_item(section)
+
+    # Handle definition-style sections (exactly one colon)
+    if section.count(':') == 1:
+        return format_definition_section(section)
+
+    # Handle example sections
+    if section.lower().startswith(_EXAMPLE_OPENERS):
+        return format_example_section(section)
+
+    # Regular paragraph formatting
+    return format_paragraph(section)
+
+
+def format_numbered_item(section):
+    """Format numbered list items"""
+    return f"   {section}"
+
+
+def format_definition_section(section):
+    """Format definition-style sections"""
+    parts = section.split(':', 1)
+    if len(parts) == 2:
+        topic = parts[0].strip()
+        explanation = parts[1].strip()
+        return f"**{topic}:** {explanation}"
+    return section
+
+
+def format_example_section(section):
+    """Format example sections"""
+    return f"💡 {section}"
+
+
+def format_paragraph(section):
+    """Format regular paragraphs with proper line breaks"""
+    # If it's a long paragraph, add logical breaks
+    if len(section) > 200:
+        sentences = section.split('. ')
+        if len(sentences) > 2:
+            # Group sentences into smaller chunks
+            chunks = []
+            current_chunk = []
+            current_length = 0
+
+            for sentence in sentences:
+                sentence_length = len(sentence)
+                if current_length + sentence_length > 150 and current_chunk:
+                    chunks.append('. '.join(current_chunk) + '.')
+                    current_chunk = [sentence]
+                    current_length = sentence_length
+                else:
+                    current_chunk.append(sentence)
+                    current_length += sentence_length
+
+            if current_chunk:
+                chunks.append('. '.join(current_chunk) + '.')
+
+            return '\n'.join(chunks)
+
+    return section
+
+
+def make_conversational(text, add_connector=True):
+    """Make text more conversational and human-like with proper formatting"""
+    # Replace formal phrases with conversational ones
+    text = _FORMAL_PHRASES.sub(lambda match: CONVERSATIONAL_REPLACEMENTS[match.group()], text)
+
+    # Format the text with proper structure
+    text = format_response_structure(text)
+
+    # Add conversational connectors
+    if add_connector and ". " in text:
+        sentences = text.split(". ")
+        if len(sentences) > 2:
+            # Add conversational connectors randomly
+            if random.choice([True, False]) and len(sentences) > 1:
+                connector = random.choice(CONVERSATIONAL_CONNECTORS)
+                sentences[1] = f"{connector}, {sentences[1].lower()}"
+            text = ". ".join(sentences)
+
+    return text
+
+
+def final_formatting_pass(text):
+    """Final pass to ensure perfect formatting"""
+    # Remove excessive newlines
+    text = _EXCESS_NEWLINES.sub('\n\n', text)
+
+    # Ensure each paragraph ends properly, with consistent spacing between them
+    formatted_paragraphs = []
+    for paragraph in text.split('\n\n'):
+        paragraph = paragraph.strip()
+        if paragraph:
+            if not paragraph.endswith(('.', '!', '?', ':')):
+                paragraph += '.'
+            formatted_paragraphs.append(paragraph)
+
+    return '\n\n'.join(formatted_paragraphs).strip()
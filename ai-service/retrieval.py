@@ -0,0 +1,164 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+
+from metrics import span
+
+DEFAULT_EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+
+class ChunkRetriever(ABC):
+    """Ranks document chunks against a question."""
+
+    backend = "base"
+
+    @abstractmethod
+    def scores(self, question):
+        """Relevance of every chunk to the question, as a 1-D array (higher is better)."""
+
+    def top_k(self, question, k=5):
+        """Return the indices of the k best chunks, best first."""
+        scores = self.scores(question)
+        if len(scores) == 0:
+            return []
+        k = min(k, len(scores))
+        # argpartition keeps this O(chunks) before sorting only the top k
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [int(i) for i in ranked if scores[i] > 0]
+
+
+class TfidfRetriever(ChunkRetriever):
+    """Cosine similarity over TF-IDF vectors of the chunks."""
+
+    backend = "tfidf"
+
+    def __init__(self, chunks):
+        self.vectorizer = TfidfVectorizer(stop_words="english", ngram_range=(1, 2),
+                                          sublinear_tf=True)
+        self.matrix = self.vectorizer.fit_transform(chunks)
+
+    def scores(self, question):
+        query = self.vectorizer.transform([question])
+        return (self.matrix @ query.T).toarray().ravel()
+
+
+class BM25Retriever(ChunkRetriever):
+    """Okapi BM25 scoring over chunk term counts."""
+
+    backend = "bm25"
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.vectorizer = CountVectorizer(stop_words="english")
+        counts = self.vectorizer.fit_transform(chunks).tocsc().astype(np.float64)
+        doc_lengths = np.asarray(counts.sum(axis=1)).ravel()
+        avg_length = doc_lengths.mean() if doc_lengths.size else 0.0
+        doc_freq = np.diff(counts.indptr)
+
+        self.num_chunks = counts.shape[0]
+        self.idf = np.log((self.num_chunks - doc_freq + 0.5) / (doc_freq + 0.5) + 1.0)
+        self.length_norm = k1 * (1 - b + b * doc_lengths / (avg_length or 1.0))
+        self.k1 = k1
+        self.counts = counts
+
+    def scores(self, question):
+        scores = np.zeros(self.num_chunks)
+        query_terms = self.vectorizer.transform([question]).indices
+        for term in query_terms:
+            start, end = self.counts.indptr[term], self.counts.indptr[term + 1]
+            rows = self.counts.indices[start:end]
+            tf = self.counts.data[start:end]
+            scores[rows] += self.idf[term] * tf * (self.k1 + 1) / (tf + self.length_norm[rows])
+        return scores
+
+
+class DenseRetriever(ChunkRetriever):
+    """Cosine similarity over sentence embeddings of the chunks."""
+
+    backend = "dense"
+
+    def __init__(self, chunks, model_name=DEFAULT_EMBEDDING_MODEL):
+        self.model_name = model_name
+        self.embeddings = get_embedder(model_name).encode(chunks)
+
+    def scores(self, question):
+        query = get_embedder(self.model_name).encode([question])[0]
+        return self.embeddings @ query
+
+
+class Embedder:
+    """Mean-pooled, L2-normalised sentence embeddings from a local transformer."""
+
+    def __init__(self, model_name=DEFAULT_EMBEDDING_MODEL, batch_size=32):
+        from transformers import AutoModel, AutoTokenizer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name)
+        self.model.eval()
+
+    def encode(self, texts):
+        import torch
+
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = self.tokenizer(list(texts[start:start + self.batch_size]), padding=True,
+                                   truncation=True, max_length=256, return_tensors="pt")
+            with torch.inference_mode():
+                hidden = self.model(**batch).last_hidden_state
+            mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            vectors.append(torch.nn.functional.normalize(pooled, dim=-1).numpy())
+        if not vectors:
+            return np.zeros((0, self.model.config.hidden_size), dtype=np.float32)
+        return np.vstack(vectors)
+
+
+_embedders = {}
+_embedders_lock = threading.Lock()
+
+
+def get_embedder(model_name=DEFAULT_EMBEDDING_MODEL):
+    """Load an embedding model once per process and share it."""
+    with _embedders_lock:
+        if model_name not in _embedders:
+            _embedders[model_name] = Embedder(model_name)
+        return _embedders[model_name]
+
+
+RETRIEVER_BACKENDS = {
+    "tfidf": TfidfRetriever,
+    "bm25": BM25Retriever,
+    "dense": DenseRetriever,
+}
+
+
+def build_retriever(chunks, backend="tfidf"):
+    """Build a retrieval index over the chunks, falling back to TF-IDF."""
+    if not chunks:
+        return None
+    retriever_class = RETRIEVER_BACKENDS.get(backend, TfidfRetriever)
+    try:
+        return retriever_class(chunks)
+    except Exception as e:
+        print(f"⚠️ Could not build {backend} retrieval index: {e}")
+        if retriever_class is not TfidfRetriever:
+            return build_retriever(chunks, "tfidf")
+        return None
+
+
+def select_chunk_indices(retriever, question, num_chunks, k=5):
+    """Indices of the k most relevant chunks, or the first k without an index."""
+    if retriever is not None:
+        try:
+            with span("retrieval"):
+                ranked = retriever.top_k(question, k)
+            if ranked:
+                return ranked
+        except Exception as e:
+            print(f"⚠️ Retrieval error: {e}")
+    return list(range(min(k, num_chunks)))
@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from response_cache import normalize_question
+from retrieval import DEFAULT_EMBEDDING_MODEL, get_embedder
+
+
+class _QuestionIndex:
+    """Embeddings of the questions answered in one scope, as a ring buffer."""
+
+    def __init__(self, dimension, capacity):
+        self.vectors = np.zeros((capacity, dimension), dtype=np.float32)
+        self.expires_at = np.zeros(capacity)
+        self.entries = [None] * capacity
+        self.size = 0
+        self.next = 0
+
+    def add(self, vector, entry, expires_at):
+        slot = self.next
+        self.vectors[slot] = vector
+        self.expires_at[slot] = expires_at
+        self.entries[slot] = entry
+        self.next = (slot + 1) % len(self.entries)
+        self.size = min(self.size + 1, len(self.entries))
+
+    def nearest(self, vector, now):
+        if not self.size:
+            return None, 0.0
+        similarities = self.vectors[:self.size] @ vector
+        similarities[self.expires_at[:self.size] <= now] = -1.0
+        best = int(np.argmax(similarities))
+        return self.entries[best], float(similarities[best])
+
+
+class SemanticCache:
+    """Finds answers to paraphrases of questions already answered for a document.
+
+    Questions are embedded with the same local sentence-embedding model as
+    the dense retriever (see retrieval.get_embedder), so it works offline.
+    Each scope (document, provider, prompt version) keeps a small in-memory
+    vector index; a lookup returns the cached response of the most similar
+    earlier question when cosine similarity reaches ``threshold``.
+
+    ``embedder()`` returns the loaded embedding model, or None while it is
+    unavailable (the apps pass their model registry's, so it is warmed up
+    with the other models). When embedding fails the cache steps aside for
+    ``retry_after`` seconds, doubling up to ``max_retry_after`` while
+    failures continue, instead of giving up for the life of the process.
+    """
+
+    def __init__(self, model_name=DEFAULT_EMBEDDING_MODEL, threshold=0.9, ttl=3600,
+                 max_questions=256, max_scopes=64, embedder=None, retry_after=30.0,
+                 max_retry_after=600.0):
+        self.model_name = model_name
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_questions = max_questions
+        self.max_scopes = max_scopes
+        self.embedder = embedder or (lambda: get_embedder(model_name))
+        self.retry_after = retry_after
+        self.max_retry_after = max_retry_after
+        self.failures = 0
+        self._paused_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self._indexes = OrderedDict()
+        self._vectors = OrderedDict()  # normalized question -> embedding, reused by add()
+        self._lock = threading.Lock()
+
+    def lookup(self, scope, question):
+        """Cached response for the nearest earlier question in scope, or None."""
+        vector = self._embed(question)
+        if vector is None:
+            return None
+        with self._lock:
+            index = self._indexes.get(scope)
+            entry, similarity = index.nearest(vector, time.time()) if index else (None, 0.0)
+            if entry is None or similarity < self.threshold:
+                self.misses += 1
+                return None
+            self._indexes.move_to_end(scope)
+            self.hits += 1
+        matched_question, response = entry
+        return dict(response, matched_question=matched_question,
+                    similarity=round(similarity, 3))
+
+    def add(self, scope, question, response):
+        vector = self._embed(question)
+        if vector is None:
+            return
+        with self._lock:
+            index = self._indexes.get(scope)
+            if index is None:
+                index = self._indexes[scope] = _QuestionIndex(len(vector), self.max_questions)
+                while len(self._indexes) > self.max_scopes:
+                    self._indexes.popitem(last=False)
+            self._indexes.move_to_end(scope)
+            index.add(vector, (question, response), time.time() + self.ttl)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "paused": time.time() < self._paused_until,
+                "failures": self.failures,
+                "model": self.model_name,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "scopes": len(self._indexes),
+                "questions": sum(index.size for index in self._indexes.values()),
+            }
+
+    def _embed(self, question):
+        if time.time() < self._paused_until:
+            return None
+        normalized = normalize_question(question)
+        with self._lock:
+            vector = self._vectors.get(normalized)
+            if vector is not None:
+                self._vectors.move_to_end(normalized)
+                return vector
+        try:
+            embedder = self.embedder()
+            if embedder is None:
+                return None
+            vector = embedder.encode([normalized])[0]
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+                pause = min(self.retry_after * 2 ** (self.failures - 1), self.max_retry_after)
+                self._paused_until = time.time() + pause
+            print(f"⚠️ Semantic cache paused for {pause:.0f}s, could not embed questions: {e}")
+            return None
+        with self._lock:
+            self.failures = 0
+            self._vectors[normalized] = vector
+            while len(self._vectors) > self.max_questions:
+                self._vectors.popitem(last=False)
+        return vector